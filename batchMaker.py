@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from subprocess import Popen
+import argparse, multiprocessing, os, shlex, sys, time
+import pipelineCheckpoint, referenceCache, referenceLibrary
+
+'''
+Runs mitoMaker (or any other generalMaker wrapper) for every sample of a sample sheet, as many at the same time as the 
+cores and memory of the machine allow.
+'''
+
+#estimated resources of each stage of a run, memory in GB as a fixed part plus a part per GB of reads.
+#cores = None means the stage uses all the threads given to the job (-p).
+stageEstimates = {'denovo': {'cores': None, 'memory': (1.0, 1.5)},
+				  'mapping': {'cores': None, 'memory': (1.0, 3.0)}, #MIRA keeps the whole readpool in memory
+				  'mitobim': {'cores': 1, 'memory': (1.0, 3.0)},
+				  'annotation': {'cores': 3, 'memory': (0.5, 0.0)}} #tRNAscan-SE, blastx and blastn, one thread each
+
+class Sample():
+	'''
+	Class to hold a line of the sample sheet and the resources its run reserves.
+	'''
+	def __init__(self, processName, inputFile, refSeqFile = None, extraFlags = ''):
+		self.processName = processName
+		self.inputFile = os.path.abspath(inputFile)
+		self.refSeqFile = None
+		if refSeqFile != None:
+			self.refSeqFile = os.path.abspath(refSeqFile)
+		self.extraFlags = extraFlags
+		self.cores = 1
+		self.memory = 0.0
+		self.run = None
+		self.logFile = None
+
+	def readsSize(self):
+		'''
+		Size of all the read files of the sample, in GB.
+		'''
+		totalSize = 0
+		for readFile in pipelineCheckpoint.readFilesOf(self.inputFile):
+			if os.path.exists(readFile):
+				totalSize += os.path.getsize(readFile)
+		return totalSize / float(1 << 30)
+
+	def estimate(self, jobThreads):
+		'''
+		A run holds its reservation from start to end, so it reserves what its most demanding stage needs.
+		'''
+		readsSize = self.readsSize()
+		self.cores = 1
+		self.memory = 0.0
+		for stage in stageEstimates:
+			stageCores = stageEstimates[stage]['cores']
+			if stageCores == None:
+				stageCores = jobThreads
+			baseMemory, memoryPerGb = stageEstimates[stage]['memory']
+			self.cores = max(self.cores, min(stageCores, jobThreads))
+			self.memory = max(self.memory, baseMemory + memoryPerGb * readsSize)
+
+def readSampleSheet(sampleSheet):
+	'''
+	Sample sheet, one sample per line, separated by tabs: job_name input_file [reference [extra flags]]
+	Use - as reference to run without one. Lines starting with # are ignored.
+	'''
+	listOfSamples = []
+	with open(sampleSheet, 'r') as sheetFile:
+		for line in sheetFile:
+			if line.strip() == '' or line[0] == '#':
+				continue
+			fields = line.replace('\n','').split('\t')
+			refSeqFile = None
+			if len(fields) > 2 and fields[2].strip() not in ('', '-'):
+				refSeqFile = fields[2].strip()
+			extraFlags = ''
+			if len(fields) > 3:
+				extraFlags = fields[3].strip()
+			listOfSamples.append(Sample(fields[0].strip(), fields[1].strip(), refSeqFile, extraFlags))
+	return listOfSamples
+
+def availableMemory():
+	'''
+	Total memory of the machine in GB.
+	'''
+	try:
+		with open('/proc/meminfo', 'r') as memInfo:
+			for line in memInfo:
+				if line.startswith('MemTotal:'):
+					return int(line.split()[1]) / float(1 << 20)
+	except IOError:
+		pass
+	return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / float(1 << 30)
+
+def organismTypeOf(sample, defaultFlags):
+	'''
+	The -o (--organism) given to a sample, to know which reference cache entry it will use.
+	'''
+	flags = shlex.split(defaultFlags + ' ' + sample.extraFlags)
+	organismType = 2
+	for n, flag in enumerate(flags):
+		if flag in ('-o', '--organism') and n + 1 < len(flags):
+			organismType = int(flags[n + 1])
+		elif flag.startswith('--organism='):
+			organismType = int(flag.split('=', 1)[1])
+	return organismType
+
+def prebuildReferences(listOfSamples, defaultFlags):
+	'''
+	Builds the reference cache entries and the reference library the samples are going to use, once, before starting them.
+	'''
+	referenceLibrary.loadLibrary()
+	module_dir = os.path.dirname(__file__)
+	module_dir = os.path.abspath(module_dir)
+	cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+
+	with open(cfg_full_path,'r') as configFile:
+		for line in configFile:
+			if '#' != line[0] and line != '\n':
+				configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+				if configPart == 'blastfolder':
+					blastFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+
+	if blastFolder.lower() == 'default':
+		blastFolder = os.path.join(module_dir, 'blast/')
+
+	alreadyBuilt = set()
+	for sample in listOfSamples:
+		if sample.refSeqFile != None:
+			referenceLibrary.indexedReference(sample.refSeqFile)
+		if sample.refSeqFile != None and sample.refSeqFile[-6:] != '.fasta':
+			organismType = organismTypeOf(sample, defaultFlags)
+			if (sample.refSeqFile, organismType) not in alreadyBuilt:
+				referenceCache.loadReference(sample.refSeqFile, organismType, blastFolder)
+				alreadyBuilt.add((sample.refSeqFile, organismType))
+
+def startSample(sample, maker, workRoot, jobThreads, defaultFlags):
+	pathToWork = os.path.join(workRoot, sample.processName)
+	if not os.path.exists(pathToWork): os.makedirs(pathToWork)
+	command = 'python -u %s -j %s -i %s -p %s --workdir %s' % (maker, sample.processName, sample.inputFile, jobThreads, pathToWork)
+	if sample.refSeqFile != None:
+		command += ' -r ' + sample.refSeqFile
+	command += ' ' + defaultFlags + ' ' + sample.extraFlags
+	print 'Starting %s (%s cores, %.1f GB reserved)...' % (sample.processName, sample.cores, sample.memory)
+	sample.logFile = open(os.path.join(workRoot, sample.processName + '.log'), 'w')
+	args = shlex.split(command)
+	sample.run = Popen(args, stdout=sample.logFile, stderr=sample.logFile)
+
+def runBatch(listOfSamples, maker, workRoot, totalCores, totalMemory, jobThreads, defaultFlags, pollInterval = 10):
+	'''
+	Starts the samples in the order of the sheet whenever their reservation fits in what is free. A sample bigger than the 
+	whole machine runs alone. Returns a dict of job name -> exit code.
+	'''
+	for sample in listOfSamples:
+		sample.estimate(jobThreads)
+
+	waitingSamples = list(listOfSamples)
+	runningSamples = []
+	exitCodes = {}
+	freeCores = totalCores
+	freeMemory = totalMemory
+
+	while waitingSamples or runningSamples:
+		#start whatever fits, first fit in the order of the sheet
+		for sample in list(waitingSamples):
+			fitsNow = sample.cores <= freeCores and sample.memory <= freeMemory
+			runsAlone = len(runningSamples) == 0 #too big for the machine, but nothing else is running
+			if fitsNow or runsAlone:
+				startSample(sample, maker, workRoot, jobThreads, defaultFlags)
+				waitingSamples.remove(sample)
+				runningSamples.append(sample)
+				freeCores -= sample.cores
+				freeMemory -= sample.memory
+
+		time.sleep(pollInterval)
+
+		for sample in list(runningSamples):
+			if sample.run.poll() != None:
+				sample.logFile.close()
+				exitCodes[sample.processName] = sample.run.returncode
+				print '%s finished (exit code %s).' % (sample.processName, sample.run.returncode)
+				runningSamples.remove(sample)
+				freeCores += sample.cores
+				freeMemory += sample.memory
+
+	return exitCodes
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Run mitoMaker for every sample of a sample sheet, sharing the machine between them.')
+	parser.add_argument('-s', '--samplesheet', help='Tab separated file with: job_name input_file [reference [extra flags]] per line',
+						required=True, dest='sampleSheet')
+	parser.add_argument('-p', '--processors', help='Number of threads to share between all samples. Default = all cores', type=int,
+						default=multiprocessing.cpu_count(), dest='processorsToUse')
+	parser.add_argument('-m', '--memory', help='GB of memory to share between all samples. Default = all the memory of this machine', type=float,
+						default=None, dest='memoryToUse')
+	parser.add_argument('-t', '--jobthreads', help='Threads given to each sample (-p of each run). Default = 4', type=int,
+						default=4, dest='jobThreads')
+	parser.add_argument('-w', '--workroot', help='Folder where each sample gets its own working folder and log. Default = current folder',
+						default='.', dest='workRoot')
+	parser.add_argument('--maker', help='Script to run for each sample. Default = mitoMaker.py', default='mitoMaker.py', dest='maker')
+	parser.add_argument('--flags', help='Flags added to every sample, between quotes. Example: --flags "-o 5 --skiptrna"',
+						default='', dest='defaultFlags')
+	args = parser.parse_args()
+
+	if args.memoryToUse == None:
+		args.memoryToUse = availableMemory()
+
+	module_dir = os.path.dirname(__file__)
+	module_dir = os.path.abspath(module_dir)
+	maker = args.maker
+	if not os.path.exists(maker):
+		maker = os.path.join(module_dir, args.maker)
+
+	listOfSamples = readSampleSheet(args.sampleSheet)
+	workRoot = os.path.abspath(args.workRoot)
+	print 'Samples: %s' % len(listOfSamples)
+	print 'Threads: %s, memory: %.1f GB, threads per sample: %s' % (args.processorsToUse, args.memoryToUse, args.jobThreads)
+	print ''
+
+	print 'Building the reference caches the samples will share...'
+	prebuildReferences(listOfSamples, args.defaultFlags)
+	print ''
+
+	exitCodes = runBatch(listOfSamples, maker, workRoot, args.processorsToUse, args.memoryToUse, args.jobThreads, args.defaultFlags)
+
+	print ''
+	print '#'*28
+	failedSamples = [processName for processName in exitCodes if exitCodes[processName] != 0]
+	print '%s of %s samples finished without errors.' % (len(exitCodes) - len(failedSamples), len(exitCodes))
+	if failedSamples:
+		print 'Check the logs of: ' + ', '.join(sorted(failedSamples))
+	print '#'*28
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from profiling import Popen
+from array import array
+import os, shlex
+
+'''
+Tabular BLAST output for the checks. The checks only need ids, spans, ranges and frames of each HSP, so BLAST writes just 
+those columns and they are read into one array per column, instead of building the whole SearchIO object tree from XML.
+Set blastxml = yes in generalMaker.config to also keep the XML output of every search, for debugging.
+'''
+
+#columns asked from blast+ (-outfmt 6), stitle is only used for the ids of databases made without -parse_seqids
+blastPlusColumns = ['qseqid', 'sseqid', 'length', 'qstart', 'qend', 'sstart', 'send', 'qframe', 'sframe', 'evalue', 'stitle']
+#the fixed columns of legacy blastall -m 8
+legacyColumns = ['qseqid', 'sseqid', 'pident', 'length', 'mismatch', 'gapopen', 'qstart', 'qend', 'sstart', 'send', 'evalue', 
+				 'bitscore']
+
+def keepXml():
+	'''
+	Returns True if blastxml in the config file asks for the XML output of the searches too.
+	'''
+	module_dir = os.path.dirname(__file__)
+	module_dir = os.path.abspath(module_dir)
+	cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+	blastXml = 'no'
+
+	with open(cfg_full_path,'r') as configFile:
+		for line in configFile:
+			if '#' != line[0] and line != '\n':
+				configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+				if configPart == 'blastxml':
+					blastXml = line.lower().replace('\n','').replace(' ','').split('=')[-1]
+
+	return blastXml in ('yes', 'true', '1')
+
+def runBlast(command, outputName, legacy):
+	'''
+	Runs a blastall/blastn/blastx command line, given without output format, and saves its tabular output to outputName.
+	legacy = True for blastall. Returns the BlastTable with the results.
+	'''
+	if legacy == True:
+		tabularCommand = command + ' -m 8'
+	else:
+		tabularCommand = command + ' -outfmt "6 ' + ' '.join(blastPlusColumns) + '"'
+	with open(outputName, 'w') as blastResultFile:
+		args = shlex.split(tabularCommand)
+		blastAll = Popen(args, stdout=blastResultFile)
+		blastAll.wait()
+
+	if keepXml() == True:
+		if legacy == True:
+			xmlCommand = command + ' -m 7' #call BLAST with XML output
+		else:
+			xmlCommand = command + ' -outfmt 5' #call BLAST with XML output
+		with open(os.path.splitext(outputName)[0] + '.xml', 'w') as blastXmlFile:
+			args = shlex.split(xmlCommand)
+			blastAll = Popen(args, stdout=blastXmlFile)
+			blastAll.wait()
+
+	return BlastTable(outputName, legacy)
+
+class BlastTable():
+	'''
+	Class to hold the HSPs of a tabular BLAST output, one array per column, row n being the nth HSP.
+	Ranges are 0-based and half open, with start < end, like SearchIO's query_range and hit_range. Frames are -1 on the 
+	minus strand and 1 otherwise for blastn, the query frame of blastx keeps its number.
+	Rows of a query are together and, inside them, ordered as blast ordered the hits, so queryIds and rowsOf give the same 
+	order as iterating over SearchIO's qresult.hsps.
+	'''
+	def __init__(self, fileName, legacy = False):
+		self.queryIds = [] #in the order of the file
+		self.hitIds = []
+		self.alnSpan = array('l')
+		self.queryStart = array('l')
+		self.queryEnd = array('l')
+		self.hitStart = array('l')
+		self.hitEnd = array('l')
+		self.queryFrame = array('b')
+		self.hitFrame = array('b')
+		self.queryRows = {} #query id -> (first row, last row + 1)
+
+		if legacy == True:
+			columns = legacyColumns
+		else:
+			columns = blastPlusColumns
+		position = dict((column, n) for n, column in enumerate(columns))
+		hasFrames = 'qframe' in position
+		lastQuery = None
+
+		with open(fileName, 'r') as blastResultFile:
+			for line in blastResultFile:
+				if line[0] == '#' or line == '\n': #comment lines of -outfmt 7
+					continue
+				fields = line.rstrip('\n').split('\t')
+				queryId = fields[0]
+				hitId = fields[1]
+				if hitId.startswith('gnl|BL_ORD_ID|') and 'stitle' in position: #database without -parse_seqids
+					hitId = fields[position['stitle']].split()[0]
+
+				queryFrom, queryTo = int(fields[position['qstart']]), int(fields[position['qend']])
+				hitFrom, hitTo = int(fields[position['sstart']]), int(fields[position['send']])
+				if hasFrames:
+					queryFrame = int(fields[position['qframe']])
+					hitFrame = int(fields[position['sframe']])
+				else: #only the strand can be known from the coordinates
+					queryFrame = -1 if queryFrom > queryTo else 1
+					hitFrame = -1 if hitFrom > hitTo else 1
+				if hitFrame == 0: #blast+ writes 0 for the frames that don't apply, like the subject of blastx
+					hitFrame = 1
+				if queryFrame == 0:
+					queryFrame = 1
+
+				rowNumber = len(self.hitIds)
+				if queryId != lastQuery:
+					if lastQuery is not None:
+						self.queryRows[lastQuery] = (self.queryRows[lastQuery][0], rowNumber)
+					self.queryIds.append(queryId)
+					self.queryRows[queryId] = (rowNumber, rowNumber)
+					lastQuery = queryId
+				self.hitIds.append(hitId)
+				self.alnSpan.append(int(fields[position['length']]))
+				self.queryStart.append(min(queryFrom, queryTo) - 1)
+				self.queryEnd.append(max(queryFrom, queryTo))
+				self.hitStart.append(min(hitFrom, hitTo) - 1)
+				self.hitEnd.append(max(hitFrom, hitTo))
+				self.queryFrame.append(queryFrame)
+				self.hitFrame.append(hitFrame)
+
+		if lastQuery is not None:
+			self.queryRows[lastQuery] = (self.queryRows[lastQuery][0], len(self.hitIds))
+
+	def __len__(self):
+		return len(self.hitIds)
+
+	def rowsOf(self, queryId):
+		'''
+		Row numbers of the HSPs of a query, an empty range if it had none.
+		'''
+		first, last = self.queryRows.get(queryId, (0, 0))
+		return xrange(first, last)
+
+	def sumByQuery(self, column):
+		'''
+		Sum of a column over the HSPs of each query, as a dictionary.
+		'''
+		return dict((queryId, sum(column[self.queryRows[queryId][0]:self.queryRows[queryId][1]])) for queryId in self.queryIds)
@@ -25,63 +25,112 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from Bio import SeqIO, SearchIO
-from Bio.Alphabet import generic_dna, generic_protein
-from subprocess import Popen
-import shlex, sys, os
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+import sys, os
 
-def circularizationCheck(resultFile, circularSize, circularOffSet, blastFolder):
+def findSelfMatches(sequence, seedWindow, wordSize = 11, matchScore = 2, mismatchScore = -3, xDrop = 20):
 	'''
-	Check, with blast, if there is a match between the start and the end of a sequence.
+	Finds ungapped matches between the first seedWindow bases of a sequence and the rest of it, like a blastn of the sequence 
+	against itself would, but in memory.
+	Words of wordSize bases from the head are hashed into a dict, the whole sequence is scanned for them and each seed is 
+	extended to both sides until the score drops xDrop below the best one (blastn default scores).
+	Returns a list of (score, queryStart, queryEnd, hitStart, hitEnd), best scores first.
+	'''
+	sizeOfSeq = len(sequence)
+	seedWindow = min(seedWindow, sizeOfSeq - wordSize + 1)
+
+	#index the words of the head of the sequence, skipping any with Ns in them
+	headWords = {}
+	for i in xrange(max(0, seedWindow)):
+		word = sequence[i:i + wordSize]
+		if 'N' not in word:
+			headWords.setdefault(word, []).append(i)
+
+	extendedOn = {} #diagonal -> list of (queryStart, queryEnd) already extended, so each match is extended only once
+	matches = []
+	for j in xrange(1, sizeOfSeq - wordSize + 1):
+		word = sequence[j:j + wordSize]
+		if word not in headWords:
+			continue
+		for i in headWords[word]:
+			diagonal = j - i
+			if diagonal <= 0: #the sequence against itself, or a match we'll see from the other side
+				continue
+			alreadyExtended = False
+			for extendedStart, extendedEnd in extendedOn.get(diagonal, []):
+				if extendedStart <= i < extendedEnd:
+					alreadyExtended = True
+					break
+			if alreadyExtended:
+				continue
+
+			#extend to the right of the seed...
+			score = wordSize * matchScore
+			bestScore = score
+			queryEnd = i + wordSize
+			x = queryEnd
+			while x + diagonal < sizeOfSeq and score > bestScore - xDrop:
+				if sequence[x] == sequence[x + diagonal] and sequence[x] != 'N':
+					score += matchScore
+				else:
+					score += mismatchScore
+				x += 1
+				if score > bestScore:
+					bestScore = score
+					queryEnd = x
+			#...and to the left of it
+			score = bestScore
+			queryStart = i
+			x = i - 1
+			while x >= 0 and score > bestScore - xDrop:
+				if sequence[x] == sequence[x + diagonal] and sequence[x] != 'N':
+					score += matchScore
+				else:
+					score += mismatchScore
+				if score > bestScore:
+					bestScore = score
+					queryStart = x
+				x -= 1
+
+			extendedOn.setdefault(diagonal, []).append((queryStart, queryEnd))
+			matches.append((bestScore, queryStart, queryEnd, queryStart + diagonal, queryEnd + diagonal))
+
+	matches.sort(key = lambda match: -match[0])
+	return matches
+
+def circularizationCheck(resultFile, circularSize, circularOffSet, blastFolder = None):
+	'''
+	Check if there is a match between the start and the end of a sequence.
 	Returns a tuple with (True, start, end) or False, accordingly.
+	blastFolder isn't used anymore, the matches are found in memory by findSelfMatches.
 	'''
 	refSeq = SeqIO.read(resultFile, "fasta", generic_dna)
 	sizeOfSeq = len(refSeq)
+	sequence = str(refSeq.seq).upper()
 
-	print "Formatting database for blast (circularization check)..."
-	try:
-		if blastFolder == 'installed':
-			command = "formatdb -in " + resultFile + " -p F" #need to formatdb refseq first
-		else:
-			command = blastFolder + "/bin/makeblastdb -in " + resultFile + " -dbtype nucl" #need to formatdb refseq first
-		args = shlex.split(command)
-		formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
-		formatDB.wait()
-	except:
-		print ''
-		print "formatDB during circularization check failed..."
-		print ''
-		return (False,-1,-1)
-		
-	print "Running blast of input against itself to check for circularization..."
-
-	with open("circularization_check.blast.xml",'w') as blastResultFile:
-		if blastFolder == 'installed':
-			command = "blastall -p blastn -d " + resultFile + " -i " + resultFile + " -m 7" #call BLAST with XML output
-		else:
-			command = blastFolder + "/bin/blastn -task blastn -db " + resultFile + " -query " + resultFile + " -outfmt 5" #call BLAST with XML output
-		args = shlex.split(command)
-		blastAll = Popen(args, stdout=blastResultFile)
-		blastAll.wait()
-
-	blastparse = SearchIO.parse('circularization_check.blast.xml', 'blast-xml') #get all queries
+	print "Looking for matches between the start and the end of the sequence to check for circularization..."
 
 	'''
-	Let's loop through all blast results and see if there is a circularization.
-	Do it by looking at all HSPs in the parse and see if there is an alignment of the ending of the sequence 
-    with the start of that same sequence. It should have a considerable size, you don't want to say it circularized
+	Let's loop through all matches and see if there is a circularization.
+	Do it by looking at all of them and see if there is an alignment of the ending of the sequence 
+	with the start of that same sequence. It should have a considerable size, you don't want to say it circularized
 	if only a couple of bases matched.
 	Returns True or False, x_coordinate, y_coordinate
 	x coordinate = starting point of circularization match
 	y coordinate = ending point of circularization match
 	'''
-	for qresult in blastparse: #in each query...
-		for hsp in qresult.hsps: #loop through all HSPs looking for a circularization (perceived as a hsp with start somewhat close to the query finish)
-			if (hsp.query_range[0] >= 0 and hsp.query_range[0] <= circularOffSet) and (hsp.hit_range[0] >= sizeOfSeq - hsp.aln_span - circularOffSet and hsp.hit_range[0] <= sizeOfSeq + circularOffSet) and hsp.aln_span >= circularSize and hsp.aln_span < sizeOfSeq * 0.90:
-				if hsp.hit_range[0] < hsp.query_range[0]:
-					return (True,hsp.hit_range[0],hsp.hit_range[1]) #it seems to have circularized, return True
+	#a match has to start in the first circularOffSet bases, so only words from there (and a bit further, in case the match
+	#starts with mismatches) are needed as seeds
+	for score, queryStart, queryEnd, hitStart, hitEnd in findSelfMatches(sequence, circularOffSet + circularSize):
+		alnSpan = queryEnd - queryStart
+		#blast reports each match from both sides, so look at it as query -> hit and as hit -> query
+		for (query_range, hit_range) in (((queryStart, queryEnd), (hitStart, hitEnd)), ((hitStart, hitEnd), (queryStart, queryEnd))):
+			if (query_range[0] >= 0 and query_range[0] <= circularOffSet) and (hit_range[0] >= sizeOfSeq - alnSpan - circularOffSet and hit_range[0] <= sizeOfSeq + circularOffSet) and alnSpan >= circularSize and alnSpan < sizeOfSeq * 0.90:
+				if hit_range[0] < query_range[0]:
+					return (True,hit_range[0],hit_range[1]) #it seems to have circularized, return True
 				else:
-					return (True,hsp.query_range[0],hsp.query_range[1])
+					return (True,query_range[0],query_range[1])
 
 	#no circularization was observed in the for loop, so we exited it, just return false
 	return (False,-1,-1)
@@ -90,18 +139,4 @@ if __name__ == '__main__':
 	if sys.argv[1] == '-h' or sys.argv[1] == '--help':
 		print 'Usage: fasta_file'
 	else:
-		module_dir = os.path.dirname(__file__)
-		module_dir = os.path.abspath(module_dir)
-		cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
-
-		with open(cfg_full_path,'r') as configFile:
-			for line in configFile:
-				if '#' != line[0] and line != '\n':
-					configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
-					if configPart == 'blastfolder':
-						blastFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-
-		if blastFolder.lower() == 'default':
-			blastFolder = os.path.join(module_dir, 'blast/')
-
-		print(circularizationCheck(sys.argv[1], 40, 220, blastFolder))
+		print(circularizationCheck(sys.argv[1], 40, 220))
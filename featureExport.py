@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from Bio import SeqIO, SeqFeature
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+import urllib
+
+'''
+Every file of the annotation (GenBank, Sequin .tbl, FASTA, GFF3 and BED) is written from one list of ExportFeature, taken 
+from the record made by genbankOutput. Each file is built in memory and written at once.
+The copy ordered from tRNA-Phe is made by moving the coordinates of the features to the new origin, instead of slicing 
+and joining the record.
+'''
+
+class ExportFeature():
+	'''
+	A feature with 0 based, end exclusive, coordinates, like SeqFeature.FeatureLocation.
+	'''
+	def __init__(self, type, start, end, strand, qualifiers):
+		self.type = type
+		self.start = start
+		self.end = end
+		self.strand = strand
+		self.qualifiers = qualifiers
+
+	def name(self):
+		'''
+		The gene or product of the feature.
+		'''
+		if 'gene' in self.qualifiers:
+			return str(self.qualifiers['gene'])
+		return str(self.qualifiers.get('product', self.type))
+
+	def seqFeature(self):
+		return SeqFeature.SeqFeature(SeqFeature.FeatureLocation(self.start, self.end, strand=self.strand), type=self.type,
+									 qualifiers=self.qualifiers)
+
+def featuresOf(record):
+	'''
+	The features of a SeqRecord as a list of ExportFeature.
+	'''
+	return [ExportFeature(gbkFeature.type, int(gbkFeature.location.start), int(gbkFeature.location.end), gbkFeature.location.strand,
+						  gbkFeature.qualifiers) for gbkFeature in record.features]
+
+def rotateFeatures(listOfFeatures, origin, sequenceLength):
+	'''
+	The features with their coordinates moved so the sequence starts at origin: the ones after origin come first, then the 
+	ones before it. Features crossing origin are left out, as slicing the record did.
+	'''
+	listOfRotated = []
+	for feature in listOfFeatures:
+		if feature.start >= origin:
+			listOfRotated.append(ExportFeature(feature.type, feature.start - origin, feature.end - origin, feature.strand, feature.qualifiers))
+	for feature in listOfFeatures:
+		if feature.end <= origin:
+			listOfRotated.append(ExportFeature(feature.type, feature.start + sequenceLength - origin, feature.end + sequenceLength - origin,
+											   feature.strand, feature.qualifiers))
+	return listOfRotated
+
+def sequinTable(name, listOfFeatures):
+	'''
+	The Sequin feature table (.tbl), as a string.
+	'''
+	tableLines = ['>Features ' + name + '\n']
+	for feature in listOfFeatures:
+		if feature.strand == 1 or feature.strand == None:
+			tableLines.append('%s %s %s\n\t\t' % (feature.start + 1, feature.end, feature.type))
+		else:
+			tableLines.append('%s %s %s\n\t\t' % (feature.end, feature.start + 1, feature.type))
+		for qualifier in feature.qualifiers:
+			if qualifier == 'product' or qualifier == 'gene':
+				tableLines.append(str(qualifier) + ' ' + str(feature.qualifiers[qualifier]) + '\n')
+		tableLines.append('\n')
+	return ''.join(tableLines)
+
+def gff3Table(name, sequenceLength, listOfFeatures):
+	'''
+	The features in GFF3, as a string. Genes are the parents of the CDS, tRNA and rRNA features that follow them.
+	'''
+	tableLines = ['##gff-version 3\n', '##sequence-region %s 1 %s\n' % (name, sequenceLength)]
+	strandOf = {1: '+', -1: '-'}
+	parentOf = {}
+	for n, feature in enumerate(listOfFeatures):
+		featureId = '%s_%s' % (feature.type.lower(), n + 1)
+		attributes = ['ID=' + urllib.quote(featureId, ''), 'Name=' + urllib.quote(feature.name(), '')]
+		if feature.type == 'gene':
+			parentOf[(feature.start, feature.end, feature.name())] = featureId
+		elif (feature.start, feature.end, feature.name()) in parentOf:
+			attributes.append('Parent=' + urllib.quote(parentOf[(feature.start, feature.end, feature.name())], ''))
+		for qualifier in ('gene', 'product'):
+			if qualifier in feature.qualifiers:
+				attributes.append(qualifier + '=' + urllib.quote(str(feature.qualifiers[qualifier]), ''))
+		if feature.type == 'CDS':
+			phase = '0'
+		else:
+			phase = '.'
+		tableLines.append('\t'.join([name, 'mitomaker', feature.type, str(feature.start + 1), str(feature.end), '.',
+									 strandOf.get(feature.strand, '.'), phase, ';'.join(attributes)]) + '\n')
+	return ''.join(tableLines)
+
+def bedTable(name, listOfFeatures):
+	'''
+	The features in BED (6 columns), as a string.
+	'''
+	strandOf = {1: '+', -1: '-'}
+	return ''.join(['%s\t%s\t%s\t%s\t0\t%s\n' % (name, feature.start, feature.end, feature.name(), strandOf.get(feature.strand, '.'))
+					for feature in listOfFeatures])
+
+def fastaText(record, sequence):
+	'''
+	The record as FASTA, as a string, with the same title and lines of 60 bases as SeqIO.
+	'''
+	if record.description and record.description.split(None, 1)[0] == record.id:
+		header = '>%s\n' % record.description
+	elif record.description:
+		header = '>%s %s\n' % (record.id, record.description)
+	else:
+		header = '>%s\n' % record.id
+	return header + ''.join([sequence[n:n + 60] + '\n' for n in xrange(0, len(sequence), 60)])
+
+def writeText(outputFile, text):
+	with open(outputFile, 'w') as output:
+		output.write(text)
+
+def writeExports(record, listOfFeatures, sequence, filePrefix, formats):
+	'''
+	Writes the record, with listOfFeatures and sequence, to filePrefix + each of formats ('.gb', '.tbl', '.fasta', '.gff3', 
+	'.bed'). The GenBank file is the only one written by SeqIO.
+	'''
+	if '.gb' in formats:
+		with open(filePrefix + '.gb', 'w') as outputResult:
+			SeqIO.write(record, outputResult, 'genbank')
+	if '.tbl' in formats:
+		writeText(filePrefix + '.tbl', sequinTable(record.name, listOfFeatures))
+	if '.fasta' in formats:
+		writeText(filePrefix + '.fasta', fastaText(record, sequence))
+	if '.gff3' in formats:
+		writeText(filePrefix + '.gff3', gff3Table(record.name, len(sequence), listOfFeatures))
+	if '.bed' in formats:
+		writeText(filePrefix + '.bed', bedTable(record.name, listOfFeatures))
+
+def writeAnnotation(finalResults, filePrefix, pheStart = None, orderedFilePrefix = None, formats = ('.gb', '.tbl', '.gff3', '.bed'),
+					orderedFormats = ('.gb', '.fasta', '.tbl', '.gff3', '.bed')):
+	'''
+	Writes the record made by genbankOutput to filePrefix + each of formats and, if pheStart is given, the record starting 
+	at pheStart to orderedFilePrefix + each of orderedFormats.
+	Returns the ordered record (for createImageOfAnnotation), or None if pheStart wasn't given.
+	'''
+	listOfFeatures = featuresOf(finalResults)
+	sequence = str(finalResults.seq)
+	writeExports(finalResults, listOfFeatures, sequence, filePrefix, formats)
+
+	if pheStart is None:
+		return None
+	orderedSequence = sequence[pheStart:] + sequence[:pheStart]
+	listOfOrderedFeatures = rotateFeatures(listOfFeatures, pheStart, len(sequence))
+	orderedFinalResults = SeqRecord(Seq(orderedSequence, finalResults.seq.alphabet), id=finalResults.id, name=finalResults.name,
+									description=finalResults.description,
+									features=[feature.seqFeature() for feature in listOfOrderedFeatures])
+	writeExports(orderedFinalResults, listOfOrderedFeatures, orderedSequence, orderedFilePrefix, orderedFormats)
+	return orderedFinalResults
@@ -30,24 +30,116 @@ from Bio.Seq import Seq
 from Bio.Data import CodonTable
 from decimal import Decimal
 
+class FrameTranslations():
+	'''
+	The three frames of both strands of a sequence, translated once, so the amino acid of any codon is an index lookup.
+	The ends of the genes are searched codon by codon, and retranslating the whole gene at every step was O(20*L) per gene.
+	Codons that can't be translated (gaps, NNN from scaffolding...) are X, so they only stop the genes that reach them.
+	'''
+	def __init__(self, sequence, translationTable):
+		self.length = len(sequence)
+		self.translationTable = translationTable
+		self.aminoAcidOf = {} #(codon, strand) -> amino acid, there are only a few distinct codons
+		self.forwardFrames = []
+		self.reverseFrames = []
+		for frame in xrange(3):
+			frameEnd = frame + 3 * ((self.length - frame) / 3)
+			listOfCodons = [sequence[n:n + 3] for n in xrange(frame, frameEnd, 3)]
+			self.forwardFrames.append(''.join([self.translateCodon(codon, 1) for codon in listOfCodons]))
+		for frame in xrange(3):
+			#frames of the reverse complement, counted from the end of the sequence
+			frameStart = self.length - frame - 3 * ((self.length - frame) / 3)
+			listOfCodons = [sequence[n:n + 3] for n in xrange(self.length - frame - 3, frameStart - 1, -3)]
+			self.reverseFrames.append(''.join([self.translateCodon(codon, -1) for codon in listOfCodons]))
+
+	def translateCodon(self, codon, strand):
+		'''
+		The amino acid of codon read on strand, X if it can't be translated.
+		'''
+		if (codon, strand) not in self.aminoAcidOf:
+			try:
+				codonSeq = Seq(codon, IUPAC.unambiguous_dna)
+				if strand == -1:
+					codonSeq = codonSeq.reverse_complement()
+				self.aminoAcidOf[(codon, strand)] = str(codonSeq.translate(table=self.translationTable))
+			except:
+				self.aminoAcidOf[(codon, strand)] = 'X'
+		return self.aminoAcidOf[(codon, strand)]
+
+	def aminoAcid(self, position, strand):
+		'''
+		The amino acid of the codon at sequence[position:position + 3], read on strand.
+		'''
+		if strand == -1:
+			position = self.length - position - 3
+			return self.reverseFrames[position % 3][position / 3]
+		return self.forwardFrames[position % 3][position / 3]
+
+	def untranslatable(self, start, end, strand):
+		'''
+		True if a codon of sequence[start:end] (in the frame of start for strand 1 and of end for strand -1) can't be 
+		translated, translating that slice would raise an error.
+		'''
+		start, end = self.sliceOf(start, end)
+		numberOfCodons = (end - start) / 3
+		if numberOfCodons <= 0:
+			return False
+		if strand == -1:
+			position = self.length - end
+			return 'X' in self.reverseFrames[position % 3][position / 3:position / 3 + numberOfCodons]
+		return 'X' in self.forwardFrames[start % 3][start / 3:start / 3 + numberOfCodons]
+
+	def sliceOf(self, start, end):
+		'''
+		The bounds python gives to sequence[start:end].
+		'''
+		if start < 0:
+			start = max(0, start + self.length)
+		if end < 0:
+			end = max(0, end + self.length)
+		return (min(start, self.length), min(end, self.length))
+
+	def firstAminoAcid(self, start, end, strand):
+		'''
+		The first amino acid of the translation of sequence[start:end] (reverse complemented for strand -1) read backwards, 
+		or '' if it has no whole codon. That is the codon at the left end, in the frame of start for strand 1 and of end 
+		for strand -1.
+		'''
+		start, end = self.sliceOf(start, end)
+		numberOfCodons = (end - start) / 3
+		if numberOfCodons <= 0:
+			return ''
+		if strand == -1:
+			return self.aminoAcid(end - 3 * numberOfCodons, strand)
+		return self.aminoAcid(start, strand)
+
+	def lastAminoAcid(self, start, end, strand):
+		'''
+		Like firstAminoAcid, for the codon at the right end.
+		'''
+		start, end = self.sliceOf(start, end)
+		numberOfCodons = (end - start) / 3
+		if numberOfCodons <= 0:
+			return ''
+		if strand == -1:
+			return self.aminoAcid(end - 3, strand)
+		return self.aminoAcid(start + 3 * (numberOfCodons - 1), strand)
+
 def genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput, buildCloroplast = False, dLoopSize = 800):
 	'''
-	Creates a genbank file based on a fasta file given (resultfile) and a list of features that the genbank
-	file should present (listoffeaturestooutput)
+	Annotates the sequence of a fasta file given (resultfile) with a list of features that the genbank
+	file should present (listoffeaturestooutput), returning the SeqRecord.
+	resultGbFile isn't written anymore, the record is built in memory. Use featureExport.writeAnnotation to write it.
 	'''
-	#creating the genbank file, not annotated, to be opened afterwards and have the features inserted
-	with open(resultGbFile, "w") as outputResult:
-		finalResults = SeqIO.read(open(resultFile, 'rU'), "fasta", generic_dna)
+	with open(resultFile, 'rU') as resultFasta:
+		finalResults = SeqIO.read(resultFasta, "fasta", generic_dna)
 		finalResults.seq = finalResults.seq.upper()
 		finalResults.name = finalResults.name[0:10] + '_draft'
 		finalResults.id = finalResults.name[0:10] + '_draft'
 		if len(finalResults.name) > 16: #has to 16 characters long at max, or else genbank file throws error
 			finalResults.name = finalResults.name[0:16]
 			finalResults.id = finalResults.id[0:16]
-		count = SeqIO.write(finalResults, outputResult, "genbank")
-
-	with open(resultGbFile, "rU") as outputResult: #opening the output file, this time to insert the features
-		finalResults = SeqIO.read(outputResult, "genbank", generic_dna)
+		frameTranslationsOf = {} #translation table -> FrameTranslations of finalResults
 		#lastFeatureAlignment = None
 		dLoopFound = False
 		for thisFeatureAlignment in listOfFeaturesToOutput:
@@ -106,9 +198,6 @@ def genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput, buildCloropl
 			# 4. Append your newly created SeqFeature to your SeqRecord
 			if main_feature_type == "gene":				
 				cds_qualifiers = dict(main_feature_qualifiers)
-				coding_dna = Seq(str(finalResults.seq[thisFeatureAlignment.startBase:thisFeatureAlignment.endBase]), IUPAC.unambiguous_dna)
-				if strandToOutput == -1:
-					coding_dna = coding_dna.reverse_complement()
 				translationTable = thisFeatureAlignment.translationTable
 				tableToUse = CodonTable.unambiguous_dna_by_id[translationTable]
 				listOfStartCodons = []
@@ -132,46 +221,47 @@ def genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput, buildCloropl
 					nWalkStart = 20
 					nWalkStop = 20			
 
+				try:
+					if translationTable not in frameTranslationsOf:
+						frameTranslationsOf[translationTable] = FrameTranslations(str(finalResults.seq), translationTable)
+				except:
+					frameTranslationsOf[translationTable] = None #the ends are left as they are, and it isn't tried again for the next gene
+				frameTranslations = frameTranslationsOf[translationTable]
+
 				try:
 					'''
 					Making sure it starts with startCodons
+					The translations are read backwards for genes in the -1 strand, so only the codon at the left end of each 
+					candidate matters.
+					Genes with codons that can't be translated are left as they are. Walking out of the gene, the walk stops 
+					looking at the first such codon (X), as translating the longer candidates failed from there on.
 					'''
 					try:
-						coding_dna_Translation = coding_dna.translate(table=translationTable)
-						coding_dna_TranslationForward = coding_dna.translate(table=translationTable)
-						coding_dna_TranslationBackward = coding_dna.translate(table=translationTable)
-						if strandToOutput == -1:
-							coding_dna_TranslationBackward = coding_dna_TranslationBackward[::-1]
-							coding_dna_TranslationForward = coding_dna_TranslationForward[::-1]
-						coding_dna_Forward = coding_dna
-						coding_dna_Backward = coding_dna
+						originalStartBase = thisFeatureAlignment.startBase
 						startBase = thisFeatureAlignment.startBase
 						endBase = thisFeatureAlignment.endBase
+						if frameTranslations.untranslatable(startBase, endBase, strandToOutput):
+							raise ValueError('untranslatable codon in ' + thisFeatureAlignment.seq2)
+						startTranslationBackward = frameTranslations.firstAminoAcid(startBase, endBase, strandToOutput)
+						startTranslationForward = startTranslationBackward
 						n = 0
-						while not coding_dna_TranslationForward.startswith(startCodons) \
-						and not coding_dna_TranslationBackward.startswith(startCodons) and n < nWalkStart and startBase - (3*n) >= 0:
-							try:
-								n += 1
-								coding_dna_Backward = Seq(str(finalResults.seq[startBase - (3*n):endBase]), IUPAC.unambiguous_dna)
-								if strandToOutput == -1:
-									coding_dna_Backward = coding_dna_Backward.reverse_complement()
-								coding_dna_TranslationBackward = coding_dna_Backward.translate(table=translationTable)
-								coding_dna_Forward = Seq(str(finalResults.seq[startBase + (3*n):endBase]), IUPAC.unambiguous_dna)
-								if strandToOutput == -1:
-									coding_dna_Forward = coding_dna_Forward.reverse_complement()
-								coding_dna_TranslationForward = coding_dna_Forward.translate(table=translationTable)
-								if strandToOutput == -1:
-									coding_dna_TranslationBackward = coding_dna_TranslationBackward[::-1]
-									coding_dna_TranslationForward = coding_dna_TranslationForward[::-1]
-							except:
-								pass
+						walkBlocked = False
+						while startTranslationForward not in startCodons and startTranslationBackward not in startCodons \
+						and n < nWalkStart and startBase - (3*n) >= 0:
+							n += 1
+							if walkBlocked == False:
+								if frameTranslations.firstAminoAcid(startBase - (3*n), endBase, strandToOutput) == 'X':
+									walkBlocked = True
+								else:
+									startTranslationBackward = frameTranslations.firstAminoAcid(startBase - (3*n), endBase, strandToOutput)
+									startTranslationForward = frameTranslations.firstAminoAcid(startBase + (3*n), endBase, strandToOutput)
 						else:
-							if coding_dna_TranslationBackward.startswith(startCodons):
+							if startTranslationBackward in startCodons:
 								main_start_pos = SeqFeature.ExactPosition(startBase - (3*n))
 								startBase += (3*n)
 								thisFeatureAlignment.startBase = startBase
 								main_feature_location = SeqFeature.FeatureLocation(main_start_pos,main_end_pos,strand=strandToOutput)
-							elif coding_dna_TranslationForward.startswith(startCodons):
+							elif startTranslationForward in startCodons:
 								main_start_pos = SeqFeature.ExactPosition(startBase + (3*n))
 								startBase += (3*n)
 								thisFeatureAlignment.startBase = startBase
@@ -183,43 +273,30 @@ def genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput, buildCloropl
 					Making sure it ends with * (stop codon)
 					'''
 					try:
-						coding_dna_Translation = coding_dna.translate(table=translationTable)
-						coding_dna_TranslationForward = coding_dna.translate(table=translationTable)
-						coding_dna_TranslationBackward = coding_dna.translate(table=translationTable)
-						if strandToOutput == -1:
-							coding_dna_TranslationBackward = coding_dna_TranslationBackward[::-1]
-							coding_dna_TranslationForward = coding_dna_TranslationForward[::-1]
-						coding_dna_Forward = coding_dna
-						coding_dna_Backward = coding_dna
 						startBase = thisFeatureAlignment.startBase
 						endBase = thisFeatureAlignment.endBase
+						if frameTranslations.untranslatable(originalStartBase, endBase, strandToOutput):
+							raise ValueError('untranslatable codon in ' + thisFeatureAlignment.seq2)
+						stopTranslationBackward = frameTranslations.lastAminoAcid(originalStartBase, endBase, strandToOutput)
+						stopTranslationForward = stopTranslationBackward
 						n = 0
-						while not coding_dna_TranslationForward.endswith(stopCodons) \
-						and not coding_dna_TranslationBackward.endswith(stopCodons) and n < nWalkStop and endBase + (3*n) <= len(finalResults):
-							try:
-								n += 1
-								coding_dna_Backward = Seq(str(finalResults.seq[startBase:endBase - (3*n)]), IUPAC.unambiguous_dna)
-								if strandToOutput == -1:
-									coding_dna_Backward = coding_dna_Backward.reverse_complement()
-								coding_dna_TranslationBackward = coding_dna_Backward.translate(table=translationTable)
-								
-								coding_dna_Forward = Seq(str(finalResults.seq[startBase:endBase + (3*n)]), IUPAC.unambiguous_dna)
-								if strandToOutput == -1:
-									coding_dna_Forward = coding_dna_Forward.reverse_complement()
-								coding_dna_TranslationForward = coding_dna_Forward.translate(table=translationTable)
-
-								if strandToOutput == -1:
-									coding_dna_TranslationBackward = coding_dna_TranslationBackward[::-1]
-									coding_dna_TranslationForward = coding_dna_TranslationForward[::-1]
-							except:
-								pass
+						walkBlocked = False
+						while stopTranslationForward not in stopCodons and stopTranslationBackward not in stopCodons \
+						and n < nWalkStop and endBase + (3*n) <= len(finalResults):
+							n += 1
+							stopTranslationBackward = frameTranslations.lastAminoAcid(startBase, endBase - (3*n), strandToOutput)
+							if walkBlocked == False:
+								if frameTranslations.lastAminoAcid(startBase, endBase + (3*n), strandToOutput) == 'X':
+									walkBlocked = True
+								else:
+									stopTranslationForward = frameTranslations.lastAminoAcid(startBase, endBase + (3*n), strandToOutput)
 						else:
-							if coding_dna_TranslationBackward.endswith(stopCodons):
+							if stopTranslationBackward in stopCodons:
 								main_end_pos = SeqFeature.ExactPosition(endBase - (3 * n))
 								endBase -= (3 * (n-1))
 								thisFeatureAlignment.endBase = endBase
 								main_feature_location = SeqFeature.FeatureLocation(main_start_pos,main_end_pos,strand=strandToOutput)
-							elif coding_dna_TranslationForward.endswith(stopCodons):
+							elif stopTranslationForward in stopCodons:
 								main_end_pos = SeqFeature.ExactPosition(endBase + (3 * n))
 								endBase += (3 * (n-1))
 								thisFeatureAlignment.endBase = endBase
@@ -25,10 +25,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from Bio import SeqIO, SearchIO
+from Bio import SeqIO
 from Bio.Alphabet import generic_dna, generic_protein
-from subprocess import Popen
-import genbankOutput, tRNAscanChecker
+from profiling import Popen
+import genbankOutput, featureExport, tRNAscanChecker, referenceCache, parallelTasks, workspace, blastTabular
 from tRNAscanChecker import tRNAconvert, prettyRNAName
 import shlex, sys, os, shutil
 
@@ -58,189 +58,143 @@ class Alignment():
 	def __lt__(self, other):
 		return self.startBase < other.startBase
 
-def geneCheck(genBankReference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder, organismType = 2, alignCutOff = 0.45):
+def cdsCheck(reference, resultFile, usedOwnGenBankReference, blastFolder, organismType = 2, workDir = '', threadsToUse = 2):
 	'''
-	Returns a tuple with 2 dictionaries, one with the features found and another with features to look for.
+	Looks for the protein coding genes of the reference in resultFile, with blastx on threadsToUse threads.
+	Returns a tuple with the features found, the split ones and the complete ones.
 	'''
-	record = SeqIO.read(genBankReference, "genbank", generic_dna)
 	refSeq = SeqIO.read(resultFile, "fasta", generic_dna)
-	listOfImportantFeatures = {}
-	print 'Checking genes, tRNAs and rRNAs from reference with organismType=%s...' % organismType
-
-	'''
-	Do protein coding genes first!
-	'''
-	#let's create the fasta file and the list of features we are looking for
-	with open('important_features.fasta', 'w') as importantFeaturesFile:
-		for feature in record.features:
-			if feature.type.lower() == 'cds':
-				if 'gene' in feature.qualifiers:
-					featureName = feature.qualifiers['gene'][0]
-				elif 'product' in feature.qualifiers:
-					featureName = feature.qualifiers['product'][0]
-				featureName = ''.join(featureName.split())
-				if featureName in listOfImportantFeatures:
-					featureName += '_' + str(listOfImportantFeatures.keys().count(featureName) + 1)
-					
-				importantFeaturesFile.write('>' + featureName + '\n')
-				if 'translation' in feature.qualifiers:
-					importantFeaturesFile.write(str(feature.qualifiers['translation'][0]) + '\n')
-				else:
-					importantFeaturesFile.write(str(feature.extract(record).seq.translate(table=organismType,to_stop=True))+'\n')
-					print '		WARNING: reference did not give a CDS translation for %s. Creating our own from refSeq.' \
-						% featureName
-				listOfImportantFeatures[featureName] = feature
+	listOfImportantFeatures = reference.cdsFeatures
+	if workDir != '' and not os.path.exists(workDir): os.makedirs(workDir)
 
-	#running blast
-	print "Formatting database for blast..."
-	if blastFolder == 'installed':
-		command = "formatdb -i important_features.fasta -p T" #need to formatdb refseq first
-	else:
-		command = blastFolder + "/bin/makeblastdb -in important_features.fasta -dbtype prot" #need to formatdb refseq first
-
-	args = shlex.split(command)
-	formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
-	formatDB.wait()
-	
 	#print "Running blast against refSeq to determine if a hit was built..."
-	with open("important_features.blast.xml",'w') as blastResultFile:
-		if usedOwnGenBankReference == True: #using a personal genbank reference
-			if blastFolder == 'installed':
-				command = "blastall -p blastx -d important_features.fasta -i" + resultFile + " -e 0.1 -m 7" #call BLAST with XML output
-			else:
-				command = blastFolder + "/bin/blastx -db important_features.fasta -query " + resultFile + " -evalue 0.1 -outfmt 5 -num_threads 2 -query_gencode " + str(organismType) #call BLAST with XML output
-		else: #using a non personal genbank reference
-			if blastFolder == 'installed':
-				command = "blastall -p blastx -d important_features.fasta -i" + resultFile + " -e 0.1 -m 7" #call BLAST with XML output
-			else:
-				print('Genetic code: ', str(organismType))
-				command = blastFolder + "/bin/blastx -db important_features.fasta -query " + resultFile + " -outfmt 5 -num_threads 2 -query_gencode " + str(organismType) + " -evalue 0.1" #call BLAST with XML output
-		args = shlex.split(command)
-		blastAll = Popen(args, stdout=blastResultFile)
-		blastAll.wait()
+	if usedOwnGenBankReference == True: #using a personal genbank reference
+		if blastFolder == 'installed':
+			command = "blastall -p blastx -d " + reference.cdsFasta + " -i" + resultFile + " -e 0.1"
+		else:
+			command = blastFolder + "/bin/blastx -db " + reference.cdsFasta + " -query " + resultFile + " -evalue 0.1 -num_threads " + str(threadsToUse) + " -query_gencode " + str(organismType)
+	else: #using a non personal genbank reference
+		if blastFolder == 'installed':
+			command = "blastall -p blastx -d " + reference.cdsFasta + " -i" + resultFile + " -e 0.1"
+		else:
+			print('Genetic code: ', str(organismType))
+			command = blastFolder + "/bin/blastx -db " + reference.cdsFasta + " -query " + resultFile + " -num_threads " + str(threadsToUse) + " -query_gencode " + str(organismType) + " -evalue 0.1"
+	blastTable = blastTabular.runBlast(command, workDir + 'important_features.cds.blast.tsv', blastFolder == 'installed')
 
-	#SearchIO object handler and checker for best hit separation
+	#checker for best hit separation, each row of blastTable is a HSP
 	listOfSplits = []
 	listOfCompleteGenes = []
-	blastparse = SearchIO.parse('important_features.blast.xml', 'blast-xml') #get all queries
 	listOfPresentFeatures = {}
-	for qresult in blastparse: #in each query, let's look for a good hit
-		for qhit in qresult.hits:
-			for hsp in qhit.hsps: #hsp object checking, this contains the alignment info
-				featureName = qhit.id
-				if featureName in listOfImportantFeatures:
-					targetFeature = listOfImportantFeatures[featureName]
-					startBase = min(hsp.query_range[0],hsp.query_range[1])
-					endBase = max(hsp.query_range[0],hsp.query_range[1])
-					alignLen = endBase - startBase
-					if featureName in listOfPresentFeatures:
-						mainFeatureName = featureName
-						mainFeatureFound = listOfPresentFeatures[mainFeatureName]
-						mainFeatureFoundAlignment = mainFeatureFound[1]
-						#check if it's close in order to consider it a split sequence
-						if (abs(startBase - mainFeatureFoundAlignment.endBase) < 100 or abs(endBase - mainFeatureFoundAlignment.startBase) < 100) or (mainFeatureFoundAlignment.startBase <= 60 and endBase >= len(refSeq.seq) - 60):
-							print '%s is split or duplicated.' % featureName
-							if not (startBase > mainFeatureFoundAlignment.startBase and \
-								endBase < mainFeatureFoundAlignment.endBase):
-								if featureName not in listOfSplits:
-									listOfSplits.append(featureName)
-								featureName += '_' + str(listOfPresentFeatures.keys().count(featureName) + 1)
-								featureFrame = hsp.query_frame
-								seqName = featureName
-								alignment = Alignment(featureName, seqName, alignLen)
-								alignment.refSeq = refSeq
-								alignment.translationTable = organismType
-								alignment.frame = featureFrame
-								alignment.startBase = startBase
-								alignment.endBase = endBase
-								alignment.seqFound = refSeq.seq[startBase:endBase]
-								listOfPresentFeatures[featureName] = (listOfImportantFeatures[qhit.id], alignment,
-																								 featureFrame <= -1)
-					else:
-						if alignLen >= len(targetFeature) * 0.10:
-							featureFrame = hsp.query_frame
-							seqName = featureName
-							alignment = Alignment(featureName, seqName, alignLen)
-							alignment.refSeq = refSeq
-							alignment.translationTable = organismType
-							alignment.frame = featureFrame
-							alignment.startBase = startBase
-							alignment.endBase = endBase
-							alignment.seqFound = refSeq.seq[startBase:endBase]
-							listOfPresentFeatures[featureName] = (listOfImportantFeatures[qhit.id], alignment, featureFrame <= -1)
-							if alignLen >= len(targetFeature) * 0.99:
-							#if we've already built a lot, dont even bother with finding splits
-								listOfCompleteGenes.append(featureName)
-								break
-
-	#copying the blast result in order for this info to be assessed later if the user desires
-	shutil.copyfile("important_features.blast.xml", "important_features.cds.blast.xml")
-	shutil.copyfile("important_features.fasta", "important_features.cds.fasta")
-
-	#let's create the fasta file and the list of features we are looking for
-	with open('important_features.fasta', 'w') as importantFeaturesFile:
-		for feature in record.features:
-			if feature.type == 'rRNA' or feature.type == 'tRNA':
-				if 'gene' in feature.qualifiers:
-					featureName = feature.qualifiers['gene'][0]
-					featureName = ''.join(featureName.split())
-				elif 'product' in feature.qualifiers:
-					featureName = feature.qualifiers['product'][0]
-					featureName = ''.join(featureName.split())
-				if featureName in listOfImportantFeatures:
-					featureName += str(listOfImportantFeatures.keys().count(featureName) + 1)
-					importantFeaturesFile.write('>' + featureName + '\n')
-					importantFeaturesFile.write(str(feature.extract(record).seq) + '\n')
-					listOfImportantFeatures[featureName] = feature
-				else:
-					importantFeaturesFile.write('>' + featureName + '\n')
-					importantFeaturesFile.write(str(feature.extract(record).seq) + '\n')
-					listOfImportantFeatures[featureName] = feature
+	completeHit = None #once a hit is complete, its other HSPs are skipped
+	for hspRow in xrange(len(blastTable)): #in each query, let's look for a good hit
+		hitId = blastTable.hitIds[hspRow]
+		if hitId == completeHit:
+			continue
+		featureName = hitId
+		if featureName in listOfImportantFeatures:
+			targetFeature = listOfImportantFeatures[featureName]
+			startBase = blastTable.queryStart[hspRow]
+			endBase = blastTable.queryEnd[hspRow]
+			alignLen = endBase - startBase
+			if featureName in listOfPresentFeatures:
+				mainFeatureName = featureName
+				mainFeatureFound = listOfPresentFeatures[mainFeatureName]
+				mainFeatureFoundAlignment = mainFeatureFound[1]
+				#check if it's close in order to consider it a split sequence
+				if (abs(startBase - mainFeatureFoundAlignment.endBase) < 100 or abs(endBase - mainFeatureFoundAlignment.startBase) < 100) or (mainFeatureFoundAlignment.startBase <= 60 and endBase >= len(refSeq.seq) - 60):
+					print '%s is split or duplicated.' % featureName
+					if not (startBase > mainFeatureFoundAlignment.startBase and \
+						endBase < mainFeatureFoundAlignment.endBase):
+						if featureName not in listOfSplits:
+							listOfSplits.append(featureName)
+						featureName += '_' + str(listOfPresentFeatures.keys().count(featureName) + 1)
+						featureFrame = blastTable.queryFrame[hspRow]
+						seqName = featureName
+						alignment = Alignment(featureName, seqName, alignLen)
+						alignment.refSeq = refSeq
+						alignment.translationTable = organismType
+						alignment.frame = featureFrame
+						alignment.startBase = startBase
+						alignment.endBase = endBase
+						alignment.seqFound = refSeq.seq[startBase:endBase]
+						listOfPresentFeatures[featureName] = (listOfImportantFeatures[hitId], alignment,
+																						 featureFrame <= -1)
+			else:
+				if alignLen >= len(targetFeature) * 0.10:
+					featureFrame = blastTable.queryFrame[hspRow]
+					seqName = featureName
+					alignment = Alignment(featureName, seqName, alignLen)
+					alignment.refSeq = refSeq
+					alignment.translationTable = organismType
+					alignment.frame = featureFrame
+					alignment.startBase = startBase
+					alignment.endBase = endBase
+					alignment.seqFound = refSeq.seq[startBase:endBase]
+					listOfPresentFeatures[featureName] = (listOfImportantFeatures[hitId], alignment, featureFrame <= -1)
+					if alignLen >= len(targetFeature) * 0.99:
+					#if we've already built a lot, dont even bother with finding splits
+						listOfCompleteGenes.append(featureName)
+						completeHit = hitId
+
+	#copying the features searched in order for this info to be assessed later if the user desires
+	shutil.copyfile(reference.cdsFasta, workDir + "important_features.cds.fasta")
+
+	return (listOfPresentFeatures, listOfSplits, listOfCompleteGenes)
+
+def rnaCheck(reference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder, alignCutOff = 0.45, workDir = '',
+			 threadsToUse = 2):
+	'''
+	Looks for the rRNAs and tRNAs of the reference in resultFile, with blastn on threadsToUse threads.
+	Returns a dictionary with the features found.
+	'''
+	refSeq = SeqIO.read(resultFile, "fasta", generic_dna)
+	listOfImportantFeatures = reference.allFeatures
+	listOfPresentFeatures = {}
+	if workDir != '' and not os.path.exists(workDir): os.makedirs(workDir)
 
-	#running blast
+	#the rRNAs and tRNAs, with the fasta file from the cache
+	shutil.copyfile(reference.rnaFasta, workDir + 'important_features.fasta')
+
+	#running blast, the database of resultFile is created inside workDir
 	print "Formatting database for blast..."
+	resultDatabase = workDir + os.path.basename(resultFile)
 	if blastFolder == 'installed':
-		command = "formatdb -i " + resultFile + " -p F" #need to formatdb refseq first
+		command = "formatdb -i " + resultFile + " -p F -n " + resultDatabase #need to formatdb refseq first
 	else:
-		command = blastFolder + "/bin/makeblastdb -in " + resultFile + " -dbtype nucl" #need to formatdb refseq first
+		command = blastFolder + "/bin/makeblastdb -in " + resultFile + " -dbtype nucl -out " + resultDatabase #need to formatdb refseq first
 
 	args = shlex.split(command)
 	formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
 	formatDB.wait()
 
-	with open("important_features.blast.xml",'w') as blastResultFile:
-		if usedOwnGenBankReference == True: #using a personal genbank reference, make e-value more restrict
-			if blastFolder == 'installed':
-				command = "blastall -p blastn -d " + resultFile + " -i important_features.fasta -e 4.0 -m 7" #call BLAST with XML output
-			else:
-				command = blastFolder + "/bin/blastn -task blastn -db " + resultFile + " -query important_features.fasta -evalue 4.0 -outfmt 5 -num_threads 2 -word_size 8 -perc_identity " + str(cutoffEquality) + " -max_hsps 5 -gapextend 2 -gapopen 2" #call BLAST with XML output
-		else: #using a non personal genbank reference
-			if blastFolder == 'installed':
-				command = "blastall -p blastn -d " + resultFile + " -i important_features.fasta -e 6.0 -m 7" #call BLAST with XML output
-			else:
-				command = blastFolder + "/bin/blastn -task blastn -db " + resultFile + " -query important_features.fasta -evalue 6.0 -outfmt 5 -num_threads 2 -word_size 8 -perc_identity " + str(cutoffEquality) + " -max_hsps 5 -gapextend 2 -gapopen 2" #call BLAST with XML output
-		args = shlex.split(command)
-		blastAll = Popen(args, stdout=blastResultFile)
-		blastAll.wait()
-
-	#SearchIO object handler and checker for best hit separation
-	blastparse = SearchIO.parse('important_features.blast.xml', 'blast-xml') #get all queries
-	for qresult in blastparse: #in each query, let's look for a good hit
-		for hsp in qresult.hsps: #hsp object checking, this contains the alignment info
-			featureName = qresult.id
+	if usedOwnGenBankReference == True: #using a personal genbank reference, make e-value more restrict
+		if blastFolder == 'installed':
+			command = "blastall -p blastn -d " + resultDatabase + " -i " + workDir + "important_features.fasta -e 4.0"
+		else:
+			command = blastFolder + "/bin/blastn -task blastn -db " + resultDatabase + " -query " + workDir + "important_features.fasta -evalue 4.0 -num_threads " + str(threadsToUse) + " -word_size 8 -perc_identity " + str(cutoffEquality) + " -max_hsps 5 -gapextend 2 -gapopen 2"
+	else: #using a non personal genbank reference
+		if blastFolder == 'installed':
+			command = "blastall -p blastn -d " + resultDatabase + " -i " + workDir + "important_features.fasta -e 6.0"
+		else:
+			command = blastFolder + "/bin/blastn -task blastn -db " + resultDatabase + " -query " + workDir + "important_features.fasta -evalue 6.0 -num_threads " + str(threadsToUse) + " -word_size 8 -perc_identity " + str(cutoffEquality) + " -max_hsps 5 -gapextend 2 -gapopen 2"
+	blastTable = blastTabular.runBlast(command, workDir + 'important_features.blast.tsv', blastFolder == 'installed')
+
+	#checker for best hit separation, each row of blastTable is a HSP
+	for featureName in blastTable.queryIds: #in each query, let's look for a good hit
+		for hspRow in blastTable.rowsOf(featureName): #the alignment info of each HSP
 			targetFeature = listOfImportantFeatures[featureName]
-			alignLen = hsp.aln_span
+			alignLen = blastTable.alnSpan[hspRow]
 			if alignLen >= len(targetFeature) * alignCutOff:
-				featureFrame = hsp.hit_frame
+				featureFrame = blastTable.hitFrame[hspRow]
 				seqName = featureName
 				alignment = Alignment(featureName, seqName, alignLen)
 				alignment.refSeq = refSeq
 				alignment.frame = featureFrame
-				startBase = min(hsp.hit_range[0],hsp.hit_range[1])
-				endBase = max(hsp.hit_range[0],hsp.hit_range[1])
+				startBase = blastTable.hitStart[hspRow]
+				endBase = blastTable.hitEnd[hspRow]
 				if alignLen <= len(targetFeature) * 0.98:
-					queryStart = min(hsp.query_range[0],hsp.query_range[1])
-					queryEnd = max(hsp.query_range[0],hsp.query_range[1])
+					queryStart = blastTable.queryStart[hspRow]
+					queryEnd = blastTable.queryEnd[hspRow]
 					newEnd = endBase + (len(targetFeature) - queryEnd)
 					if newEnd <= len(refSeq.seq):
 						endBase = endBase + (len(targetFeature) - queryEnd)
@@ -253,7 +207,53 @@ def geneCheck(genBankReference, resultFile, cutoffEquality, usedOwnGenBankRefere
 				listOfPresentFeatures[featureName] = (listOfImportantFeatures[featureName], alignment, featureFrame == -1)
 				break
 	
-	return (listOfPresentFeatures, listOfImportantFeatures, listOfSplits, listOfCompleteGenes)
+	return listOfPresentFeatures
+
+def geneCheckTasks(genBankReference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder, organismType = 2,
+				   alignCutOff = 0.45, workDir = '', threadsToUse = 2):
+	'''
+	Splits geneCheck in two independent tasks for parallelTasks.runTasks, the CDSs (blastx) and the rRNAs/tRNAs (blastn), 
+	each with its own scratch folder inside workDir and threadsToUse threads.
+	Returns the list of tasks and a function that merges their results into what geneCheck returns.
+	'''
+	print 'Checking genes, tRNAs and rRNAs from reference with organismType=%s...' % organismType
+
+	#the features we are looking for, and their blast database, come from the reference cache
+	reference = referenceCache.loadReference(genBankReference, organismType, blastFolder)
+
+	listOfTasks = [(cdsCheck, (reference, resultFile, usedOwnGenBankReference, blastFolder, organismType, workDir + 'cds/'),
+					{'threadsToUse': threadsToUse}),
+				   (rnaCheck, (reference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder, alignCutOff, workDir + 'rna/'),
+					{'threadsToUse': threadsToUse})]
+
+	def mergeChecks(cdsResults, rnaResults):
+		listOfPresentFeatures, listOfSplits, listOfCompleteGenes = cdsResults
+		listOfPresentFeatures.update(rnaResults)
+		return (listOfPresentFeatures, dict(reference.allFeatures), listOfSplits, listOfCompleteGenes)
+
+	return (listOfTasks, mergeChecks)
+
+def geneCheckOutputs(resultFile, workDir = ''):
+	'''
+	The files the tasks of geneCheckTasks leave in workDir, for parallelTasks.collectScratch: the blast results, the 
+	features searched and the blast database of resultFile.
+	'''
+	resultDatabase = workDir + 'rna/' + os.path.basename(resultFile)
+	return [workDir + 'cds/important_features.cds.blast.tsv', workDir + 'cds/important_features.cds.fasta',
+			workDir + 'rna/important_features.blast.tsv', workDir + 'rna/important_features.fasta',
+			resultDatabase + '.nin', resultDatabase + '.nhr', resultDatabase + '.nsq']
+
+def geneCheck(genBankReference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder, organismType = 2, alignCutOff = 0.45):
+	'''
+	Returns a tuple with 2 dictionaries, one with the features found and another with features to look for.
+	The CDSs and the rRNAs/tRNAs are searched at the same time, their files end up in the current folder as before.
+	'''
+	scratchFolder = workspace.scratchFolder('genecheck_tmp')
+	listOfTasks, mergeChecks = geneCheckTasks(genBankReference, resultFile, cutoffEquality, usedOwnGenBankReference, blastFolder,
+											  organismType, alignCutOff, scratchFolder)
+	cdsResults, rnaResults = parallelTasks.runTasks(listOfTasks)
+	parallelTasks.collectScratch(scratchFolder, geneCheckOutputs(resultFile, scratchFolder))
+	return mergeChecks(cdsResults, rnaResults)
 
 def createImageOfAnnotation(sequenceObject, outputFile):
 	'''Creates an image of the annotation, with relative positions of features and it's size'''
@@ -460,58 +460,20 @@ if __name__ == "__main__":
 
 		finalResults = genbankOutput.genbankOutput(outputFile, resultFile, listOfFeaturesToOutput, False, 900)
 
-		with open(outputFile, "w") as outputResult:
-			count = SeqIO.write(finalResults, outputResult, "genbank")
-			createImageOfAnnotation(finalResults, 'result.png')
-		with open(outputFile + '.tbl',"w") as outputSeqIn:
-			outputSeqIn.write('>Features ' + finalResults.name + '\n')
-			for gbkFeature in finalResults.features:
-				if gbkFeature.location.strand == 1 or gbkFeature.location.strand == None:
-					outputSeqIn.write(str(gbkFeature.location.start + 1) + ' ' + str(gbkFeature.location.end)\
-							 + ' ' + str(gbkFeature.type) + '\n\t\t')
-				else:
-					outputSeqIn.write(str(gbkFeature.location.end) + ' ' + str(gbkFeature.location.start + 1)\
-							 + ' ' + str(gbkFeature.type) + '\n\t\t')
-				for qualifier in gbkFeature.qualifiers:
-					if qualifier == 'product' or qualifier == 'gene':
-						outputSeqIn.write(str(qualifier) + ' ' + str(gbkFeature.qualifiers[qualifier]) + '\n')
-				outputSeqIn.write('\n')
-			print '.tbl (Sequin) file created.'
-
-		if ('TRNF' in presentFeatures) or ('tRNA-Phe' in presentFeatures) or ('trnf' in presentFeatures) or ('trnF' in presentFeatures):
+		pheStart = None
+		for lookForPhe in ('TRNF', 'tRNA-Phe', 'trnf', 'trnF'):
+			if lookForPhe in presentFeatures:
+				pheStart = presentFeatures[lookForPhe][1].startBase
+				break
+
+		orderedFinalResults = featureExport.writeAnnotation(finalResults, outputFile.replace('.gb',''), pheStart,
+															outputFile.replace('.gb','') + '.ordered')
+		createImageOfAnnotation(finalResults, 'result.png')
+		print '.tbl (Sequin) file created.'
+
+		if orderedFinalResults is not None:
 			print 'Creating ordered genbank file (with tRNA-Phe at the start)...'
-			resultOrderedGbFile = outputFile.replace('.gb','') + '.ordered.gb'
-
-			if 'TRNF' in presentFeatures:
-				lookForPhe = 'TRNF'
-			elif 'tRNA-Phe' in presentFeatures:
-				lookForPhe = 'tRNA-Phe'
-			elif 'trnf' in presentFeatures:
-				lookForPhe = 'trnf'
-			elif 'trnF' in presentFeatures:
-				lookForPhe = 'trnF'
-
-			pheAlignment = presentFeatures[lookForPhe][1]
-			pheStart = pheAlignment.startBase
-			orderedFinalResults = finalResults[pheStart:] + finalResults[0:pheStart]
-
-			with open(resultOrderedGbFile, "w") as outputResult: #create the file!
-				count = SeqIO.write(orderedFinalResults, outputResult, "genbank")
-				count = SeqIO.write(orderedFinalResults, resultOrderedGbFile.replace('.gb','.fasta'), "fasta")
-				createImageOfAnnotation(orderedFinalResults, 'orderedResult.png')
-			with open(resultOrderedGbFile + '.tbl',"w") as outputSeqIn:
-				outputSeqIn.write('>Features ' + finalResults.name + '\n')
-				for gbkFeature in orderedFinalResults.features:
-					if gbkFeature.location.strand == 1 or gbkFeature.location.strand == None:
-						outputSeqIn.write(str(gbkFeature.location.start + 1) + ' ' + str(gbkFeature.location.end)\
-							 	 + ' ' + str(gbkFeature.type) + '\n\t\t')
-					else:
-						outputSeqIn.write(str(gbkFeature.location.end) + ' ' + str(gbkFeature.location.start)\
-								  + ' ' + str(gbkFeature.type) + '\n\t\t')
-					for qualifier in gbkFeature.qualifiers:
-						if qualifier == 'product' or qualifier == 'gene':
-							outputSeqIn.write(str(qualifier) + ' ' + str(gbkFeature.qualifiers[qualifier]) + '\n')
-					outputSeqIn.write('\n')
-				print 'Ordered .tbl file created.'
+			createImageOfAnnotation(orderedFinalResults, 'orderedResult.png')
+			print 'Ordered .tbl file created.'
 		else:
 			print "Since tRNA-Phe couldn't be found, ordered genbank file wasn't created."
@@ -25,12 +25,12 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-import recursiveSOAP, recursiveSOAPdenovo, recursiveMira, miraMapping, mitoBimWrapper, \
-	circularizationCheck, tRNAscanChecker, geneChecker, genbankOutput, recursiveSPAdes
+import recursiveSOAP, recursiveSOAPdenovo, recursiveMira, miraMapping, mitoBimWrapper, mitoBimEngine, \
+	circularizationCheck, tRNAscanChecker, geneChecker, genbankOutput, featureExport, recursiveSPAdes, pipelineCheckpoint, parallelTasks, workspace, profiling, readBaiting, kmerScheduler, kmerSpectrum, readStreams, referenceLibrary
 import argparse, os, shlex, shutil, sys
 from tRNAscanChecker import tRNAconvert, prettyRNAName
 from geneChecker import createImageOfAnnotation
-from subprocess import Popen
+from profiling import Popen
 from Bio import SeqIO, SeqFeature, SeqUtils
 from Bio.Alphabet import generic_dna, generic_protein
 
@@ -52,8 +52,23 @@ if __name__ == "__main__":
 						default='23,31', dest='kmers')
 	parser.add_argument('-p', '--processors', help='Number of threads SOAPdenovo-Trans and Mira will use at most.', type=int,
 						default=4, dest='processorsToUse')
+	parser.add_argument('--parallelkmers', help='Number of k-mers to assemble at the same time during the DeNovo phase. The -p threads are split among them. Default = 1',
+						type=int, default=1, dest='parallelKmers')
+	parser.add_argument('--rankkmers', help='Try the k-mers in the order predicted to work best from the read lengths, instead of the order given in -k. Default = False',
+						default=False, dest='rankKmers', action='store_true')
+	parser.add_argument('--autokmers', help='Choose the k-mers to try from the coverage of the target DNA in the k-mer spectrum of a sample of the reads, instead of -k.\n\
+						   -k is used if no high coverage peak is found. Default = False',
+						default=False, dest='autoKmers', action='store_true')
+	parser.add_argument('--targetcoverage', help='Subsample the reads down to about this coverage of the target DNA, estimated from the k-mer spectrum,\n\
+						   for every stage (DeNovo, mapping and MITObim). Use 0 to keep every read. Default = 0', type=int,
+						default=0, dest='targetCoverage')
+	parser.add_argument('--removeduplicates', help='Drop reads (or pairs) with the exact same sequence from the read pool of MIRA mapping and MITObim. Default = False',
+						default=False, dest='removeDuplicates', action='store_true')
 	parser.add_argument('-r', '--refseq', help='What reference sequence should we look for, in fasta or genbank? Example: mitochondrial DNA of related species',
 						default=None, dest='refSeqFile')
+	parser.add_argument('--noautoreference', help='Without -r, do not pick the closest reference of the reference library (references/library.tsv)\n\
+						   from a sample of the reads (or from the --skipdenovo sequence) and use it as -r. Default = False',
+						default=True, dest='autoReference', action='store_false')
 	parser.add_argument('-op', '--optimum', help='What optimum length of sequence should we look for? Ex: 16kb for mtDNA.\nIf refSeq is present, look for a sequence with its size - a cutoff value',
 						default=-1, type=int, dest='sizeToLook')
 	parser.add_argument('-c', '--mincutoff', help='Minimum size to consider. Default = -1\nUse -1 to automatically set this parameter.', type=int,
@@ -127,6 +142,11 @@ if __name__ == "__main__":
 						type=int, default=1, dest='organismType')
 	parser.add_argument('--skipmitobim', help="Don't run MITObim after mapping assembly? Default = False",
 						default=False, dest='skipMitobim', action='store_true')
+	parser.add_argument('--nativemitobim', help="Extend the mapping result in process (mitoBimEngine.py) instead of running MITObim.pl, stopping as soon as it\n\
+						   stops growing or circularizes. -mti is the maximum number of iterations. No .maf/.caf is written. Default = False",
+						default=False, dest='nativeMitobim', action='store_true')
+	parser.add_argument('--mitobimgrowth', help="Stop MITObim once an iteration grows the backbone by less than this many bases (it also stops once the\n\
+						   backbone circularizes). Default = 1", type=int, default=1, dest='mitobimMinimumGrowth')
 	parser.add_argument('--skipdenovo', help="Skip DeNovo phase? Default = False \nYou need to input a fasta or genbank file \
 						containing a sequence to start the process", \
 						default=False, dest='skipFirstStep')
@@ -136,6 +156,17 @@ if __name__ == "__main__":
 						default=50, dest='edgesToLook')
 	parser.add_argument('--noextension', help="Don't try to extend De-Novo assembly? Default = False",
 						default=False, dest='noExtension', action='store_true')
+	parser.add_argument('--bait', help="Before DeNovo, keep only the reads that share k-mers with -r (or high copy k-mers, without -r) and assemble those. Mapping and MITObim still use every read. Default = False",
+						default=False, dest='baitReads', action='store_true')
+	parser.add_argument('--baitkmer', help="k-mer size used by --bait. Default = 25", type=int,
+						default=25, dest='baitKmer')
+	parser.add_argument('--workdir', help="Folder where this run keeps all of its files, so several jobs can run on the same machine (only one job at a\n\
+						   time can use a folder). Default = current folder",
+						default='.', dest='workFolder')
+	parser.add_argument('--scratchdir', help="Folder for the small temporary files of the checks, like a tmpfs (/dev/shm). Default = inside --workdir",
+						default=None, dest='scratchFolder')
+	parser.add_argument('--resume', help="Skip every stage whose checkpoint (saved in <jobname>_checkpoints/) is still valid and restart from the first stale one. Default = False",
+						default=False, dest='resume', action='store_true')
 	#parser.add_argument('--version', help="Version=1.14", default=False, dest='versionCheck', action='store_true')
 	args = parser.parse_args()
 
@@ -146,667 +177,804 @@ if __name__ == "__main__":
 	print 'Now running generalMaker.py ...'
 
 	'''
-	Read config file and import information.
+	Create the workspace of this run and move into it, every file of the run is saved there.
 	'''
-	module_dir = os.path.dirname(__file__)
-	module_dir = os.path.abspath(module_dir)
-	cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
-
-	with open(cfg_full_path,'r') as configFile:
-		for line in configFile:
-			if '#' != line[0] and line != '\n':
-				configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
-				if configPart == 'mitobimfolder':
-					mitobimFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'mitobim1.7folder':
-					newMitobimFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'mira4folder':
-					pathToNewMira = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'mira3folder':
-					pathToOldMira = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'soaptransfolder':
-					soapTransFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'soapdenovofolder':
-					soapDeNovoFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'spadesfolder':
-					spadesFolder = line.replace('\n','').replace(' ','').split('=')[-1]
-				elif configPart == 'blastfolder':
-					blastFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+	if args.refSeqFile != None:
+		args.refSeqFile = os.path.abspath(args.refSeqFile)
+	if args.skipFirstStep != False:
+		args.skipFirstStep = os.path.abspath(args.skipFirstStep)
+	runWorkspace = workspace.Workspace(args.processName, args.workFolder, args.scratchFolder)
+	inputFile = os.path.abspath(args.inputFile)
+	launchFolder = os.getcwd()
+	if runWorkspace.folder != os.getcwd():
+		#the DeNovo modules expect the input file inside the current folder
+		args.inputFile = os.path.basename(inputFile)
+	if runWorkspace.enter() == False:
+		print 'Another job (%s) is already running in %s. Give each job its own folder with --workdir.' % (runWorkspace.lockOwner,
+																										   runWorkspace.folder)
+		sys.exit(1)
+	#from here on the workspace is locked, so the report and leave() have to run whatever happens
+	try:
+		workspace.activate(runWorkspace)
+		if inputFile != os.path.abspath(args.inputFile):
+			#relative read paths are taken from the folder of the config file, or from the one mitomaker was started in
+			readStreams.copyConfig(inputFile, args.inputFile, [os.path.dirname(inputFile), launchFolder])
+		print 'Working folder: %s' % runWorkspace.folder
+		profiling.nextStage('setup')
+
+		'''
+		Read config file and import information.
+		'''
+		module_dir = os.path.dirname(__file__)
+		module_dir = os.path.abspath(module_dir)
+		cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+
+		with open(cfg_full_path,'r') as configFile:
+			for line in configFile:
+				if '#' != line[0] and line != '\n':
+					configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+					if configPart == 'mitobimfolder':
+						mitobimFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'mitobim1.7folder':
+						newMitobimFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'mira4folder':
+						pathToNewMira = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'mira3folder':
+						pathToOldMira = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'soaptransfolder':
+						soapTransFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'soapdenovofolder':
+						soapDeNovoFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'spadesfolder':
+						spadesFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+					elif configPart == 'blastfolder':
+						blastFolder = line.replace('\n','').replace(' ','').split('=')[-1]
 					
-	#if config file has 'default' in the folder field, use the default program folders given with the script
-	if mitobimFolder.lower() == 'default':
-		mitobimFolder = os.path.join(module_dir, 'mitobim1.6/')
-		print 'WARNING: MITObim1.6 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		#if config file has 'default' in the folder field, use the default program folders given with the script
+		if mitobimFolder.lower() == 'default':
+			mitobimFolder = os.path.join(module_dir, 'mitobim1.6/')
+			print 'WARNING: MITObim1.6 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 		
-	if newMitobimFolder.lower() == 'default':
-		newMitobimFolder = os.path.join(module_dir, 'mitobim1.7/')
-		print 'WARNING: MITObim1.7 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		if newMitobimFolder.lower() == 'default':
+			newMitobimFolder = os.path.join(module_dir, 'mitobim1.7/')
+			print 'WARNING: MITObim1.7 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 		
-	if pathToNewMira.lower() == 'default':
-		pathToNewMira = os.path.join(module_dir, 'mira4/')
-		print 'WARNING: MIRA4.0 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		if pathToNewMira.lower() == 'default':
+			pathToNewMira = os.path.join(module_dir, 'mira4/')
+			print 'WARNING: MIRA4.0 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 		
-	if pathToOldMira.lower() == 'default':
-		pathToOldMira = os.path.join(module_dir, 'mira3/')
-		print 'WARNING: MIRA3.4 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		if pathToOldMira.lower() == 'default':
+			pathToOldMira = os.path.join(module_dir, 'mira3/')
+			print 'WARNING: MIRA3.4 is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 		
-	if soapTransFolder.lower() == 'default':
-		soapTransFolder = os.path.join(module_dir, 'soapdenovo-trans/')
-		print 'WARNING: SOAPdenovo-Trans is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		if soapTransFolder.lower() == 'default':
+			soapTransFolder = os.path.join(module_dir, 'soapdenovo-trans/')
+			print 'WARNING: SOAPdenovo-Trans is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 
-	if soapDeNovoFolder.lower() == 'default':
-		soapDeNovoFolder = os.path.join(module_dir, 'soapdenovo/')
-		print 'WARNING: SOAPdenovo is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+		if soapDeNovoFolder.lower() == 'default':
+			soapDeNovoFolder = os.path.join(module_dir, 'soapdenovo/')
+			print 'WARNING: SOAPdenovo is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
 		
-	if spadesFolder.lower() == 'default':
-		spadesFolder = os.path.join(module_dir, 'spades/')
-		print 'WARNING: SPAdes is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
-
-	if blastFolder.lower() == 'default':
-		blastFolder = os.path.join(module_dir, 'blast/')
-		print 'WARNING: Blast is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
-
-	print 'Program folders:'
-	print 'MITObim = %s' % mitobimFolder
-	print 'MITObim1.7 = %s' % newMitobimFolder
-	print 'MIRA4 folder = %s' % pathToNewMira
-	print 'MIRA3 folder = %s' % pathToOldMira
-	print 'SOAPtrans folder = %s' % soapTransFolder
-	print 'SOAPdenovo folder = %s' % soapDeNovoFolder
-	print 'SPAdes folder = %s' % spadesFolder
-	print 'Blast folder = %s' % blastFolder
-	print ''
-	print ''
-
-	if args.refSeqFile == None:
-		print 'WARNING: You are not using a reference targeted assembly.\nYou should try and find a closely related reference in either fasta or genbank.'
-		print 'Mitomaker works best when a reference is given. If you do not have one, check the references/ folder for a possible reference.'
-		print('If you still have to use a non-reference assembly, remember to check the current flags:\n \
+		if spadesFolder.lower() == 'default':
+			spadesFolder = os.path.join(module_dir, 'spades/')
+			print 'WARNING: SPAdes is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+
+		if blastFolder.lower() == 'default':
+			blastFolder = os.path.join(module_dir, 'blast/')
+			print 'WARNING: Blast is still set as default folder. Change it in the config file if you encounter problems running this script.\n'
+
+		print 'Program folders:'
+		print 'MITObim = %s' % mitobimFolder
+		print 'MITObim1.7 = %s' % newMitobimFolder
+		print 'MIRA4 folder = %s' % pathToNewMira
+		print 'MIRA3 folder = %s' % pathToOldMira
+		print 'SOAPtrans folder = %s' % soapTransFolder
+		print 'SOAPdenovo folder = %s' % soapDeNovoFolder
+		print 'SPAdes folder = %s' % spadesFolder
+		print 'Blast folder = %s' % blastFolder
+		print ''
+		print ''
+
+		#without -r, the closest reference of the library, if there is a close one, is used as if it was given with -r
+		if args.refSeqFile == None and args.autoReference == True:
+			profiling.nextStage('reference_selection')
+			print 'No reference given, looking for the closest one in the reference library...'
+			organismTypeToUse = args.organismType
+			if args.buildCloroplast or args.buildBacteria or args.buildArchea:
+				organismTypeToUse = 11
+			draftFile = None
+			if args.skipFirstStep != False:
+				draftFile = args.skipFirstStep
+			chosenReference = referenceLibrary.loadLibrary().chooseReference(organismTypeToUse, args.buildCloroplast, args.buildBacteria,
+																			 args.buildArchea, args.inputFile, draftFile)
+			if chosenReference != None:
+				reference, closeness = chosenReference
+				print 'Using %s (%s) as reference: %s\n' % (reference.name, reference.organism, closeness)
+				args.refSeqFile = reference.path
+			else:
+				print 'No reference of the library is close enough.\n'
+
+		if args.refSeqFile == None:
+			print 'WARNING: You are not using a reference targeted assembly.\nYou should try and find a closely related reference in either fasta or genbank.'
+			print 'Mitomaker works best when a reference is given. If you do not have one, check the references/ folder for a possible reference.'
+			print('If you still have to use a non-reference assembly, remember to check the current flags:\n \
 			--optimum ; -c ; -mc\nFor more information on each flag, call generalMaker.py with --help\n')
-		print 'Current -o flag is set to: %s\nThis will be used for the auto-annotation and genomic check part, if a genbank reference is not given.\n\n' % args.organismType
-
-	#just start the variables for future checking
-	firstStep = None #recursiveSOAP or recursiveMIRA
-	secondStep = None #miraMapping
-	thirdStep = None #mitobim
-	fourthStep = None #circularization check
-	fifthStep = None #tRNAscan
-
-	#make cutoffvalue tuple
-	cutoffValue = (args.minCutOffValue, args.maxCutOffValue)
-
-	#if flag --chloroplast is on and max cutoff value wasn't altered, increase it to cloroplast values
-	#if values are -1, automatically find this information out.
-	if args.buildCloroplast == True and args.refSeqFile == None:
-		if cutoffValue[0] == -1:
-			print 'WARNING: You did not specify a minimum target value. Auto determining one...\nIf you want to set it yourself, change the -c flag'
-			cutoffValue = (250, cutoffValue[1])
-		if cutoffValue[1] == -1:
-			print 'WARNING: You did not specify a maximum target value. Auto determining one...\nIf you want to set it yourself, change the -mc flag'
-			cutoffValue = (cutoffValue[0], 190000)
-		if args.sizeToLook == -1:
-			print 'WARNING: You did not specify an optimum target value. Auto determining one...\nIf you want to set it yourself, change the --optimum flag'
-			args.sizeToLook = 160000
-	elif args.buildCloroplast == False and args.refSeqFile == None:
-		if cutoffValue[0] == -1:
-			print 'WARNING: You did not specify a minimum target value. Auto determining one...\nIf you want to set it yourself, change the -c flag'
-			cutoffValue = (250, cutoffValue[1])
-		if cutoffValue[1] == -1:
-			print 'WARNING: You did not specify a maximum target value. Auto determining one...\nIf you want to set it yourself, change the -mc flag'
-			cutoffValue = (cutoffValue[0], 19000)
-		if args.sizeToLook == -1:
-			print 'WARNING: You did not specify an optimum target value. Auto determining one...\nIf you want to set it yourself, change the --optimum flag'
-			args.sizeToLook = cutoffValue[1] * 0.85
-	elif args.refSeqFile != None:
-		if args.refSeqFile[-6:] == '.fasta':
-			refSeq = SeqIO.read(args.refSeqFile, "fasta", generic_dna)
-		else:
-			refSeq = SeqIO.read(args.refSeqFile, "genbank", generic_dna)
-		refSize = len(refSeq.seq)
-		if cutoffValue[0] == -1:
-			cutoffValue = (max(1,int(refSize * 0.01)), cutoffValue[1])
-		if cutoffValue[1] == -1:
-			cutoffValue = (cutoffValue[0], int(refSize * 1.175))
-		if args.sizeToLook == -1:
-			print 'WARNING: You did not specify an optimum target value. Auto determining one based on reference...\nIf you want to set it yourself, change the --optimum flag'
-			args.sizeToLook = refSize
-
-	print 'Minimum size to consider: %s' %cutoffValue[0]
-	print 'Maximum size to consider: %s' %cutoffValue[1]
-	print 'Optimum size to consider: %s' %args.sizeToLook
-	print ''
-
-	if args.buildCloroplast or args.buildBacteria or args.buildArchea:
-		args.organismType = 11
-
-	maxReadLen = 100
-	with open(args.inputFile, 'r') as soapInputFile:
-		for soapLine in soapInputFile:
-			if 'max_rd_len' in soapLine:
-				maxReadLen = int(soapLine.replace('\n','').split('=')[-1])
-				break
-
-	print 'Read length to be used in MITObim: %s\n\n' %maxReadLen
-
-	#Let's call recursiveSOAP or recursiveMIRA (runs SOAP or MIRA multiple times trying to find a referenced DNA!)
-	if args.skipFirstStep != False:
-		print '--skipdenovo is pointing to a file, going to skip DeNovo step...'
-		kmerToUse = args.kmers.lower().split(',')[0]
-		print 'Using %s as target k-mer' % kmerToUse
+			print 'Current -o flag is set to: %s\nThis will be used for the auto-annotation and genomic check part, if a genbank reference is not given.\n\n' % args.organismType
+
+		#SOAPdenovo, SOAPdenovo-Trans and SPAdes open the read files themselves, better to stop now than after the k-mer spectrum
+		assemblerReadsFiles = args.useSpades == True or args.recursiveMira == False or args.forceDeNovo == True
+		if assemblerReadsFiles and args.skipFirstStep == False and args.baitReads == False:
+			unreadableFiles = readStreams.unreadableFiles(args.inputFile)
+			if len(unreadableFiles) > 0:
+				print 'ERROR: the DeNovo assembler can only read plain or gzip (.gz) read files, not:\n\t%s' % '\n\t'.join(unreadableFiles)
+				print 'Recompress them with gzip, use --bait (the baited reads are written plain) or --recursivemira.'
+				sys.exit(1)
+
+		#just start the variables for future checking
+		firstStep = None #recursiveSOAP or recursiveMIRA
+		secondStep = None #miraMapping
+		thirdStep = None #mitobim
+		exitCode = 0 #nonzero if a stage failed, so mitoMaker and batchMaker can tell
+		mitobimIterationStats = [] #(iteration, length, reads, Ns) of each MITObim iteration
+		fourthStep = None #circularization check
+		fifthStep = None #tRNAscan
+
+		#make cutoffvalue tuple
+		cutoffValue = (args.minCutOffValue, args.maxCutOffValue)
+
+		#if flag --chloroplast is on and max cutoff value wasn't altered, increase it to cloroplast values
+		#if values are -1, automatically find this information out.
+		if args.buildCloroplast == True and args.refSeqFile == None:
+			if cutoffValue[0] == -1:
+				print 'WARNING: You did not specify a minimum target value. Auto determining one...\nIf you want to set it yourself, change the -c flag'
+				cutoffValue = (250, cutoffValue[1])
+			if cutoffValue[1] == -1:
+				print 'WARNING: You did not specify a maximum target value. Auto determining one...\nIf you want to set it yourself, change the -mc flag'
+				cutoffValue = (cutoffValue[0], 190000)
+			if args.sizeToLook == -1:
+				print 'WARNING: You did not specify an optimum target value. Auto determining one...\nIf you want to set it yourself, change the --optimum flag'
+				args.sizeToLook = 160000
+		elif args.buildCloroplast == False and args.refSeqFile == None:
+			if cutoffValue[0] == -1:
+				print 'WARNING: You did not specify a minimum target value. Auto determining one...\nIf you want to set it yourself, change the -c flag'
+				cutoffValue = (250, cutoffValue[1])
+			if cutoffValue[1] == -1:
+				print 'WARNING: You did not specify a maximum target value. Auto determining one...\nIf you want to set it yourself, change the -mc flag'
+				cutoffValue = (cutoffValue[0], 19000)
+			if args.sizeToLook == -1:
+				print 'WARNING: You did not specify an optimum target value. Auto determining one...\nIf you want to set it yourself, change the --optimum flag'
+				args.sizeToLook = cutoffValue[1] * 0.85
+		elif args.refSeqFile != None:
+			refSize = referenceLibrary.indexedReference(args.refSeqFile).length
+			if cutoffValue[0] == -1:
+				cutoffValue = (max(1,int(refSize * 0.01)), cutoffValue[1])
+			if cutoffValue[1] == -1:
+				cutoffValue = (cutoffValue[0], int(refSize * 1.175))
+			if args.sizeToLook == -1:
+				print 'WARNING: You did not specify an optimum target value. Auto determining one based on reference...\nIf you want to set it yourself, change the --optimum flag'
+				args.sizeToLook = refSize
+
+		print 'Minimum size to consider: %s' %cutoffValue[0]
+		print 'Maximum size to consider: %s' %cutoffValue[1]
+		print 'Optimum size to consider: %s' %args.sizeToLook
 		print ''
-		firstStep = (None, kmerToUse)
-	else:
-		if args.useSpades == True:
-			firstStep = recursiveSPAdes.recursiveSpades(processName = args.processName, 
-						    inputFile = args.inputFile, kmers = args.kmers.lower().split(','), 
-		                    processorsToUse = args.processorsToUse, spadesFolder=spadesFolder, sizeToLook = args.sizeToLook, 
-		                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
-		                    blastHitSizePercentage = args.blastHitSizePercentage,miraTechnology=args.miraTechnology,
-		                    buildCloroplast = args.buildCloroplast, skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize,
-		                    circularOffSet = args.circularOffSet, ignoreFirstBuildChecks = args.ignoreFirstBuildChecks,
-		                    cutoffEquality = args.cutoffEquality, organismType = args.organismType,blastFolder = blastFolder, 
-		                    noExtension = args.noExtension, coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, 
-		                    buildArchea = args.buildArchea)
-		elif (args.soapTrans == False and args.recursiveMira == False) or args.forceDeNovo == True:
-			firstStep = recursiveSOAPdenovo.recursiveSOAPdenovo(processName = args.processName, 
-				    shortestContig = args.shortestContig, inputFile = args.inputFile, kmers = args.kmers.lower().split(','), 
-		                    processorsToUse = args.processorsToUse, soapDeNovoFolder=soapDeNovoFolder, sizeToLook = args.sizeToLook, 
-		                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
-		                    blastHitSizePercentage = args.blastHitSizePercentage, buildCloroplast = args.buildCloroplast,
-		                    skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize, circularOffSet = args.circularOffSet,
-		                    ignoreFirstBuildChecks = args.ignoreFirstBuildChecks, cutoffEquality = args.cutoffEquality,
-		                    organismType = args.organismType,blastFolder = blastFolder, noExtension = args.noExtension,
-				    coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, buildArchea = args.buildArchea)
-		elif args.soapTrans == True and args.recursiveMira == False:
-			firstStep = recursiveSOAP.recursiveSOAP(processName = args.processName, shortestContig = args.shortestContig,
-			            inputFile = args.inputFile, kmers = args.kmers.lower().split(','), 
-		                    processorsToUse = args.processorsToUse, soapTransFolder=soapTransFolder, sizeToLook = args.sizeToLook, 
-		                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
-		                    blastHitSizePercentage = args.blastHitSizePercentage, buildCloroplast = args.buildCloroplast,
-		                    skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize, circularOffSet = args.circularOffSet,
-		                    ignoreFirstBuildChecks = args.ignoreFirstBuildChecks, cutoffEquality = args.cutoffEquality,
-		                    organismType = args.organismType,blastFolder = blastFolder, noExtension = args.noExtension,
-				    coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, buildArchea = args.buildArchea)
-		elif args.recursiveMira == True:
-			firstStep = recursiveMira.recursiveMira(processName = args.processName, inputFile = args.inputFile,
-				    kmers = args.kmers.lower().split(','), processorsToUse = args.processorsToUse, miraFolder = pathToNewMira,
-                                    sizeToLook = args.sizeToLook, refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, 
-                                    blasteVal = args.blasteVal, blastHitSizePercentage = args.blastHitSizePercentage, 
-                                    miraGenome = args.miraGenome, miraTechnology = args.miraTechnology,
-		                    buildCloroplast = args.buildCloroplast, skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize,
-		                    circularOffSet = args.circularOffSet, ignoreFirstBuildChecks = args.ignoreFirstBuildChecks,
-		                    cutoffEquality = args.cutoffEquality, organismType = args.organismType, blastFolder = blastFolder,
-		                    noExtension = args.noExtension, coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria,
-				    buildArchea = args.buildArchea)
-	
-	#time for second step, mira mapping
-	if firstStep != False or args.skipFirstStep != False: #if soap/mira ran until the end
-		print 'Starting second step (mira mapping)...'
-		#make best_query.fasta hold the best sequence
-		if firstStep[0] != True or args.skipFirstStep != False:
-			with open('best_query.fasta', 'w') as bestQueryFile:
-				#print firstStep[0].refSeq
-				if args.skipFirstStep != False:
-					if args.skipFirstStep.endswith('.fasta') or args.skipFirstStep.endswith('.fa'):
-						seqForBestQuery = SeqIO.read(args.skipFirstStep, "fasta", generic_dna)
-					else:
-						seqForBestQuery = SeqIO.read(args.skipFirstStep, "genbank", generic_dna)
-				else:
-					seqForBestQuery = firstStep[0].refSeq
-				SeqIO.write(seqForBestQuery, bestQueryFile, 'fasta')
-		secondStep = miraMapping.miraMapping(processName = args.processName, processorsToUse = args.processorsToUse,
-					inputFile = args.inputFile, miraTechnology = args.miraTechnology.lower(),
-					useNewMira = args.useNewMira, pathToNewMira = pathToNewMira, pathToOldMira = pathToOldMira,
-					pairedEnd = args.pairedEnd, copyKmers = args.copyKmers, lastKmer = firstStep[1])
-		if secondStep == False:
-			print 'miraMapping failed. Aborting. Check logs for info.'
-		else:
-			if args.skipMitobim == False:
-			#procceed with MITObim if second step was successful...
-				print 'Starting third step (mitobim)...'
-				thirdStep = mitoBimWrapper.mitoBimWrapper(mitobimIterations = args.mitobimIterations, processName = args.processName,
-							miraTechnology = args.miraTechnology.lower(), mitobimFolder = mitobimFolder, readLen = maxReadLen,
-							newMira = args.useNewMira, newMitobimFolder = newMitobimFolder, pathToNewMira = pathToNewMira,
-							pathToOldMira = pathToOldMira, kmerUsed = firstStep[1])
-			if thirdStep == True:
-				print ''
-				print 'MITObim finished running.'
-				print ''
 
-			'''
-			Do circularization check on MITObim or MIRA4 results...
-			'''
-			print 'Procceding to circularization check...'
-			print ''
+		if args.buildCloroplast or args.buildBacteria or args.buildArchea:
+			args.organismType = 11
 
-			#figuring out which result file to use for the sequence (as resultFile)...
-			pathOfResult = None
-			if thirdStep == None: #MITObim wasn't ran
-				print "MITObim wasn't ran..."
-				pathOfResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out_AllStrains.unpadded.fasta'
-				pathOfMafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.maf'
-				pathOfCafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.caf'
-			elif thirdStep == True: #MITObim was succesfully ran
-				#let's check from top to bottom for iteration folders, when last iteration is found, grab result from that
-				if args.useNewMira == False:
-					for iteration in xrange(args.mitobimIterations, 0, -1):
-						iterationFolder = 'iteration' + str(iteration) + '/'
-						if os.path.exists(iterationFolder):
-							pathOfResult = 'iteration' + str(iteration) + '/' + args.processName + '-ReferenceStrain_assembly/' + args.processName + '-ReferenceStrain_d_results/' + args.processName + '-ReferenceStrain_out.unpadded.fasta'
-							pathOfMafResult = 'iteration' + str(iteration) + '/' + args.processName + '-ReferenceStrain_assembly/' + args.processName + '-ReferenceStrain_d_results/' + args.processName + '-ReferenceStrain_out.maf'
-							pathOfCafResult = 'iteration' + str(iteration) + '/' + args.processName + '-ReferenceStrain_assembly/' + args.processName + '-ReferenceStrain_d_results/' + args.processName + '-ReferenceStrain_out.caf'
-							print 'Using iteration ' + str(iteration) + ' for circularization checking.'
-							break
-				elif args.useNewMira == True:
-					for iteration in xrange(args.mitobimIterations, 0, -1):
-						iterationFolder = 'iteration' + str(iteration) + '/'
-						if os.path.exists(iterationFolder):
-							pathOfResult = 'iteration' + str(iteration) + '/' + args.processName + '_1-backbone_assembly/' + args.processName + '_1-backbone_d_results/' + args.processName + '_1-backbone_out_AllStrains.unpadded.fasta'
-							pathOfMafResult = 'iteration' + str(iteration) + '/' + args.processName + '_1-backbone_assembly/' + args.processName + '_1-backbone_d_results/' + args.processName + '_1-backbone_out.maf'
-							pathOfCafResult = 'iteration' + str(iteration) + '/' + args.processName + '_1-backbone_assembly/' + args.processName + '_1-backbone_d_results/' + args.processName + '_1-backbone_out.caf'
-							print 'Using iteration ' + str(iteration) + ' for circularization checking.'
-							break
-							
-			if pathOfResult is None: #if mitobim had a problem, use mira mapping as result
-				print '#'*28
-				print 'WARNING: There was a problem running MITObim. Going to use MIRA mapping assembly as result.'
-				print '#'*28
-				pathOfResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out_AllStrains.unpadded.fasta'
-				pathOfMafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.maf'
-				pathOfCafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.caf'
+		#read length for MITObim, from the reads themselves
+		maxReadLen = 100
+		readStats = kmerScheduler.readLengthStats(args.inputFile)
+		if readStats != None:
+			maxReadLen = readStats[1]
 
+		print 'Read length to be used in MITObim: %s\n\n' %maxReadLen
+
+		#coverage of the target DNA, from the k-mer spectrum, for --autokmers and --targetcoverage
+		spectrum = None
+		if (args.autoKmers == True and args.skipFirstStep == False) or args.targetCoverage > 0:
+			profiling.nextStage('kmer_spectrum')
+			print 'Looking for the target DNA in the k-mer spectrum of the reads...'
+			spectrum = kmerSpectrum.organelleCoverage(args.inputFile)
 			print ''
-			print 'Checking results for circularization...'
-			#circularizationcheck will return a tuple with (True, start, end)
-			fourthStep = circularizationCheck.circularizationCheck(pathOfResult, args.circularSize, args.circularOffSet, blastFolder)
+
+		if args.autoKmers == True and args.skipFirstStep == False:
+			if spectrum != None:
+				args.kmers = ','.join([str(kmer) for kmer in kmerSpectrum.proposeKmers(spectrum[0], spectrum[1])])
+				print 'K-mers chosen: %s' % args.kmers
+			else:
+				print 'Using the k-mers given with -k: %s' % args.kmers
 			print ''
 
-			resultFile = args.processName + '.fasta'
+		#each stage saves a checkpoint, so --resume can skip the ones that are still valid
+		checkpoints = pipelineCheckpoint.Checkpoints(args.processName, args.resume)
+		readFiles = [args.inputFile] + pipelineCheckpoint.readFilesOf(args.inputFile)
+		denovoParameters = pipelineCheckpoint.argumentsOf(args, ['kmers', 'shortestContig', 'refSeqFile', 'sizeToLook', 'blasteVal',
+								'blastHitSizePercentage', 'recursiveMira', 'soapTrans', 'forceDeNovo', 'useSpades', 'miraGenome',
+								'miraTechnology', 'buildCloroplast', 'buildBacteria', 'buildArchea', 'skipTrnaScan', 'circularSize',
+								'circularOffSet', 'ignoreFirstBuildChecks', 'cutoffEquality', 'organismType', 'noExtension',
+								'coveCutOff', 'rankKmers', 'skipFirstStep', 'baitReads', 'baitKmer', 'targetCoverage'])
+		denovoParameters['cutoffValue'] = cutoffValue
+		denovoInputs = readFiles
+		if args.skipFirstStep != False:
+			denovoInputs = [args.skipFirstStep]
+		denovoCheckpoint = checkpoints.load('denovo', denovoParameters, denovoInputs)
+
+		#every stage from here on uses the subsampled reads, the checkpoints still look at the original ones
+		if args.targetCoverage > 0:
+			if spectrum == None:
+				print 'The coverage of the target DNA is unknown, --targetcoverage is ignored and every read is used.'
+			elif spectrum[0] <= args.targetCoverage:
+				print 'Coverage of the target DNA (%.0fx) is already below --targetcoverage, every read is used.' % spectrum[0]
+			else:
+				profiling.nextStage('subsampling')
+				fractionToKeep = args.targetCoverage / spectrum[0]
+				print 'Subsampling %.1f%% of the reads for about %sx coverage...' % (fractionToKeep * 100, args.targetCoverage)
+				keptFragments, totalFragments = readStreams.subsampleReads(args.inputFile, fractionToKeep, 'subsampled_reads/',
+																		   args.processName + '_subsampled.config')
+				print 'Kept %s of %s reads/pairs.' % (keptFragments, totalFragments)
+				args.inputFile = args.processName + '_subsampled.config'
+			print ''
 
-			if fourthStep[0] == True:
-				print 'Evidences of circularization were found!'
-				print 'Sequence is going to be trimmed according to circularization position. \nMAF and CAF files are unaltered.'
-				print ''
-				with open(resultFile, "w") as outputResult: #create draft file to be checked and annotated
-					finalResults = SeqIO.read(open(pathOfResult, 'rU'), "fasta", generic_dna)
-					finalResults.seq = finalResults.seq.upper()
-					count = SeqIO.write(finalResults[fourthStep[2]:], outputResult, "fasta") #trims according to circularization position
+		#the DeNovo assemblers can get only the reads that look like they come from the target DNA
+		denovoInputFile = args.inputFile
+		if args.baitReads == True and denovoCheckpoint is None and args.skipFirstStep == False:
+			profiling.nextStage('baiting')
+			print 'Baiting reads for the DeNovo assembly...'
+			denovoInputFile = readBaiting.baitReads(args.inputFile, args.refSeqFile, args.baitKmer, 'baited_reads/', 
+													args.processName + '_baited.config')
+			print ''
+
+		profiling.nextStage('denovo')
+		#Let's call recursiveSOAP or recursiveMIRA (runs SOAP or MIRA multiple times trying to find a referenced DNA!)
+		if denovoCheckpoint is not None:
+			print 'Resuming with the DeNovo result of k-mer %s (best_query.fasta)' % denovoCheckpoint['kmer']
+			print ''
+			firstStep = (True, denovoCheckpoint['kmer'])
+		elif args.skipFirstStep != False:
+			print '--skipdenovo is pointing to a file, going to skip DeNovo step...'
+			kmerToUse = args.kmers.lower().split(',')[0]
+			print 'Using %s as target k-mer' % kmerToUse
+			print ''
+			firstStep = (None, kmerToUse)
+		else:
+			if args.useSpades == True:
+				firstStep = recursiveSPAdes.recursiveSpades(processName = args.processName, 
+							    inputFile = denovoInputFile, kmers = args.kmers.lower().split(','), 
+			                    processorsToUse = args.processorsToUse, spadesFolder=spadesFolder, sizeToLook = args.sizeToLook, 
+			                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
+			                    blastHitSizePercentage = args.blastHitSizePercentage,miraTechnology=args.miraTechnology,
+			                    buildCloroplast = args.buildCloroplast, skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize,
+			                    circularOffSet = args.circularOffSet, ignoreFirstBuildChecks = args.ignoreFirstBuildChecks,
+			                    cutoffEquality = args.cutoffEquality, organismType = args.organismType,blastFolder = blastFolder, 
+			                    noExtension = args.noExtension, coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, 
+			                    buildArchea = args.buildArchea, parallelKmers = args.parallelKmers, rankKmers = args.rankKmers)
+			elif (args.soapTrans == False and args.recursiveMira == False) or args.forceDeNovo == True:
+				firstStep = recursiveSOAPdenovo.recursiveSOAPdenovo(processName = args.processName, 
+					    shortestContig = args.shortestContig, inputFile = denovoInputFile, kmers = args.kmers.lower().split(','), 
+			                    processorsToUse = args.processorsToUse, soapDeNovoFolder=soapDeNovoFolder, sizeToLook = args.sizeToLook, 
+			                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
+			                    blastHitSizePercentage = args.blastHitSizePercentage, buildCloroplast = args.buildCloroplast,
+			                    skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize, circularOffSet = args.circularOffSet,
+			                    ignoreFirstBuildChecks = args.ignoreFirstBuildChecks, cutoffEquality = args.cutoffEquality,
+			                    organismType = args.organismType,blastFolder = blastFolder, noExtension = args.noExtension,
+					    coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, buildArchea = args.buildArchea,
+					    parallelKmers = args.parallelKmers, rankKmers = args.rankKmers)
+			elif args.soapTrans == True and args.recursiveMira == False:
+				firstStep = recursiveSOAP.recursiveSOAP(processName = args.processName, shortestContig = args.shortestContig,
+				            inputFile = denovoInputFile, kmers = args.kmers.lower().split(','), 
+			                    processorsToUse = args.processorsToUse, soapTransFolder=soapTransFolder, sizeToLook = args.sizeToLook, 
+			                    refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, blasteVal = args.blasteVal,
+			                    blastHitSizePercentage = args.blastHitSizePercentage, buildCloroplast = args.buildCloroplast,
+			                    skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize, circularOffSet = args.circularOffSet,
+			                    ignoreFirstBuildChecks = args.ignoreFirstBuildChecks, cutoffEquality = args.cutoffEquality,
+			                    organismType = args.organismType,blastFolder = blastFolder, noExtension = args.noExtension,
+					    coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria, buildArchea = args.buildArchea,
+					    parallelKmers = args.parallelKmers, rankKmers = args.rankKmers)
+			elif args.recursiveMira == True:
+				firstStep = recursiveMira.recursiveMira(processName = args.processName, inputFile = denovoInputFile,
+					    kmers = args.kmers.lower().split(','), processorsToUse = args.processorsToUse, miraFolder = pathToNewMira,
+	                                    sizeToLook = args.sizeToLook, refSeqFile = args.refSeqFile, cutoffValue = cutoffValue, 
+	                                    blasteVal = args.blasteVal, blastHitSizePercentage = args.blastHitSizePercentage, 
+	                                    miraGenome = args.miraGenome, miraTechnology = args.miraTechnology,
+			                    buildCloroplast = args.buildCloroplast, skipTrnaScan = args.skipTrnaScan, circularSize = args.circularSize,
+			                    circularOffSet = args.circularOffSet, ignoreFirstBuildChecks = args.ignoreFirstBuildChecks,
+			                    cutoffEquality = args.cutoffEquality, organismType = args.organismType, blastFolder = blastFolder,
+			                    noExtension = args.noExtension, coveCutOff = args.coveCutOff, buildBacteria = args.buildBacteria,
+					    buildArchea = args.buildArchea, parallelKmers = args.parallelKmers, rankKmers = args.rankKmers)
+	
+		#time for second step, mira mapping
+		if firstStep != False or args.skipFirstStep != False: #if soap/mira ran until the end
+			print 'Starting second step (mira mapping)...'
+			#make best_query.fasta hold the best sequence
+			if denovoCheckpoint is None and (firstStep[0] != True or args.skipFirstStep != False):
+				with open('best_query.fasta', 'w') as bestQueryFile:
+					#print firstStep[0].refSeq
+					if args.skipFirstStep != False:
+						if args.skipFirstStep.endswith('.fasta') or args.skipFirstStep.endswith('.fa'):
+							seqForBestQuery = SeqIO.read(args.skipFirstStep, "fasta", generic_dna)
+						else:
+							seqForBestQuery = SeqIO.read(args.skipFirstStep, "genbank", generic_dna)
+					else:
+						seqForBestQuery = firstStep[0].refSeq
+					SeqIO.write(seqForBestQuery, bestQueryFile, 'fasta')
+			if denovoCheckpoint is None:
+				#best_query.fasta and the files made while checking it, the later stages don't touch them
+				checkpoints.save('denovo', denovoParameters, denovoInputs, ['best_query.fasta', 'best_query.fasta.nin',
+								 'best_query.fasta.nhr', 'best_query.fasta.nsq', 'best_query.trnascan', 'possible_hits.fasta',
+								 'possible_hits.blast.tsv'], {'kmer': firstStep[1]})
+
+			profiling.nextStage('mapping')
+			mappingParameters = pipelineCheckpoint.argumentsOf(args, ['miraTechnology', 'useNewMira', 'pairedEnd', 'copyKmers', 'targetCoverage',
+																		  'removeDuplicates'])
+			mappingParameters['kmer'] = firstStep[1]
+			mappingInputs = readFiles + ['best_query.fasta']
+			pathOfMapping = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName
+			mappingOutputs = ['mira_mapping/' + args.processName + '_in.' + args.miraTechnology.lower() + '.fastq',
+							  pathOfMapping + '_out_AllStrains.unpadded.fasta', pathOfMapping + '_out.maf', pathOfMapping + '_out.caf']
+			if checkpoints.load('mapping', mappingParameters, mappingInputs) is not None:
+				secondStep = True
+			else:
+				secondStep = miraMapping.miraMapping(processName = args.processName, processorsToUse = args.processorsToUse,
+							inputFile = args.inputFile, miraTechnology = args.miraTechnology.lower(),
+							useNewMira = args.useNewMira, pathToNewMira = pathToNewMira, pathToOldMira = pathToOldMira,
+							pairedEnd = args.pairedEnd, copyKmers = args.copyKmers, lastKmer = firstStep[1],
+							removeDuplicates = args.removeDuplicates)
+				if secondStep != False:
+					checkpoints.save('mapping', mappingParameters, mappingInputs, mappingOutputs, {})
+			if secondStep == False:
+				print 'miraMapping failed. Aborting. Check logs for info.'
+				exitCode = 1
 			else:
-				print 'Evidences of circularization could not be found, but everyother step was successful.'
-				print 'Check results from MIRA Mapping.'
+				profiling.nextStage('mitobim')
+				mitobimParameters = pipelineCheckpoint.argumentsOf(args, ['mitobimIterations', 'skipMitobim', 'nativeMitobim', 'useNewMira',
+																		  'miraTechnology', 'mitobimMinimumGrowth', 'circularSize', 'circularOffSet'])
+				mitobimParameters['kmer'] = firstStep[1]
+				mitobimParameters['readLen'] = maxReadLen
+				mitobimCheckpoint = checkpoints.load('mitobim', mitobimParameters, mappingOutputs)
+				if mitobimCheckpoint is not None:
+					thirdStep = mitobimCheckpoint['thirdStep']
+					pathOfResult = mitobimCheckpoint['pathOfResult']
+					pathOfMafResult = mitobimCheckpoint['pathOfMafResult']
+					pathOfCafResult = mitobimCheckpoint['pathOfCafResult']
+					mitobimIterationStats = mitobimCheckpoint['mitobimIterationStats']
+					print 'Using %s for circularization checking.' % pathOfResult
+				else:
+					pathOfResult = None
+					if args.skipMitobim == False and args.nativeMitobim == True:
+						print 'Starting third step (mitobim, in process)...'
+						pathOfResult, mitobimIterationStats = mitoBimEngine.mitoBimEngine(processName = args.processName,
+									backboneFile = pathOfMapping + '_out_AllStrains.unpadded.fasta', poolFile = mappingOutputs[0], readLen = maxReadLen,
+									maximumIterations = args.mitobimIterations, minimumGrowth = args.mitobimMinimumGrowth)
+						#the reads are not aligned to the extended backbone, so there is no .maf/.caf for it
+						pathOfMafResult = None
+						pathOfCafResult = None
+						thirdStep = pathOfResult is not None
+					elif args.skipMitobim == False:
+					#procceed with MITObim if second step was successful...
+						print 'Starting third step (mitobim)...'
+						thirdStep, mitobimIterationStats = mitoBimWrapper.mitoBimWrapper(mitobimIterations = args.mitobimIterations,
+									processName = args.processName, miraTechnology = args.miraTechnology.lower(), mitobimFolder = mitobimFolder,
+									readLen = maxReadLen, newMira = args.useNewMira, newMitobimFolder = newMitobimFolder, pathToNewMira = pathToNewMira,
+									pathToOldMira = pathToOldMira, kmerUsed = firstStep[1], minimumGrowth = args.mitobimMinimumGrowth,
+									circularSize = args.circularSize, circularOffSet = args.circularOffSet)
+					if thirdStep == True:
+						print ''
+						print 'MITObim finished running.'
+						print ''
+
+					'''
+					Do circularization check on MITObim or MIRA4 results...
+					'''
+					print 'Procceding to circularization check...'
+					print ''
+
+					#figuring out which result file to use for the sequence (as resultFile)...
+					if thirdStep == None: #MITObim wasn't ran
+						print "MITObim wasn't ran..."
+						pathOfResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out_AllStrains.unpadded.fasta'
+						pathOfMafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.maf'
+						pathOfCafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.caf'
+					elif thirdStep == True and args.nativeMitobim == True:
+						print 'Using the in process MITObim result for circularization checking.'
+					elif thirdStep == True: #MITObim was succesfully ran
+						#the last iteration that was run (MITObim may have stopped early) has the result
+						if len(mitobimIterationStats) > 0:
+							iteration = mitobimIterationStats[-1][0]
+							pathOfResult, pathOfMafResult, pathOfCafResult = mitoBimWrapper.iterationResults(iteration, args.processName,
+																											 args.useNewMira)
+							print 'Using iteration ' + str(iteration) + ' for circularization checking.'
+							
+					if pathOfResult is None: #if mitobim had a problem, use mira mapping as result
+						print '#'*28
+						print 'WARNING: There was a problem running MITObim. Going to use MIRA mapping assembly as result.'
+						print '#'*28
+						pathOfResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out_AllStrains.unpadded.fasta'
+						pathOfMafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.maf'
+						pathOfCafResult = 'mira_mapping/' + args.processName + '_assembly/' + args.processName + '_d_results/' + args.processName + '_out.caf'
+
+					checkpoints.save('mitobim', mitobimParameters, mappingOutputs,
+									 [path for path in [pathOfResult, pathOfMafResult, pathOfCafResult, 'mitobim.log'] if path is not None],
+									 {'thirdStep': thirdStep, 'pathOfResult': pathOfResult, 'pathOfMafResult': pathOfMafResult,
+									  'pathOfCafResult': pathOfCafResult, 'mitobimIterationStats': mitobimIterationStats})
+
+				profiling.nextStage('circularization')
 				print ''
-				with open(resultFile, "w") as outputResult: #create draft file to be checked and annotated
-					finalResults = SeqIO.read(open(pathOfResult, 'rU'), "fasta", generic_dna)
-					finalResults.seq = finalResults.seq.upper()
-					count = SeqIO.write(finalResults, outputResult, "fasta") #no need to trim, since circularization wasn't found
+				print 'Checking results for circularization...'
+				resultFile = args.processName + '.fasta'
+				circularizationParameters = pipelineCheckpoint.argumentsOf(args, ['circularSize', 'circularOffSet'])
+				circularizationCheckpoint = checkpoints.load('circularization', circularizationParameters, [pathOfResult])
+				if circularizationCheckpoint is not None:
+					fourthStep = circularizationCheckpoint['fourthStep']
+				else:
+					#circularizationcheck will return a tuple with (True, start, end)
+					fourthStep = circularizationCheck.circularizationCheck(pathOfResult, args.circularSize, args.circularOffSet, blastFolder)
+					print ''
 
-			pathOfFinalResults = args.processName + '_Final_Results/'
-			if not os.path.exists(pathOfFinalResults): os.makedirs(pathOfFinalResults)
+					if fourthStep[0] == True:
+						print 'Evidences of circularization were found!'
+						print 'Sequence is going to be trimmed according to circularization position. \nMAF and CAF files are unaltered.'
+						print ''
+						with open(resultFile, "w") as outputResult: #create draft file to be checked and annotated
+							finalResults = SeqIO.read(open(pathOfResult, 'rU'), "fasta", generic_dna)
+							finalResults.seq = finalResults.seq.upper()
+							count = SeqIO.write(finalResults[fourthStep[2]:], outputResult, "fasta") #trims according to circularization position
+					else:
+						print 'Evidences of circularization could not be found, but everyother step was successful.'
+						print 'Check results from MIRA Mapping.'
+						print ''
+						with open(resultFile, "w") as outputResult: #create draft file to be checked and annotated
+							finalResults = SeqIO.read(open(pathOfResult, 'rU'), "fasta", generic_dna)
+							finalResults.seq = finalResults.seq.upper()
+							count = SeqIO.write(finalResults, outputResult, "fasta") #no need to trim, since circularization wasn't found
+
+					checkpoints.save('circularization', circularizationParameters, [pathOfResult], [resultFile],
+									 {'fourthStep': fourthStep})
+
+				pathOfFinalResults = args.processName + '_Final_Results/'
+				if not os.path.exists(pathOfFinalResults): os.makedirs(pathOfFinalResults)
 			
-			#copying results to the final results folder and creating draft file to be checked...
-			print '#'*75
-			print '## Creating target DNA draft file from mapping/MITObim results...'
-
-			#creating some stat file:
-			finalResults = SeqIO.read(open(resultFile, 'rU'), "fasta", generic_dna)
-			finalStatsFile = open(pathOfFinalResults + args.processName + '.stats', 'w')
-
-			finalStatsFile.write('Statistics for final sequence:\n\n')
-			finalStatsFile.write('Length: ' + str(len(finalResults.seq)) + "\n")
-			finalStatsFile.write('GC content: ' + ("{0:.2f}".format(SeqUtils.GC(finalResults.seq))) + '%\n')
-			numberOfNs = finalResults.seq.lower().count('n')
-			finalStatsFile.write("Length without Ns: " + str(len(finalResults.seq) - numberOfNs) + "\n")
-			finalStatsFile.write("Number of Ns: " + str(numberOfNs) + "\n")
-			if fourthStep[0] == True:
-				finalStatsFile.write("Circularization: Yes\n")
-			else:
-				finalStatsFile.write("Circularization: No\n")
-			finalStatsFile.write("K-mer used: " + str(firstStep[1]) + "\n")
+				#copying results to the final results folder and creating draft file to be checked...
+				print '#'*75
+				print '## Creating target DNA draft file from mapping/MITObim results...'
+
+				#creating some stat file:
+				finalResults = SeqIO.read(open(resultFile, 'rU'), "fasta", generic_dna)
+				finalStatsFile = open(pathOfFinalResults + args.processName + '.stats', 'w')
+
+				finalStatsFile.write('Statistics for final sequence:\n\n')
+				finalStatsFile.write('Length: ' + str(len(finalResults.seq)) + "\n")
+				finalStatsFile.write('GC content: ' + ("{0:.2f}".format(SeqUtils.GC(finalResults.seq))) + '%\n')
+				numberOfNs = finalResults.seq.lower().count('n')
+				finalStatsFile.write("Length without Ns: " + str(len(finalResults.seq) - numberOfNs) + "\n")
+				finalStatsFile.write("Number of Ns: " + str(numberOfNs) + "\n")
+				if fourthStep[0] == True:
+					finalStatsFile.write("Circularization: Yes\n")
+				else:
+					finalStatsFile.write("Circularization: No\n")
+				finalStatsFile.write("K-mer used: " + str(firstStep[1]) + "\n")
+				if len(mitobimIterationStats) > 0:
+					mitoBimWrapper.writeIterationStats(finalStatsFile, mitobimIterationStats)
 
-			destFile = pathOfFinalResults + args.processName + '.unordered.fasta'
-			shutil.copyfile(resultFile, destFile)
+				destFile = pathOfFinalResults + args.processName + '.unordered.fasta'
+				shutil.copyfile(resultFile, destFile)
 			
-			destFile = pathOfFinalResults + args.processName + '.unordered.maf'
-			shutil.copyfile(pathOfMafResult, destFile)
+				if pathOfMafResult is not None:
+					destFile = pathOfFinalResults + args.processName + '.unordered.maf'
+					shutil.copyfile(pathOfMafResult, destFile)
 			
-			destFile = pathOfFinalResults + args.processName + '.unordered.caf'
-			shutil.copyfile(pathOfCafResult, destFile)
+				if pathOfCafResult is not None:
+					destFile = pathOfFinalResults + args.processName + '.unordered.caf'
+					shutil.copyfile(pathOfCafResult, destFile)
 				
-			print '## Final sequence saved to %s' % pathOfFinalResults 
+				print '## Final sequence saved to %s' % pathOfFinalResults 
 
-			#from now on, just checking how the build went to output to user and then annotate
-			print '## Now running tRNAscan-SE to check the final build...'
+				profiling.nextStage('final_checks')
+				#from now on, just checking how the build went to output to user and then annotate
+				print '## Now running tRNAscan-SE to check the final build...'
 			
-			if args.skipTrnaScan == True:
-				print ''
-				print '## --skiptrna is turned on, going to ignore this check and move on...'
-
-			fifthStep = tRNAscanChecker.tRNAscanCheck(resultFile, fourthStep[0], args.skipTrnaScan, args.organismType, args.coveCutOff,
-								args.buildBacteria, args.buildArchea) #returns a Assembly object 
-												      #with statistics and alignment info
-			if args.skipTrnaScan == False:
-				print '## %s tRNAs were found.' % len(fifthStep)
-
-			if args.ignoreFirstBuildChecks == False:
-				print ''
-				print '## Procceding to genomic check and annotation...'
-				print ''
+				if args.skipTrnaScan == True:
+					print ''
+					print '## --skiptrna is turned on, going to ignore this check and move on...'
+
+				#tRNAscan-SE and the genomic features check don't depend on each other, so they run at the same time
+				scratchFolder = workspace.scratchFolder('annotation_tmp')
+				#tRNAscan-SE, plus blastx and blastn for the genes, share -t
+				taskThreads = parallelTasks.threadsPerTask(args.processorsToUse, 1 if args.ignoreFirstBuildChecks == True else 3)
+				listOfTasks = [(tRNAscanChecker.tRNAscanCheck, (resultFile, fourthStep[0], args.skipTrnaScan, args.organismType, args.coveCutOff,
+									args.buildBacteria, args.buildArchea), {'workDir': scratchFolder + 'trnascan/',
+																		  'threadsToUse': taskThreads})]
+				listOfOutputs = tRNAscanChecker.tRNAscanOutputs(resultFile, scratchFolder + 'trnascan/')
+
+				if args.ignoreFirstBuildChecks == False:
+					print ''
+					print '## Running genomic check at the same time...'
+					print ''
 
-				#time to look for genomic features, searching according to the -o flag
-				#or with the genbank reference that was given
-				organismType = args.organismType
-				module_dir = os.path.dirname(__file__)
-				module_dir = os.path.abspath(module_dir)
-				'''
-					1. The Standard Code
-					2. The Vertebrate Mitochondrial Code
-					3. The Yeast Mitochondrial Code
-					4. The Mold, Protozoan, and Coelenterate Mitochondrial Code and the Mycoplasma/Spiroplasma Code
-					5. The Invertebrate Mitochondrial Code
-					6. The Ciliate, Dasycladacean and Hexamita Nuclear Code
-					9. The Echinoderm and Flatworm Mitochondrial Code
-					10. The Euplotid Nuclear Code
-					11. The Bacterial, Archaeal and Plant Plastid Code
-					12. The Alternative Yeast Nuclear Code
-					13. The Ascidian Mitochondrial Code
-					14. The Alternative Flatworm Mitochondrial Code
-					16. Chlorophycean Mitochondrial Code
-					21. Trematode Mitochondrial Code
-					22. Scenedesmus obliquus Mitochondrial Code
-					23. Thraustochytrium Mitochondrial Code
-					24. Pterobranchia Mitochondrial Code
-					25. Candidate Division SR1 and Gracilibacteria Code
-				'''
-				if args.buildCloroplast == True:
-					refSeqFileForGenes = os.path.join(module_dir, 'references/cloroplast.gb')
-					#args.organismType = 11
-				elif args.organismType == 11: #plant plastid or bacterial or archea
-					refSeqFileForGenes = os.path.join(module_dir, 'references/magnolia.gb')
-					if args.buildBacteria == True:
-						refSeqFileForGenes = os.path.join(module_dir, 'references/bacteria.gb') #some bacterial DNA
-					elif args.buildArchea == True:
-						refSeqFileForGenes = os.path.join(module_dir, 'references/archea.gb') #some archea DNA
-				elif args.organismType == 3: #yeast
-					refSeqFileForGenes = os.path.join(module_dir, 'references/yeast.gb')
-				elif args.organismType == 5: #invertebrate, insect
-					refSeqFileForGenes = os.path.join(module_dir, 'references/beetle.gb')
-				elif args.organismType == 6: #ciliate
-					refSeqFileForGenes = os.path.join(module_dir, 'references/paramecium.gb')
-				elif args.organismType != 1: #human, 2(vertebrate), also the default option
-					refSeqFileForGenes = os.path.join(module_dir, 'references/human.gb')
-
-				#we don't need a sequence reference for this check
-				if args.refSeqFile != None: #if user gave a reference file, let's consider its features and everything else
-					if args.refSeqFile[-6:] != '.fasta':
-						refSeqFileForGenes = args.refSeqFile
-						usingOwnGenBankReference = True
-
-				#add the genetic feature check to this Assembly object
-				fifthStep.checkFeatures = geneChecker.geneCheck(refSeqFileForGenes, resultFile, args.cutoffEquality, usingOwnGenBankReference, blastFolder, organismType = args.organismType)
-				presentFeatures = fifthStep.checkFeatures[0]
-				importantFeatures = fifthStep.checkFeatures[1]
-				numberOfSplits = len(fifthStep.checkFeatures[2])
-				print '#'*75
-				print ''
-				print '#'*25
-				print '## Annotating...'
-
-				#Annotation and creation of genbank file down here:
-				resultGbFile = pathOfFinalResults + args.processName + '.unordered.gb'
-				listOfFeaturesToOutput = []
-				listOfFoundTRNAs = []
-				for foundFeature in presentFeatures:
-					thisFeatureFound = presentFeatures[foundFeature][1]
-					#comparing tRNAscan-SE results with this, in case tRNAscan-SE was run
-					if "trn" in thisFeatureFound.seq2.lower():
-						if args.skipTrnaScan == False:
-							for tRNAFound in fifthStep.tRNAs:
-							#down here we update the start and end positions of tRNAs found with Needle, with the
-							#results outputted by tRNAScan-SE
-							#tRNAconvert = guarantees all tRNA names are in tRNA-Phe format
-								if 'trna-' + tRNAFound.tRNAtype.lower() == tRNAconvert(thisFeatureFound.seq2.lower()):
-									#making sure the frame matches tRNAscan-SE results
-									if tRNAFound.tRNAcoordinates[0] > tRNAFound.tRNAcoordinates[1]:
-										thisFeatureFound.frame = -1
-									#changing start and end according to tRNAscan-SE result
-									thisFeatureFound.startBase = min(tRNAFound.tRNAcoordinates[0],
-													tRNAFound.tRNAcoordinates[1])
-									thisFeatureFound.endBase = max(tRNAFound.tRNAcoordinates[0],
-													tRNAFound.tRNAcoordinates[1])
-									break
-
-						listOfFoundTRNAs.append(thisFeatureFound.seq2.lower())
-
-					listOfFeaturesToOutput.append(thisFeatureFound)
-
-				#if tRNAscan-SE was run, check the tRNAs it found and input them in the features to output list
-				tRNAsFoundWithIntrons = [] #create empty list to hold problematic tRNAs and output them to the stats file
+					#time to look for genomic features, searching according to the -o flag
+					#or with the genbank reference that was given
+					organismType = args.organismType
+					'''
+						1. The Standard Code
+						2. The Vertebrate Mitochondrial Code
+						3. The Yeast Mitochondrial Code
+						4. The Mold, Protozoan, and Coelenterate Mitochondrial Code and the Mycoplasma/Spiroplasma Code
+						5. The Invertebrate Mitochondrial Code
+						6. The Ciliate, Dasycladacean and Hexamita Nuclear Code
+						9. The Echinoderm and Flatworm Mitochondrial Code
+						10. The Euplotid Nuclear Code
+						11. The Bacterial, Archaeal and Plant Plastid Code
+						12. The Alternative Yeast Nuclear Code
+						13. The Ascidian Mitochondrial Code
+						14. The Alternative Flatworm Mitochondrial Code
+						16. Chlorophycean Mitochondrial Code
+						21. Trematode Mitochondrial Code
+						22. Scenedesmus obliquus Mitochondrial Code
+						23. Thraustochytrium Mitochondrial Code
+						24. Pterobranchia Mitochondrial Code
+						25. Candidate Division SR1 and Gracilibacteria Code
+					'''
+					#the default reference for organismType comes from the reference library, see references/library.tsv
+					refSeqFileForGenes = referenceLibrary.loadLibrary().defaultReference(args.organismType, args.buildCloroplast,
+																args.buildBacteria, args.buildArchea).path
+
+					#we don't need a sequence reference for this check
+					if args.refSeqFile != None: #if user gave a reference file, let's consider its features and everything else
+						if args.refSeqFile[-6:] != '.fasta':
+							refSeqFileForGenes = args.refSeqFile
+							usingOwnGenBankReference = True
+
+					geneTasks, mergeGeneChecks = geneChecker.geneCheckTasks(refSeqFileForGenes, resultFile, args.cutoffEquality, usingOwnGenBankReference,
+																			blastFolder, organismType = args.organismType, workDir = scratchFolder,
+																			threadsToUse = taskThreads)
+					listOfTasks += geneTasks
+					listOfOutputs += geneChecker.geneCheckOutputs(resultFile, scratchFolder)
+
+				taskResults = parallelTasks.runTasks(listOfTasks)
+				parallelTasks.collectScratch(scratchFolder, listOfOutputs)
+				fifthStep = taskResults[0] #returns a Assembly object with statistics and alignment info
 				if args.skipTrnaScan == False:
-					for tRNAFound in fifthStep.tRNAs:
-						tRNAName = 'trna-' + tRNAFound.tRNAtype.lower()
-						if tRNAFound.tRNAintronBegin > 0:
-							tRNAsFoundWithIntrons.append(prettyRNAName(tRNAName))
-						if tRNAName not in tRNAconvert(listOfFoundTRNAs) and 'trna-sec' not in tRNAName and 'trna-sup' not in tRNAName:
-							newTRNAStart = tRNAFound.tRNAcoordinates[0]
-							newTRNAEnd = tRNAFound.tRNAcoordinates[1]
-							newTRNALen = max(newTRNAStart, newTRNAEnd) - min(newTRNAStart, newTRNAEnd)
-							#creating the new tRNA with the Alignment class and using prettyRNAName() to make sure it's
-							#named as (for example) tRNA-Phe
-							newTRNA = geneChecker.Alignment(prettyRNAName(tRNAName), prettyRNAName(tRNAName), newTRNALen)
-							newTRNA.startBase = min(newTRNAStart, newTRNAEnd)
-							newTRNA.endBase = max(newTRNAStart, newTRNAEnd)
-							if newTRNAStart > newTRNAEnd:
-								newTRNA.frame = -1
-							else:
-								newTRNA.frame = 1
+					print '## %s tRNAs were found.' % len(fifthStep)
 
-							presentFeatures[prettyRNAName(tRNAName)] = (False, thisFeatureFound, False)
-
-							listOfFeaturesToOutput.append(newTRNA)
-
-				listOfFeaturesToOutput.sort()
+				if args.ignoreFirstBuildChecks == False:
+					print ''
+					print '## Procceding to annotation...'
+					print ''
 
-				print '#'*25
-				print ''
-				print '#'*25
-				print '#### FINAL RESULTS: ####'
-				print '#'*25
-				print 'Features found: ' + str(len(presentFeatures)) + ' / ' + str(len(importantFeatures))
-				print 'Number of splits founds: ',numberOfSplits
-				print 'Split or duplicated genes: ' + ', '.join(fifthStep.checkFeatures[2])
-				print 'tRNAs found with introns: ' + str(len(tRNAsFoundWithIntrons))
-				finalStatsFile.write('Features found: ' + str(len(presentFeatures)) + ' / ' + str(len(importantFeatures)) + '\n')
-				if numberOfSplits > 0:
-					finalStatsFile.write('Number of splits founds: ' + str(numberOfSplits) + '\n')
-					finalStatsFile.write('Split or duplicated genes: ' + ', '.join(fifthStep.checkFeatures[2]) + '\n')
-				if len(tRNAsFoundWithIntrons) > 0:
-					finalStatsFile.write('tRNAs found with introns: ' + ', '.join(tRNAsFoundWithIntrons) + '\n')
+					#add the genetic feature check to this Assembly object
+					fifthStep.checkFeatures = mergeGeneChecks(taskResults[1], taskResults[2])
+					presentFeatures = fifthStep.checkFeatures[0]
+					importantFeatures = fifthStep.checkFeatures[1]
+					numberOfSplits = len(fifthStep.checkFeatures[2])
+					print '#'*75
+					print ''
+					print '#'*25
+					print '## Annotating...'
+
+					profiling.nextStage('annotation')
+					#Annotation and creation of genbank file down here:
+					resultGbFile = pathOfFinalResults + args.processName + '.unordered.gb'
+					listOfFeaturesToOutput = []
+					listOfFoundTRNAs = []
+					for foundFeature in presentFeatures:
+						thisFeatureFound = presentFeatures[foundFeature][1]
+						#comparing tRNAscan-SE results with this, in case tRNAscan-SE was run
+						if "trn" in thisFeatureFound.seq2.lower():
+							if args.skipTrnaScan == False:
+								for tRNAFound in fifthStep.tRNAs:
+								#down here we update the start and end positions of tRNAs found with Needle, with the
+								#results outputted by tRNAScan-SE
+								#tRNAconvert = guarantees all tRNA names are in tRNA-Phe format
+									if 'trna-' + tRNAFound.tRNAtype.lower() == tRNAconvert(thisFeatureFound.seq2.lower()):
+										#making sure the frame matches tRNAscan-SE results
+										if tRNAFound.tRNAcoordinates[0] > tRNAFound.tRNAcoordinates[1]:
+											thisFeatureFound.frame = -1
+										#changing start and end according to tRNAscan-SE result
+										thisFeatureFound.startBase = min(tRNAFound.tRNAcoordinates[0],
+														tRNAFound.tRNAcoordinates[1])
+										thisFeatureFound.endBase = max(tRNAFound.tRNAcoordinates[0],
+														tRNAFound.tRNAcoordinates[1])
+										break
+
+							listOfFoundTRNAs.append(thisFeatureFound.seq2.lower())
+
+						listOfFeaturesToOutput.append(thisFeatureFound)
+
+					#if tRNAscan-SE was run, check the tRNAs it found and input them in the features to output list
+					tRNAsFoundWithIntrons = [] #create empty list to hold problematic tRNAs and output them to the stats file
+					if args.skipTrnaScan == False:
+						for tRNAFound in fifthStep.tRNAs:
+							tRNAName = 'trna-' + tRNAFound.tRNAtype.lower()
+							if tRNAFound.tRNAintronBegin > 0:
+								tRNAsFoundWithIntrons.append(prettyRNAName(tRNAName))
+							if tRNAName not in tRNAconvert(listOfFoundTRNAs) and 'trna-sec' not in tRNAName and 'trna-sup' not in tRNAName:
+								newTRNAStart = tRNAFound.tRNAcoordinates[0]
+								newTRNAEnd = tRNAFound.tRNAcoordinates[1]
+								newTRNALen = max(newTRNAStart, newTRNAEnd) - min(newTRNAStart, newTRNAEnd)
+								#creating the new tRNA with the Alignment class and using prettyRNAName() to make sure it's
+								#named as (for example) tRNA-Phe
+								newTRNA = geneChecker.Alignment(prettyRNAName(tRNAName), prettyRNAName(tRNAName), newTRNALen)
+								newTRNA.startBase = min(newTRNAStart, newTRNAEnd)
+								newTRNA.endBase = max(newTRNAStart, newTRNAEnd)
+								if newTRNAStart > newTRNAEnd:
+									newTRNA.frame = -1
+								else:
+									newTRNA.frame = 1
+
+								presentFeatures[prettyRNAName(tRNAName)] = (False, thisFeatureFound, False)
+
+								listOfFeaturesToOutput.append(newTRNA)
+
+					listOfFeaturesToOutput.sort()
+
+					print '#'*25
+					print ''
+					print '#'*25
+					print '#### FINAL RESULTS: ####'
+					print '#'*25
+					print 'Features found: ' + str(len(presentFeatures)) + ' / ' + str(len(importantFeatures))
+					print 'Number of splits founds: ',numberOfSplits
+					print 'Split or duplicated genes: ' + ', '.join(fifthStep.checkFeatures[2])
+					print 'tRNAs found with introns: ' + str(len(tRNAsFoundWithIntrons))
+					finalStatsFile.write('Features found: ' + str(len(presentFeatures)) + ' / ' + str(len(importantFeatures)) + '\n')
+					if numberOfSplits > 0:
+						finalStatsFile.write('Number of splits founds: ' + str(numberOfSplits) + '\n')
+						finalStatsFile.write('Split or duplicated genes: ' + ', '.join(fifthStep.checkFeatures[2]) + '\n')
+					if len(tRNAsFoundWithIntrons) > 0:
+						finalStatsFile.write('tRNAs found with introns: ' + ', '.join(tRNAsFoundWithIntrons) + '\n')
 
-				print ''
-				finalStatsFile.write('\nFeatures not found:\n')
-				#printing missing features to the stats file:
-				for targetFeature in importantFeatures:
-					#targetFeature = id of a feature that we searched for
-					#presentFeatures = dict containing the alignment objects of all found features
-					if targetFeature.lower().startswith('trn'):
-						targetId = prettyRNAName(targetFeature)
-					else:
-						targetId = targetFeature
-					if targetId not in presentFeatures and targetFeature not in presentFeatures:
-						print '%s was not found.' % targetFeature
-						finalStatsFile.write(targetFeature + '\n')
-				print ''
+					print ''
+					finalStatsFile.write('\nFeatures not found:\n')
+					#printing missing features to the stats file:
+					for targetFeature in importantFeatures:
+						#targetFeature = id of a feature that we searched for
+						#presentFeatures = dict containing the alignment objects of all found features
+						if targetFeature.lower().startswith('trn'):
+							targetId = prettyRNAName(targetFeature)
+						else:
+							targetId = targetFeature
+						if targetId not in presentFeatures and targetFeature not in presentFeatures:
+							print '%s was not found.' % targetFeature
+							finalStatsFile.write(targetFeature + '\n')
+					print ''
 
-				finalResults = genbankOutput.genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput,
-                                                           buildCloroplast = args.buildCloroplast, dLoopSize = args.dLoopSize)
-				finalResults.name = args.processName[0:10]
-				finalResults.id = args.processName[0:10]
+					finalResults = genbankOutput.genbankOutput(resultGbFile, resultFile, listOfFeaturesToOutput,
+	                                                           buildCloroplast = args.buildCloroplast, dLoopSize = args.dLoopSize)
+					finalResults.name = args.processName[0:10]
+					finalResults.id = args.processName[0:10]
 				
-				resultSequinFile = resultGbFile.replace('.gb','.tbl')
+					resultOrderedGbFile = pathOfFinalResults + args.processName + '.gb'
 
-				with open(resultGbFile, "w") as outputResult: #create the file!
-					count = SeqIO.write(finalResults, outputResult, "genbank")
+					pheStart = None
+					for lookForPhe in ('TRNF', 'tRNA-Phe', 'trnf', 'trnF'):
+						if lookForPhe in presentFeatures:
+							pheStart = presentFeatures[lookForPhe][1].startBase
+							break
+
+					#every file (.gb, .tbl, .gff3, .bed and the ordered .fasta) is written from the same features, the ordered ones
+					#with their coordinates moved to tRNA-Phe
+					orderedFinalResults = featureExport.writeAnnotation(finalResults, pathOfFinalResults + args.processName + '.unordered',
+																		pheStart, pathOfFinalResults + args.processName)
 					createImageOfAnnotation(finalResults, resultGbFile.replace('.gb','.png'))
-				with open(resultSequinFile, "w") as outputSeqIn:
-					outputSeqIn.write('>Features ' + finalResults.name + '\n')
-					for gbkFeature in finalResults.features:
-						if gbkFeature.location.strand == 1 or gbkFeature.location.strand == None:
-							outputSeqIn.write(str(gbkFeature.location.start + 1) + ' ' + str(gbkFeature.location.end)\
-									 + ' ' + str(gbkFeature.type) + '\n\t\t')
-						else:
-							outputSeqIn.write(str(gbkFeature.location.end) + ' ' + str(gbkFeature.location.start + 1)\
-									 + ' ' + str(gbkFeature.type) + '\n\t\t')
-						for qualifier in gbkFeature.qualifiers:
-							if qualifier == 'product' or qualifier == 'gene':
-								outputSeqIn.write(str(qualifier) + ' ' + str(gbkFeature.qualifiers[qualifier]) + '\n')
-						outputSeqIn.write('\n')
 					print '.tbl (Sequin) file created.'
 
-				if ('TRNF' in presentFeatures) or ('tRNA-Phe' in presentFeatures) or ('trnf' in presentFeatures) \
-				or ('trnF' in presentFeatures):
-					print 'Creating ordered genbank file (with tRNA-Phe at the start)...'
-					resultOrderedGbFile = pathOfFinalResults + args.processName + '.gb'
-
-					if 'TRNF' in presentFeatures:
-						lookForPhe = 'TRNF'
-					elif 'tRNA-Phe' in presentFeatures:
-						lookForPhe = 'tRNA-Phe'
-					elif 'trnf' in presentFeatures:
-						lookForPhe = 'trnf'
-					elif 'trnF' in presentFeatures:
-						lookForPhe = 'trnF'
-
-					pheAlignment = presentFeatures[lookForPhe][1]
-					pheStart = pheAlignment.startBase
-					pheEnd = pheAlignment.endBase
-					orderedFinalResults = finalResults[pheStart:] + finalResults[0:pheStart]
-
-					with open(resultOrderedGbFile, "w") as outputResult: #create the file!
-						count = SeqIO.write(orderedFinalResults, outputResult, "genbank")
-						count = SeqIO.write(orderedFinalResults, resultOrderedGbFile.replace('.gb','.fasta'), "fasta")
+					if orderedFinalResults is not None:
+						print 'Creating ordered genbank file (with tRNA-Phe at the start)...'
 						createImageOfAnnotation(orderedFinalResults, resultOrderedGbFile.replace('.gb','.png'))
-					with open(resultSequinFile.replace('.unordered.tbl','.tbl'),"w") as outputSeqIn:
-						outputSeqIn.write('>Features ' + finalResults.name + '\n')
-						for gbkFeature in orderedFinalResults.features:
-							if gbkFeature.location.strand == 1 or gbkFeature.location.strand == None:
-								outputSeqIn.write(str(gbkFeature.location.start + 1) + ' ' + str(gbkFeature.location.end)\
-									 	 + ' ' + str(gbkFeature.type) + '\n\t\t')
-							else:
-								outputSeqIn.write(str(gbkFeature.location.end) + ' ' + str(gbkFeature.location.start)\
-										  + ' ' + str(gbkFeature.type) + '\n\t\t')
-							for qualifier in gbkFeature.qualifiers:
-								if qualifier == 'product' or qualifier == 'gene':
-									outputSeqIn.write(str(qualifier) + ' ' + str(gbkFeature.qualifiers[qualifier]) + '\n')
-							outputSeqIn.write('\n')
 						print 'Ordered .tbl file created.'
-
-					print 'Annotation done. Genbank file created.'
-					print ''
-
-				#If circularization couldn't be found 
-				'''
-				if fourthStep[0] == False and len(presentFeatures) < len(importantFeatures) and args.refSeqFile != None:
-					print "Circularization couldn't be found and some features were missing.\nGoing to try and find contigs for the edges..."
-					print ''
-
-					#allHitsButBest = SeqIO.parse(open("all_hits_except_best.fasta", "rU"), "fasta", generic_dna)
-
-					#create edge files here
-					edgesStart = finalResults[0:args.edgesToLook]
-					edgesStart.name = 'edge_start'
-					edgesStart.id = 'edge_start'
-					edgesEnd = finalResults[(-1) * args.edgesToLook:]
-					edgesEnd.name = 'edge_end'
-					edgesEnd.id = 'edge_end'
-					edgesList = [edgesStart, edgesEnd]
-					edgeWrite = SeqIO.write(edgesList, "final_result_edges.fasta", "fasta")
-
-					print "Formatting database for blast to find edges..."
+						print 'Annotation done. Genbank file created.'
+						print ''
+
+					#If circularization couldn't be found 
+					'''
+					if fourthStep[0] == False and len(presentFeatures) < len(importantFeatures) and args.refSeqFile != None:
+						print "Circularization couldn't be found and some features were missing.\nGoing to try and find contigs for the edges..."
+						print ''
+
+						#allHitsButBest = SeqIO.parse(open("all_hits_except_best.fasta", "rU"), "fasta", generic_dna)
+
+						#create edge files here
+						edgesStart = finalResults[0:args.edgesToLook]
+						edgesStart.name = 'edge_start'
+						edgesStart.id = 'edge_start'
+						edgesEnd = finalResults[(-1) * args.edgesToLook:]
+						edgesEnd.name = 'edge_end'
+						edgesEnd.id = 'edge_end'
+						edgesList = [edgesStart, edgesEnd]
+						edgeWrite = SeqIO.write(edgesList, "final_result_edges.fasta", "fasta")
+
+						print "Formatting database for blast to find edges..."
 			
-					if blastFolder == 'installed':
-						command = "formatdb -i " + "final_result_edges.fasta" + " -p F" #need to formatdb edgefile first
-					else:
-						command = blastFolder + "/bin/makeblastdb -in final_result_edges.fasta -dbtype nucl" #need to formatdb refseq first
-					args = shlex.split(command)
-					formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
-					formatDB.wait()
-	
-					print "Running blast against finding_edges file to determine if a hit was built..."
-					with open("finding_edges.blast.xml",'w') as blastResultFile:
 						if blastFolder == 'installed':
-							command = "blastall -p blastn -d final_result_edges.fasta -i all_hits_except_best.fasta -e " + str(blasteVal) + " -m 7" #call BLAST with XML output
+							command = "formatdb -i " + "final_result_edges.fasta" + " -p F" #need to formatdb edgefile first
 						else:
-							command = blastFolder + "/bin/blastn -task blastn -db final_result_edges.fasta -query all_hits_except_best.fasta -outfmt 5 -evalue " + str(blasteVal) #call BLAST with XML output
+							command = blastFolder + "/bin/makeblastdb -in final_result_edges.fasta -dbtype nucl" #need to formatdb refseq first
 						args = shlex.split(command)
-						blastAll = Popen(args, stdout=blastResultFile)
-						blastAll.wait()
-				'''
-			else: #if args.ignoreFirstBuildChecks == True
-				print ''
-				print '--relaxed is turned on, skipping annotation...\n'
-				print ''
+						formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
+						formatDB.wait()
+	
+						print "Running blast against finding_edges file to determine if a hit was built..."
+						with open("finding_edges.blast.xml",'w') as blastResultFile:
+							if blastFolder == 'installed':
+								command = "blastall -p blastn -d final_result_edges.fasta -i all_hits_except_best.fasta -e " + str(blasteVal) + " -m 7" #call BLAST with XML output
+							else:
+								command = blastFolder + "/bin/blastn -task blastn -db final_result_edges.fasta -query all_hits_except_best.fasta -outfmt 5 -evalue " + str(blasteVal) #call BLAST with XML output
+							args = shlex.split(command)
+							blastAll = Popen(args, stdout=blastResultFile)
+							blastAll.wait()
+					'''
+				else: #if args.ignoreFirstBuildChecks == True
+					print ''
+					print '--relaxed is turned on, skipping annotation...\n'
+					print ''
+
+				if fourthStep[0] == False:
+					print " Warning: Circularization wasn't found, so the end of the sequence might have to be extended."
 
-			if fourthStep[0] == False:
-				print " Warning: Circularization wasn't found, so the end of the sequence might have to be extended."
-
-		finalStatsFile.close()
-		print '#'*28
-		print 'generalMaker is done running.\nMain result files can be found at %s' % pathOfFinalResults
-		print 'Check the .stats file in the main results folder for general informations about your assembly.'
-		print '#'*28
-		print '\nCheck any warnings outputted by generalMaker and then check your final sequence manually for any small changes you might need to make.'
-		#cleaning up!
-		#try:
-		if args.keepTmpFolders == False:
-			#remove mira mapping folder
-			shutil.rmtree('mira_mapping/',ignore_errors=True)
-			#remove mitobim folders
-			for x in xrange(args.mitobimIterations):
-				shutil.rmtree('iteration' + str(x + 1) + '/',ignore_errors=True)
-			#remove kmer folders
-			for x in args.kmers.lower().split(','):
-				shutil.rmtree('kmer_' + str(x) + '/',ignore_errors=True)
-		if args.ignoreFirstBuildChecks == False:
-			os.remove('best_query.fasta.nin')
-			os.remove('best_query.fasta.nhr')
-			os.remove('best_query.fasta.nsq')
-			os.remove('important_features.fasta.pin')
-			os.remove('important_features.fasta.phr')
-			os.remove('important_features.fasta.psq')
-		if usingOwnGenBankReference == True:
-			tmpRefSeqStuff = args.refSeqFile + '.fasta'
-			os.remove(tmpRefSeqStuff)
+				finalStatsFile.close()
+				print '#'*28
+				print 'generalMaker is done running.\nMain result files can be found at %s' % pathOfFinalResults
+				print 'Check the .stats file in the main results folder for general informations about your assembly.'
+				print '#'*28
+				print '\nCheck any warnings outputted by generalMaker and then check your final sequence manually for any small changes you might need to make.'
+				profiling.nextStage('cleanup')
+				#cleaning up!
+				#try:
+				if args.keepTmpFolders == False:
+					#remove mira mapping folder
+					shutil.rmtree('mira_mapping/',ignore_errors=True)
+					#remove mitobim folders
+					for x in xrange(args.mitobimIterations):
+						shutil.rmtree('iteration' + str(x + 1) + '/',ignore_errors=True)
+					shutil.rmtree('mitobim_native/',ignore_errors=True)
+					#remove kmer folders
+					for x in args.kmers.lower().split(','):
+						shutil.rmtree('kmer_' + str(x) + '/',ignore_errors=True)
+					#checkpoints point to the folders above, so they are gone too
+					checkpoints.clear()
+					#reads kept by --bait and --targetcoverage
+					shutil.rmtree('baited_reads/',ignore_errors=True)
+					if os.path.exists(args.processName + '_baited.config'): os.remove(args.processName + '_baited.config')
+					shutil.rmtree('subsampled_reads/',ignore_errors=True)
+					if os.path.exists(args.processName + '_subsampled.config'): os.remove(args.processName + '_subsampled.config')
+				if args.ignoreFirstBuildChecks == False:
+					os.remove('best_query.fasta.nin')
+					os.remove('best_query.fasta.nhr')
+					os.remove('best_query.fasta.nsq')
+				#the reference fasta and its blast database are kept in the reference cache
+				if args.ignoreFirstBuildChecks == False:
+					if args.refSeqFile is not None:
+						os.remove(args.processName + '.fasta.nin')
+						os.remove(args.processName + '.fasta.nhr')
+						os.remove(args.processName + '.fasta.nsq')
+				os.remove(args.processName + '.fasta')
+				if args.skipTrnaScan == False:
+					os.remove('tRNAscan.log')
+					os.remove('best_query.trnascan')
+					shutil.move(args.processName + '.trnascan', pathOfFinalResults + args.processName + '.trnascan')
+				if args.skipMitobim == False:
+					os.remove('mitobim.log')
+				if args.ignoreFirstBuildChecks == False:
+					os.remove('important_features.fasta')
+					os.remove('important_features.cds.fasta')
+					if args.refSeqFile is not None:
+						os.remove('possible_hits.blast.tsv')
+					if not os.path.exists('mitomaker_tmp'): os.makedirs('mitomaker_tmp')
+					shutil.move('best_query.fasta','mitomaker_tmp/best_query.fasta')
+					shutil.move('possible_hits.fasta','mitomaker_tmp/possible_hits.fasta')
+					shutil.move('important_features.blast.tsv','mitomaker_tmp/important_features.blast.tsv')
+					shutil.move('important_features.cds.blast.tsv','mitomaker_tmp/important_features.cds.blast.tsv')
+				#except:
+				#	print 'Could not clean up temporary files.'
+				#end clean up.
 		else:
-			tmpRefSeqStuff = args.refSeqFile
-		if args.ignoreFirstBuildChecks == False:
-			if args.refSeqFile is not None:
-				os.remove(tmpRefSeqStuff + '.nin')
-				os.remove(tmpRefSeqStuff + '.nhr')
-				os.remove(tmpRefSeqStuff + '.nsq')
-				os.remove(args.processName + '.fasta.nin')
-				os.remove(args.processName + '.fasta.nhr')
-				os.remove(args.processName + '.fasta.nsq')
-		os.remove(args.processName + '.fasta')
-		if args.skipTrnaScan == False:
-			os.remove('tRNAscan.log')
-			os.remove('best_query.trnascan')
-			shutil.move(args.processName + '.trnascan', pathOfFinalResults + args.processName + '.trnascan')
-		if args.skipMitobim == False:
-			os.remove('mitobim.log')
-		os.remove('circularization_check.blast.xml')
-		if args.ignoreFirstBuildChecks == False:
-			os.remove('important_features.fasta')
-			os.remove('important_features.cds.fasta')
-			if args.refSeqFile is not None:
-				os.remove('possible_hits.blast.xml')
-			if not os.path.exists('mitomaker_tmp'): os.makedirs('mitomaker_tmp')
-			shutil.move('best_query.fasta','mitomaker_tmp/best_query.fasta')
-			shutil.move('possible_hits.fasta','mitomaker_tmp/possible_hits.fasta')
-			shutil.move('important_features.blast.xml','mitomaker_tmp/important_features.blast.xml')
-			shutil.move('important_features.cds.blast.xml','mitomaker_tmp/important_features.cds.blast.xml')
-		#except:
-		#	print 'Could not clean up temporary files.'
-		#end clean up.
-	else:
-		print "After " + str(len(args.kmers.split(','))) + " runs, target DNA wasn't built. Giving up."
-		print "Check reads for quality and/or each step output."
+			print "After " + str(len(args.kmers.split(','))) + " runs, target DNA wasn't built. Giving up."
+			print "Check reads for quality and/or each step output."
+			exitCode = 1
+	finally:
+		#where the time and memory of this run went, written even if it failed
+		profileReport = profiling.writeReport(args.processName + '_Final_Results/', args.processName)
+		print 'Time and resource report saved to %s.json and .tsv' % profileReport
+
+		runWorkspace.leave()
+	sys.exit(exitCode)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import os, readStreams
+
+'''
+Shared k-mer sweep used by recursiveSOAP, recursiveSOAPdenovo, recursiveSPAdes and recursiveMira.
+Each assembler gives a function that starts its assembly for a k-mer and another one that checks its output,
+the scheduler takes care of running them, picking the best build and stopping as soon as one build passes every check.
+'''
+
+def readLengthStats(inputFile, readsToSample = 2000):
+	'''
+	Samples the first reads of the first read file in a SOAP config file.
+	Returns a tuple with (mean read length, max read length) or None if no reads could be read.
+	'''
+	readFile = None
+	with open(inputFile, 'r') as soapInputFile:
+		for soapLine in soapInputFile:
+			if 'q' == soapLine[0] or 'f' == soapLine[0]:
+				readFile = soapLine.replace('\n','').split('=')[-1].strip()
+				break
+	if readFile == None or not os.path.exists(readFile):
+		return None
+
+	readLengths = []
+	with readStreams.openReads(readFile) as reads:
+		for record in readStreams.readRecords(reads):
+			readLengths.append(len(record[1]))
+			if len(readLengths) >= readsToSample:
+				break
+
+	if len(readLengths) == 0:
+		return None
+	return (float(sum(readLengths)) / len(readLengths), max(readLengths))
+
+def kmerScore(kmer, readStats):
+	'''
+	Predicted chance of a k-mer giving a complete build, higher is better.
+	Longer k-mers resolve more repeats, but each read gives less k-mers (L - k + 1), so the sweet spot for organelles,
+	which are highly covered, sits at about 2/3 of the read length. MIRA's 'default' run is always tried first.
+	'''
+	if str(kmer) == 'default':
+		return float('inf')
+	kmer = int(kmer)
+	meanReadLength, maxReadLength = readStats
+	if kmer >= maxReadLength: #this k-mer can't be built from these reads
+		return -kmer
+	return maxReadLength - abs(kmer - min(127, meanReadLength * 0.66))
+
+def rankKmers(kmers, inputFile):
+	'''
+	Returns a copy of kmers ordered by kmerScore, best first. Keeps the order given if no reads could be sampled.
+	'''
+	readStats = readLengthStats(inputFile)
+	if readStats == None:
+		print 'Could not sample reads from %s, keeping k-mer order as given.' % inputFile
+		return list(kmers)
+	rankedKmers = sorted(kmers, key=lambda kmer: kmerScore(kmer, readStats), reverse=True)
+	print 'Mean read length sampled: %.1f. K-mers will be tried in this order: %s' % (readStats[0],
+										', '.join([str(kmer) for kmer in rankedKmers]))
+	return rankedKmers
+
+def isBetterBuild(thisBuild, bestBuild):
+	'''
+	Down here doing comparison between best and current build.
+	Firstly check if we have all features built and the best assembly so far doesn't.
+	Afterwards check the number of complete genes found. Then tRNAs (stored in len of Assembly).
+	If still no better build found, check for which build has the most features built and less splits.
+	Lastly check circularization and size of sequence.
+	'''
+	thisBuildPresentFeatures = thisBuild.checkFeatures[0]
+	thisBuildImportantFeatures = thisBuild.checkFeatures[1]
+	thisBuildSplits = len(thisBuild.checkFeatures[2])
+	thisBuildCompleteGenes = len(thisBuild.checkFeatures[3])
+	thisBuildValidContigs = thisBuild.validContigs
+	bestBuildPresentFeatures = bestBuild.checkFeatures[0]
+	bestBuildImportantFeatures = bestBuild.checkFeatures[1]
+	bestBuildSplits = len(bestBuild.checkFeatures[2])
+	bestBuildCompleteGenes = len(bestBuild.checkFeatures[3])
+	bestBuildValidContigs = bestBuild.validContigs
+	if thisBuildPresentFeatures >= thisBuildImportantFeatures and bestBuildPresentFeatures < bestBuildImportantFeatures and \
+	   len(thisBuild) >= len(bestBuild) and thisBuildSplits <= bestBuildSplits:
+		return True
+	elif thisBuildCompleteGenes > bestBuildCompleteGenes and len(thisBuild) >= len(bestBuild): #check if it has more completed features
+		return True
+	elif len(thisBuild) > len(bestBuild) and thisBuildCompleteGenes >= bestBuildCompleteGenes: #check if it has more tRNAs
+		return True
+	elif thisBuildPresentFeatures > bestBuildPresentFeatures and thisBuildSplits <= bestBuildSplits and \
+	     len(thisBuild) >= len(bestBuild): #compare splits
+		return True
+	elif thisBuildValidContigs < bestBuildValidContigs and thisBuildCompleteGenes >= bestBuildCompleteGenes and \
+	     len(thisBuild) >= len(bestBuild) and thisBuildPresentFeatures >= bestBuildPresentFeatures and \
+	     thisBuildSplits <= bestBuildSplits:
+		return True
+	elif thisBuild.isCircular() == True and bestBuild.isCircular() == False and thisBuildValidContigs <= bestBuildValidContigs and \
+	     thisBuildCompleteGenes >= bestBuildCompleteGenes and len(thisBuild) >= len(bestBuild) and thisBuildPresentFeatures >= bestBuildPresentFeatures and \
+	     thisBuildSplits <= bestBuildSplits:
+		return True
+	elif len(thisBuild.refSeq.seq) - thisBuild.refSeq.seq.lower().count('n') > \
+	     len(bestBuild.refSeq.seq) - bestBuild.refSeq.seq.lower().count('n') and thisBuildValidContigs <= bestBuildValidContigs \
+	     and thisBuildCompleteGenes >= bestBuildCompleteGenes and len(thisBuild) >= len(bestBuild) and \
+	     thisBuildPresentFeatures >= bestBuildPresentFeatures and thisBuildSplits <= bestBuildSplits: #lastly, check if it's bigger
+		return True
+	return False
+
+def selectBestBuild(checkedBuilds, ignoreFirstBuildChecks = False):
+	'''
+	Picks the build to use from a list of (k-mer, checked build) tuples, in the order the k-mers were given.
+	checked build is what FirstBuildChecker.checkSoapOutput returned: True, False or an Assembly object.
+	Returns (True, kmer), (Assembly, kmer) or False, just like the recursive assemblers always did.
+	'''
+	bestBuild = None
+	bestKmer = None
+	for currentKmer, soapWasChecked in checkedBuilds:
+		if soapWasChecked == True:
+			print 'Best kmer chosen = %s' % currentKmer
+			return (True, str(currentKmer))
+		elif ignoreFirstBuildChecks == True and soapWasChecked != False:
+			if bestBuild == None or len(soapWasChecked.refSeq) > len(bestBuild.refSeq): #lastly, check if it's bigger
+				bestBuild = soapWasChecked
+				bestKmer = currentKmer
+		elif soapWasChecked != False:
+			if bestBuild == None or isBetterBuild(soapWasChecked, bestBuild):
+				bestBuild = soapWasChecked
+				bestKmer = currentKmer
+
+	if len(checkedBuilds) == 0 or bestBuild == None: #if we already tried all k-mers, just give up
+		return False
+	print 'Best kmer chosen = %s' % bestKmer
+	lastBuild = checkedBuilds[-1][1]
+	if ignoreFirstBuildChecks == False and lastBuild != True and lastBuild != False:
+		return (bestBuild, str(bestKmer))
+	return (True, str(bestKmer))
+
+def stopAssemblies(runningAssemblies):
+	'''
+	Kills the assemblies that are still going on, since their results won't be needed anymore.
+	'''
+	for currentKmer in runningAssemblies:
+		assemblyRun, logFile = runningAssemblies[currentKmer]
+		if assemblyRun.poll() == None:
+			print 'Stopping assembly for k-mer %s...' % currentKmer
+			assemblyRun.terminate()
+			assemblyRun.wait()
+		logFile.close()
+	runningAssemblies.clear()
+
+def runKmerSweep(kmers, startAssembly, checkAssembly, logFileOf, assemblerName = 'the assembler', processorsToUse = 4,
+                 parallelKmers = 1, rankByReads = False, inputFile = None, ignoreFirstBuildChecks = False):
+	'''
+	Runs one assembly per k-mer and checks them, looking for a complete build.
+	startAssembly(kmer, threadsToUse) has to start the assembly without waiting for it and return (Popen, open log file).
+	checkAssembly(kmer, threadsToUse) has to check the finished assembly, using no more than threadsToUse threads (the share 
+	of processorsToUse the assembly had), and return what FirstBuildChecker.checkSoapOutput returns.
+	logFileOf(kmer) gives the path of the log file, printed if something goes wrong.
+	With parallelKmers > 1, up to that many assemblies run at the same time, splitting processorsToUse among them,
+	while the builds are checked one at a time. With rankByReads, k-mers are tried in the order given by rankKmers.
+	As soon as a build passes every check, the other assemblies are stopped and that k-mer is returned.
+	'''
+	if rankByReads == True and inputFile != None:
+		kmersToRun = rankKmers(kmers, inputFile)
+	else:
+		kmersToRun = list(kmers)
+
+	parallelKmers = max(1, min(parallelKmers, len(kmersToRun)))
+	threadsPerKmer = max(1, processorsToUse / parallelKmers)
+	if parallelKmers > 1:
+		print 'Running up to %s k-mer assemblies at the same time, with %s threads each.' % (parallelKmers, threadsPerKmer)
+
+	runningAssemblies = {} #k-mer -> (Popen, log file) of the assemblies started but not checked yet
+	checkedBuilds = {}
+
+	for kmerIndex in xrange(len(kmersToRun)):
+		currentKmer = kmersToRun[kmerIndex]
+		print('========== STARTING K-MER %s ==========' % currentKmer)
+		try:
+			'''
+			Keep the pool full: start this k-mer and the following ones, so that up to parallelKmers assemblies
+			are running, then wait for this one to finish.
+			'''
+			for nextKmer in kmersToRun[kmerIndex:kmerIndex + parallelKmers]:
+				if nextKmer not in runningAssemblies and nextKmer not in checkedBuilds:
+					runningAssemblies[nextKmer] = startAssembly(nextKmer, threadsPerKmer)
+			if currentKmer in runningAssemblies:
+				assemblyRun, logFile = runningAssemblies.pop(currentKmer)
+				assemblyRun.wait()
+				logFile.close()
+				checkedBuilds[currentKmer] = checkAssembly(currentKmer, threadsPerKmer)
+		except KeyboardInterrupt:
+			stopAssemblies(runningAssemblies)
+			return False
+		except:
+			stopAssemblies(runningAssemblies)
+			print ''
+			print "An error occured while running %s for DeNovo assembly. Check it's logs for more information." % assemblerName
+			print 'Printing last 10 lines of log file and aborting...\n'
+			with open(logFileOf(currentKmer),'r') as logFile:
+				content = logFile.readlines()
+				for n in xrange(-1,-11,-1):
+					print content[n]
+			print ''
+			raise
+
+		if ignoreFirstBuildChecks == True:
+			print 'Ignoring tRNAscan, circular and genomic checks...'
+			print ''
+		if checkedBuilds.get(currentKmer) == True: #procceed to next step, the remaining k-mers won't be needed
+			stopAssemblies(runningAssemblies)
+			return selectBestBuild([(currentKmer, True)], ignoreFirstBuildChecks)
+
+	#no build passed every check, compare them in the order the k-mers were given, so the result doesn't depend on ranking
+	return selectBestBuild([(kmer, checkedBuilds[kmer]) for kmer in kmers if kmer in checkedBuilds], ignoreFirstBuildChecks)
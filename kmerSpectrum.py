@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import math, os, string
+import readStreams, kmerScheduler
+
+'''
+K-mer spectrum of a sample of the reads. Organelles have many copies per cell, so their k-mers form a peak of much higher 
+coverage than the nuclear ones. Its coverage tells which k-mers can still be built from the reads, which is used to pick 
+the k-mers of the DeNovo sweep (--autokmers) and how much the reads can be subsampled (--targetcoverage).
+'''
+
+complementOf = string.maketrans('ACGTacgt', 'TGCAtgca')
+
+def sampleKmerCounts(listOfFiles, kmerSize, readsToSample = 200000, sampleFraction = 16):
+	'''
+	Counts the canonical k-mers (the smallest of a k-mer and its reverse complement) of the first reads of each file, 
+	readsToSample reads in total. Only k-mers whose hash is a multiple of sampleFraction are counted: memory is 
+	sampleFraction times smaller and every counted k-mer still gets all of its counts.
+	Returns a tuple with the dict of counts, the list of the read lengths seen and the fraction of the bytes of the files 
+	that was sampled, to scale coverages back to all the reads. For compressed files that fraction is taken from the 
+	compressed bytes read, so they are decompressed here and not by pigz/pbzip2.
+	'''
+	kmerCounts = {}
+	readLengths = []
+	if len(listOfFiles) == 0:
+		return (kmerCounts, readLengths, 1.0)
+	readsPerFile = max(1, readsToSample / len(listOfFiles))
+	sampledBytes = 0
+	totalBytes = 0
+
+	for readFile in listOfFiles:
+		totalBytes += os.path.getsize(readFile)
+		isCompressed = readStreams.compressionOf(readFile) != None
+		with open(readFile, 'rb', readStreams.readBufferSize) as rawFile:
+			reads = readStreams.decompressedReads(rawFile, readFile)
+			for readNumber, record in enumerate(readStreams.readRecords(reads)):
+				if readNumber >= readsPerFile:
+					break
+				if not isCompressed:
+					sampledBytes += sum(len(line) + 1 for line in record)
+				sequence = record[1].upper()
+				reverseSequence = sequence.translate(complementOf)[::-1]
+				readLength = len(sequence)
+				readLengths.append(readLength)
+				for n in xrange(readLength - kmerSize + 1):
+					kmer = min(sequence[n:n + kmerSize], reverseSequence[readLength - n - kmerSize:readLength - n])
+					if hash(kmer) % sampleFraction == 0:
+						kmerCounts[kmer] = kmerCounts.get(kmer, 0) + 1
+			if isCompressed:
+				sampledBytes += rawFile.tell()
+	return (kmerCounts, readLengths, min(1.0, float(sampledBytes) / max(1, totalBytes)))
+
+def findOrganellePeak(kmerCounts, sampleFraction = 16, minimumSize = 5000, binFactor = 1.25):
+	'''
+	Looks for the peak of highest coverage in the k-mer spectrum holding enough k-mers to be a genome of at least 
+	minimumSize bases. Counts are grouped in bins growing by binFactor, as high coverage peaks are wide.
+	Returns a tuple with (k-mer coverage, estimated size) of the peak, or None if there is no such peak.
+	'''
+	binMass = {} #bin -> number of distinct k-mers
+	binCounts = {} #bin -> list of the counts in it
+	for kmer in kmerCounts:
+		count = kmerCounts[kmer]
+		if count < 2: #errors and nuclear k-mers seen once
+			continue
+		countBin = int(math.log(count, binFactor))
+		binMass[countBin] = binMass.get(countBin, 0) + 1
+		binCounts.setdefault(countBin, []).append(count)
+	if len(binMass) == 0:
+		return None
+
+	lastBin = max(binMass)
+	smoothMass = {}
+	for countBin in xrange(lastBin + 2):
+		smoothMass[countBin] = sum(binMass.get(countBin + n, 0) for n in (-1, 0, 1)) / 3.0
+
+	#the valley after the errors/nuclear k-mers, the peaks are after it
+	valley = None
+	for countBin in xrange(min(binMass), lastBin + 1):
+		if smoothMass[countBin] < smoothMass[countBin + 1]:
+			valley = countBin
+			break
+	if valley is None:
+		return None
+
+	for countBin in xrange(lastBin, valley, -1):
+		if smoothMass[countBin] == 0 or smoothMass[countBin] < smoothMass[countBin - 1] or smoothMass[countBin] < smoothMass[countBin + 1]:
+			continue
+		peakCounts = []
+		for n in xrange(countBin - 2, countBin + 3):
+			peakCounts += binCounts.get(n, [])
+		estimatedSize = len(peakCounts) * sampleFraction
+		if estimatedSize >= minimumSize:
+			peakCounts.sort()
+			return (peakCounts[len(peakCounts) / 2], estimatedSize)
+	return None
+
+def proposeKmers(coverage, readStats, numberOfKmers = 3, minimumKmerCoverage = 20):
+	'''
+	K-mers to try, best first. Keeps the odd k-mers (SPAdes needs them odd) from 21 up to 127 whose coverage, 
+	coverage * (L - k + 1) / L, is still minimumKmerCoverage, ranks them with kmerScheduler.kmerScore and keeps the best 
+	ones at least 8 apart from each other.
+	'''
+	meanReadLength, maxReadLength = readStats
+	candidates = [kmer for kmer in xrange(21, min(127, maxReadLength - 1) + 1, 2)
+				  if coverage * (meanReadLength - kmer + 1) / meanReadLength >= minimumKmerCoverage]
+	if len(candidates) == 0:
+		return [21]
+	candidates.sort(key=lambda kmer: kmerScheduler.kmerScore(kmer, readStats), reverse=True)
+
+	listOfKmers = []
+	for kmer in candidates:
+		if all(abs(kmer - chosenKmer) >= 8 for chosenKmer in listOfKmers):
+			listOfKmers.append(kmer)
+		if len(listOfKmers) >= numberOfKmers:
+			break
+	return listOfKmers
+
+def organelleCoverage(inputFile, kmerSize = 21, readsToSample = 300000, sampleFraction = 16):
+	'''
+	Spectrum of the reads of inputFile (a SOAPdenovo config file).
+	Returns a tuple with the read coverage of the high coverage peak, over all the reads, and the (mean, max) read length, 
+	or None if the peak couldn't be found.
+	'''
+	listOfFiles = []
+	for library in readStreams.readLibraries(inputFile):
+		for readFiles, recordsPerFragment in library.fragmentFiles():
+			listOfFiles += list(readFiles)
+	kmerCounts, readLengths, sampledPart = sampleKmerCounts(listOfFiles, kmerSize, readsToSample, sampleFraction)
+	if len(readLengths) == 0:
+		print 'Could not sample reads from %s.' % inputFile
+		return None
+	readStats = (float(sum(readLengths)) / len(readLengths), max(readLengths))
+	print 'Sampled %s reads, mean read length: %.1f' % (len(readLengths), readStats[0])
+
+	peak = findOrganellePeak(kmerCounts, sampleFraction)
+	if peak == None:
+		print 'No high coverage peak was found in the %s-mer spectrum.' % kmerSize
+		return None
+	kmerCoverage, estimatedSize = peak
+	#k-mer coverage of the sample back to read coverage of all the reads
+	coverage = kmerCoverage * readStats[0] / (readStats[0] - kmerSize + 1) / sampledPart
+	print 'High coverage peak: %s-mer coverage %s, about %.0fx read coverage, about %s bases' % (kmerSize, kmerCoverage, coverage,
+																							  estimatedSize)
+	return (coverage, readStats)
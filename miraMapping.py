@@ -25,10 +25,11 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from subprocess import Popen
-import shlex, os, shutil
+from profiling import Popen
+import shlex, os, shutil, readPool, readStreams
 
-def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewMira, pathToNewMira, pathToOldMira, pairedEnd, copyKmers, lastKmer):
+def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewMira, pathToNewMira, pathToOldMira, pairedEnd, copyKmers, lastKmer,
+				removeDuplicates = False):
 	#let's create a folder for mira!
 	print 'Creating folder for MIRA Mapping on phase 1 best sequence...'
 	pathToWork = 'mira_mapping/'
@@ -36,21 +37,11 @@ def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewM
 	#if not os.path.exists(pathToWork): os.makedirs(pathToWork)
 	os.makedirs(pathToWork)
 	
-	#now, let's read the input file and get the reads from there...
-	stringOfReadsFiles = ''
-	with open(inputFile, 'r') as soapInputFile:
-		for line in soapInputFile:
-			if '.fastq' in line:
-				#listOfReadsFiles.append(line.replace('\n',''))
-				stringOfReadsFiles += ' ' + line.replace('\n','').split('=')[-1]
+	#all the reads of the input file in one readpool, since it's mapping...
+	print 'Writing the read pool...'
+	readPool.writeReadPool(inputFile, pathToWork + processName + '_in.' + miraTechnology + '.fastq', removeDuplicates)
 
 	if useNewMira == False: #use mira 3.4, default behaviour
-		#grabbed all input files, let's cat them into one since it's mapping...
-		with open(pathToWork + processName + '_in.' + miraTechnology + '.fastq', 'w') as miraInput:
-			command = "cat" + stringOfReadsFiles
-			args = shlex.split(command)
-			createUniqueReadsFile = Popen(args, stdout=miraInput)
-			createUniqueReadsFile.wait()
 	
 		#let's create the backbone file
 		destFile = pathToWork + processName + '_backbone_in.fasta'
@@ -76,13 +67,9 @@ def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewM
 			return False
 	else: #use mira4
 
-		#cat all reads to be used by mitobim, but for the mapping assembly, different readgroups will be created
-		with open(pathToWork + processName + '_in.' + miraTechnology + '.fastq', 'w') as miraInput:
-			command = "cat" + stringOfReadsFiles
-			args = shlex.split(command)
-			createUniqueReadsFile = Popen(args, stdout=miraInput)
-			createUniqueReadsFile.wait()
-
+		#the read pool is used by mitobim, but for the mapping assembly, different readgroups will be created
+		#compressed read files are given to MIRA through named pipes
+		readPipes = readStreams.NamedPipes(pathToWork + 'read_pipes/')
 		with open(pathToWork + 'mapping.manifest', 'w') as manifestFile:
 			manifestFile.write('project = ' + processName + '\n')
 			manifestFile.write('job = genome, mapping, accurate\n')
@@ -127,7 +114,7 @@ def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewM
 					manifestFile.write('readgroup\n')
 					manifestFile.write('data =')
 					for readFile in listOfInputs[readGroup]:
-						manifestFile.write(' ' + readFile)
+						manifestFile.write(' ' + readPipes.plainPath(readFile))
 					manifestFile.write('\n')
 					manifestFile.write('technology = ' + listOfTechnologies[readGroup] + '\n')
 					if listOfQualities[readGroup] != None:
@@ -154,8 +141,10 @@ def miraMapping(processName, processorsToUse, inputFile, miraTechnology, useNewM
 				args = shlex.split(command)
 				miraRun = Popen(args, cwd=pathToWork, stdout=miraLogFile)
 				miraRun.wait()
+				readPipes.close()
 				return True
 			except:
+				readPipes.close()
 				print "An error occured while running MIRA4 for mapping assembly. Check it's logs for more information."
 				print 'Printing last 10 lines of log file...\n'
 				with open(pathToWork + 'mira.log','r') as logFile:
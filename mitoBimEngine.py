@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+from itertools import izip
+import os, shutil
+import readStreams
+from readBaiting import reverseComplement
+
+'''
+MITObim-like extension of the mapping result without MIRA. MITObim runs a new MIRA mapping for every iteration, rereading 
+the whole read pool and remapping every read to the whole backbone. Here only the ends of the backbone can change, so 
+only reads sharing k-mers with the last bases of each end are baited, placed by their k-mer and used to extend it by the 
+consensus of what they have past the end.
+The k-mer index of the ends is kept between iterations and only updated with the bases each iteration added, and it stops 
+as soon as an iteration adds nothing, or the backbone runs into itself (circularized).
+The read pool is only read once: reads placed inside the backbone, away from both ends, can never reach an end, so only 
+the other ones are kept in memory and scanned again by the next iterations.
+'''
+
+class BackboneEnd():
+	'''
+	One end of the backbone. The left end is kept reverse complemented, so both are extended by appending to sequence.
+	Only k-mers of the last endLength bases are indexed, a read has to overlap those to reach past the end.
+	'''
+	def __init__(self, sequence, kmerSize, endLength):
+		self.sequence = sequence
+		self.kmerSize = kmerSize
+		self.endLength = endLength
+		self.added = 0 #bases added to this end so far
+		self.indexStart = 0 #k-mers starting in [indexStart, indexEnd) are indexed
+		self.indexEnd = 0
+		self.kmerPositions = {}
+		self.updateIndex()
+
+	def updateIndex(self):
+		'''
+		Indexes the k-mers of the new bases and drops the ones that are no longer in the last endLength bases.
+		'''
+		newStart = max(0, len(self.sequence) - self.endLength)
+		newEnd = len(self.sequence) - self.kmerSize + 1
+		for n in xrange(self.indexStart, min(newStart, self.indexEnd)):
+			kmer = self.sequence[n:n + self.kmerSize]
+			if self.kmerPositions.get(kmer) == n:
+				del self.kmerPositions[kmer]
+		for n in xrange(max(newStart, self.indexEnd), newEnd):
+			self.kmerPositions[self.sequence[n:n + self.kmerSize]] = n
+		self.indexStart = newStart
+		self.indexEnd = max(self.indexEnd, newEnd)
+
+	def extend(self, extension):
+		self.sequence += extension
+		self.added += len(extension)
+		self.updateIndex()
+
+def overhangOf(read, backboneEnd, step, minimumOverlap, maximumMismatches):
+	'''
+	Places read (in the orientation of backboneEnd) by the first of its k-mers, every step bases, found at the end and 
+	returns the part of it past the end, or None if it doesn't reach past it or its overlap doesn't match.
+	'''
+	sequence = backboneEnd.sequence
+	for n in xrange(0, len(read) - backboneEnd.kmerSize + 1, step):
+		position = backboneEnd.kmerPositions.get(read[n:n + backboneEnd.kmerSize])
+		if position is not None:
+			readStart = position - n
+			overlap = len(sequence) - readStart
+			if overlap < minimumOverlap or overlap >= len(read) or readStart < 0:
+				return None
+			mismatches = 0
+			for readBase, backboneBase in izip(read[:overlap], sequence[readStart:]):
+				if readBase != backboneBase:
+					mismatches += 1
+			if mismatches > maximumMismatches * overlap:
+				return None
+			return read[overlap:]
+	return None
+
+def consensusOf(listOfOverhangs, minimumCoverage, minimumAgreement):
+	'''
+	The bases past the end that at least minimumCoverage overhangs agree on, stopping at the first position with less 
+	coverage or where the most common base is in less than minimumAgreement of them (a repeat or a variant).
+	'''
+	consensus = []
+	for column in xrange(max([len(overhang) for overhang in listOfOverhangs] + [0])):
+		counts = {}
+		for overhang in listOfOverhangs:
+			if column < len(overhang) and overhang[column] in 'ACGT':
+				counts[overhang[column]] = counts.get(overhang[column], 0) + 1
+		coverage = sum(counts.values())
+		if coverage < minimumCoverage:
+			break
+		base = max(counts, key=counts.get)
+		if counts[base] < minimumAgreement * coverage:
+			break
+		consensus.append(base)
+	return ''.join(consensus)
+
+def backboneOf(listOfEnds, originalLength):
+	'''
+	The backbone with the extensions of both ends.
+	'''
+	rightEnd, leftEnd = listOfEnds
+	return reverseComplement(leftEnd.sequence[originalLength:]) + rightEnd.sequence
+
+def runsIntoItself(backbone, kmerSize):
+	'''
+	True if the first or last 2*kmerSize bases of the backbone are found again in it, the ends have met (circularized).
+	'''
+	probeSize = 2 * kmerSize
+	if len(backbone) < 2 * probeSize:
+		return False
+	return backbone.find(backbone[-probeSize:]) != len(backbone) - probeSize or backbone.find(backbone[:probeSize], 1) != -1
+
+def iterationReads(poolFile):
+	'''
+	Generator of the sequences of the read pool, in upper case.
+	'''
+	with readStreams.openReads(poolFile) as reads:
+		for record in readStreams.readRecords(reads):
+			yield record[1].upper()
+
+def interiorIndex(backbone, kmerSize, endLength):
+	'''
+	Positions of the k-mers of the backbone far enough from both ends that a read placed on them ends before the indexed 
+	bases of either end. K-mers found more than once in the backbone get None, they don't place a read.
+	'''
+	kmerPositions = {}
+	for n in xrange(endLength, len(backbone) - endLength - kmerSize + 1):
+		kmer = backbone[n:n + kmerSize]
+		kmerPositions[kmer] = None if kmer in kmerPositions else n
+	for n in range(0, endLength) + range(max(endLength, len(backbone) - endLength - kmerSize + 1), len(backbone) - kmerSize + 1):
+		kmer = backbone[n:n + kmerSize]
+		if kmer in kmerPositions:
+			kmerPositions[kmer] = None
+	return kmerPositions
+
+def isInterior(read, kmerPositions, kmerSize):
+	'''
+	True if the first and last k-mers of read, or of its reverse complement, place it at the same spot of interiorIndex, 
+	so the whole read lies inside the backbone. Such a read will never reach an end, however much they grow.
+	'''
+	if len(read) < kmerSize:
+		return True #too short to be placed at any end
+	for sequence in (read, reverseComplement(read)):
+		firstPosition = kmerPositions.get(sequence[:kmerSize])
+		if firstPosition is not None and kmerPositions.get(sequence[-kmerSize:]) == firstPosition + len(sequence) - kmerSize:
+			return True
+	return False
+
+def mitoBimEngine(processName, backboneFile, poolFile, readLen, maximumIterations = 10, kmerSize = 31, minimumCoverage = 3,
+				  minimumAgreement = 0.7, maximumMismatches = 0.05, minimumGrowth = 1, outputFolder = 'mitobim_native/',
+				  maximumCandidateBases = 1 << 30):
+	'''
+	Extends the first sequence of backboneFile with the reads of poolFile for up to maximumIterations iterations, stopping 
+	once an iteration adds less than minimumGrowth bases.
+	The first iteration streams the pool and keeps the reads that are not inside the backbone, the later ones only scan 
+	those. If they add up to more than maximumCandidateBases, they are dropped and every iteration streams the pool.
+	Writes the result to outputFolder + processName + '_out.unpadded.fasta', and each iteration to mitobim.log.
+	Returns a tuple with (path of the result, or None if no backbone was found, list with the (iteration, length, baited 
+	reads, Ns) of each iteration), like mitoBimWrapper.
+	'''
+	listOfIterations = []
+	listOfRecords = list(SeqIO.parse(backboneFile, 'fasta', generic_dna))
+	if len(listOfRecords) == 0:
+		print 'No backbone found in %s.' % backboneFile
+		return (None, listOfIterations)
+	backbone = str(listOfRecords[0].seq).upper()
+	originalLength = len(backbone)
+	endLength = max(readLen, 2 * kmerSize)
+	step = max(1, kmerSize / 4)
+	minimumOverlap = kmerSize + step - 1 #every read overlapping this much has an indexed k-mer in one of the steps
+	listOfEnds = [BackboneEnd(backbone, kmerSize, endLength), BackboneEnd(reverseComplement(backbone), kmerSize, endLength)]
+	kmerPositions = interiorIndex(backbone, kmerSize, endLength)
+	candidateReads = None #reads that may reach an end, once the pool was read
+
+	shutil.rmtree(outputFolder, ignore_errors=True)
+	os.makedirs(outputFolder)
+	with open('mitobim.log', 'w') as logFile:
+		logFile.write('Backbone: %s (%s bp), read pool: %s\n' % (listOfRecords[0].id, originalLength, poolFile))
+		logFile.write('#iteration\tlength\tleft_extension\tright_extension\tbaited_reads\n')
+		for iteration in xrange(1, maximumIterations + 1):
+			overhangsOf = ([], [])
+			if candidateReads is None:
+				listOfReads = iterationReads(poolFile)
+				if kmerPositions is not None:
+					keptReads = []
+					keptBases = 0
+			else:
+				listOfReads = candidateReads
+			for read in listOfReads:
+				if candidateReads is None and kmerPositions is not None and not isInterior(read, kmerPositions, kmerSize):
+					keptReads.append(read)
+					keptBases += len(read)
+					if keptBases > maximumCandidateBases:
+						print 'The reads that may reach the ends take more than %s bases, the read pool is read on every iteration.' \
+							% maximumCandidateBases
+						kmerPositions = None #stop trying
+						keptReads = None
+				readComplement = None
+				for endNumber, backboneEnd in enumerate(listOfEnds):
+					overhang = overhangOf(read, backboneEnd, step, minimumOverlap, maximumMismatches)
+					if overhang is None:
+						if readComplement is None:
+							readComplement = reverseComplement(read)
+						overhang = overhangOf(readComplement, backboneEnd, step, minimumOverlap, maximumMismatches)
+					if overhang is not None:
+						overhangsOf[endNumber].append(overhang)
+
+			if candidateReads is None and kmerPositions is not None:
+				candidateReads = keptReads
+				kmerPositions = None #not needed anymore
+				logFile.write('#%s reads kept for the next iterations\n' % len(candidateReads))
+			listOfExtensions = [consensusOf(overhangsOf[endNumber], minimumCoverage, minimumAgreement) for endNumber in xrange(2)]
+			for backboneEnd, extension in izip(listOfEnds, listOfExtensions):
+				if len(extension) > 0:
+					backboneEnd.extend(extension)
+			backbone = backboneOf(listOfEnds, originalLength)
+			listOfIterations.append((iteration, len(backbone), len(overhangsOf[0]) + len(overhangsOf[1]), backbone.count('N')))
+			logFile.write('%s\t%s\t%s\t%s\t%s\n' % (iteration, len(backbone), len(listOfExtensions[1]), len(listOfExtensions[0]),
+												  len(overhangsOf[0]) + len(overhangsOf[1])))
+			print 'Iteration %s: backbone with %s bp (+%s bp left, +%s bp right).' % (iteration, len(backbone), len(listOfExtensions[1]),
+																					 len(listOfExtensions[0]))
+			if len(listOfExtensions[0]) + len(listOfExtensions[1]) < max(1, minimumGrowth):
+				print 'The backbone stopped growing, stopping after iteration %s.' % iteration
+				break
+			if runsIntoItself(backbone, kmerSize):
+				print 'The ends of the backbone met, stopping after iteration %s.' % iteration
+				break
+
+	pathOfResult = outputFolder + processName + '_out.unpadded.fasta'
+	with open(pathOfResult, 'w') as resultFile:
+		resultFile.write('>' + processName + '\n')
+		for n in xrange(0, len(backbone), 60):
+			resultFile.write(backbone[n:n + 60] + '\n')
+	return (pathOfResult, listOfIterations)
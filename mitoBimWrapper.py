@@ -25,14 +25,65 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from subprocess import Popen
-import shlex, os, shutil
+from profiling import Popen
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+import shlex, os, shutil, circularizationCheck
+
+def iterationResults(iteration, processName, newMira):
+	'''
+	Returns a tuple with the paths of the (fasta, maf, caf) results of a MITObim iteration.
+	'''
+	if newMira == True:
+		pathOfResults = 'iteration' + str(iteration) + '/' + processName + '_1-backbone_assembly/' + processName + '_1-backbone_d_results/' + processName + '_1-backbone_out'
+		return (pathOfResults + '_AllStrains.unpadded.fasta', pathOfResults + '.maf', pathOfResults + '.caf')
+	else:
+		pathOfResults = 'iteration' + str(iteration) + '/' + processName + '-ReferenceStrain_assembly/' + processName + '-ReferenceStrain_d_results/' + processName + '-ReferenceStrain_out'
+		return (pathOfResults + '.unpadded.fasta', pathOfResults + '.maf', pathOfResults + '.caf')
+
+def backboneStats(fastaFile):
+	'''
+	Returns a tuple with the (length, number of Ns, number of sequences) of a fasta file.
+	'''
+	length = 0
+	numberOfNs = 0
+	numberOfSequences = 0
+	for record in SeqIO.parse(fastaFile, 'fasta', generic_dna):
+		length += len(record.seq)
+		numberOfNs += str(record.seq).upper().count('N')
+		numberOfSequences += 1
+	return (length, numberOfNs, numberOfSequences)
+
+def readsOf(mitobimOutput):
+	'''
+	The number of reads MITObim says the readpool of an iteration had, or None if it didn't get that far.
+	'''
+	numberOfReads = None
+	for line in mitobimOutput.split('\n'):
+		if line.startswith('readpool contains '):
+			numberOfReads = int(line.split()[2])
+	return numberOfReads
+
+def writeIterationStats(statsFile, listOfIterations):
+	'''
+	Writes the (iteration, length, reads, Ns) of each MITObim iteration as a table to the open statsFile.
+	'''
+	statsFile.write('\nMITObim iterations:\n')
+	statsFile.write('Iteration\tLength\tReads\tNs\n')
+	for iteration, length, numberOfReads, numberOfNs in listOfIterations:
+		if numberOfReads is None:
+			numberOfReads = '-'
+		statsFile.write('%s\t%s\t%s\t%s\n' % (iteration, length, numberOfReads, numberOfNs))
 
 def mitoBimWrapper(mitobimIterations, processName, miraTechnology, mitobimFolder, readLen, newMira, newMitobimFolder, pathToNewMira, pathToOldMira,
-                  kmerUsed):
+                  kmerUsed, minimumGrowth = 1, circularSize = 45, circularOffSet = 200):
 	'''
-	Wrapper for MITObim. Just runs the program.
+	Wrapper for MITObim. Runs it one iteration at a time, each one starting from the maf of the one before, for up to 
+	mitobimIterations iterations. It stops early once the backbone grows less than minimumGrowth bases in an iteration or 
+	circularizes (see circularizationCheck).
+	Returns a tuple with (True or False, list with the (iteration, length, reads, Ns) of each iteration that was run).
 	'''
+	listOfIterations = []
 	#let's clean up, just in case
 	print ''
 	print 'Deleting any iterationX/ folders from previous MITObim runs that will be used by this one...'
@@ -47,6 +98,8 @@ def mitoBimWrapper(mitobimIterations, processName, miraTechnology, mitobimFolder
 	readPoolPath = os.path.abspath('mira_mapping/' + processName + '_in.' + miraTechnology + '.fastq')
 	mafPath = os.path.abspath('mira_mapping/' + processName + '_assembly/' + processName + '_d_results/'
 							+ processName + '_out.maf')
+	previousLength = backboneStats('mira_mapping/' + processName + '_assembly/' + processName + '_d_results/' + processName +
+								   '_out_AllStrains.unpadded.fasta')[0]
 	
 	#debugging messages
 	#print 'Readpool: ' + readPoolPath
@@ -54,23 +107,43 @@ def mitoBimWrapper(mitobimIterations, processName, miraTechnology, mitobimFolder
 	print 'Running MITObim.pl...'
 
 	try:
-		#time to run mitobim
-		if newMira == True:
-			#run with mitoBIM 1.7, if mapping was made with mira4.0
-			with open('mitobim.log','w') as mitobimLogFile:
-				command = 'perl ' + newMitobimFolder + 'MITObim.pl -start 1 -end ' + str(mitobimIterations) + ' -sample ' + processName + '_1' ' -ref backbone -readpool ' + readPoolPath + ' -kmer ' + str(kmerUsed) + ' -maf ' + mafPath + ' --clean --readlength ' + str(readLen) + ' --mirapath ' + pathToNewMira + '/bin/'
-				args = shlex.split(command)
-				mitobimCaller = Popen(args, stdout=mitobimLogFile)
-				mitobimCaller.wait()
-				return True
-		else:
-			#run with mitoBIM 1.6
-			with open('mitobim.log','w') as mitobimLogFile:
-				command = 'perl ' + mitobimFolder + 'MITObim.pl -start 1 -end ' + str(mitobimIterations) + ' -strain ' + processName + ' -ref ReferenceStrain -readpool ' + readPoolPath + ' -maf ' + mafPath + ' --clean --readlength ' + str(readLen) + ' --mirapath ' + pathToOldMira + '/bin/'
+		with open('mitobim.log','w') as mitobimLogFile:
+			for iteration in xrange(1, mitobimIterations + 1):
+				#time to run mitobim
+				if newMira == True:
+					#run with mitoBIM 1.7, if mapping was made with mira4.0
+					command = 'perl ' + newMitobimFolder + 'MITObim.pl -start ' + str(iteration) + ' -end ' + str(iteration) + ' -sample ' + processName + '_1' ' -ref backbone -readpool ' + readPoolPath + ' -kmer ' + str(kmerUsed) + ' -maf ' + mafPath + ' --clean --readlength ' + str(readLen) + ' --mirapath ' + pathToNewMira + '/bin/'
+				else:
+					#run with mitoBIM 1.6
+					command = 'perl ' + mitobimFolder + 'MITObim.pl -start ' + str(iteration) + ' -end ' + str(iteration) + ' -strain ' + processName + ' -ref ReferenceStrain -readpool ' + readPoolPath + ' -maf ' + mafPath + ' --clean --readlength ' + str(readLen) + ' --mirapath ' + pathToOldMira + '/bin/'
+				mitobimLogFile.flush()
+				logStart = mitobimLogFile.tell()
 				args = shlex.split(command)
 				mitobimCaller = Popen(args, stdout=mitobimLogFile)
 				mitobimCaller.wait()
-				return True
+
+				#the next iteration starts from this one, so it only goes on if this one has its results
+				pathOfResult, pathOfMafResult, pathOfCafResult = iterationResults(iteration, processName, newMira)
+				if not os.path.exists(pathOfResult) or not os.path.exists(pathOfMafResult):
+					print 'MITObim iteration %s has no results, stopping.' % iteration
+					break
+				with open('mitobim.log', 'r') as logFile:
+					logFile.seek(logStart)
+					numberOfReads = readsOf(logFile.read())
+				length, numberOfNs, numberOfSequences = backboneStats(pathOfResult)
+				listOfIterations.append((iteration, length, numberOfReads, numberOfNs))
+				print 'Iteration %s: %s bp, %s reads, %s Ns.' % (iteration, length, numberOfReads, numberOfNs)
+
+				if length - previousLength < minimumGrowth:
+					print 'The backbone grew %s bp (less than %s), stopping MITObim after iteration %s.' % (length - previousLength,
+																											minimumGrowth, iteration)
+					break
+				if numberOfSequences == 1 and circularizationCheck.circularizationCheck(pathOfResult, circularSize, circularOffSet)[0] == True:
+					print 'The backbone circularized, stopping MITObim after iteration %s.' % iteration
+					break
+				previousLength = length
+				mafPath = os.path.abspath(pathOfMafResult)
+			return (True, listOfIterations)
 	except:
 		print ''
 		print "MITObim failed. Check it's logs for more information..."
@@ -80,4 +153,4 @@ def mitoBimWrapper(mitobimIterations, processName, miraTechnology, mitobimFolder
 			for n in xrange(-1,-11,-1):
 				print content[n]
 			print ''
-		return False
+		return (False, listOfIterations)
@@ -43,4 +43,4 @@ if __name__ == "__main__":
 	command = 'python -u %s/generalMaker.py %s %s' % (module_dir, ' '.join(sys.argv[1:]), flagsToAppend)
 	args = shlex.split(command)
 	generalMaker = Popen(args)
-	generalMaker.wait()
+	sys.exit(generalMaker.wait())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import os, shutil, sys, threading
+
+'''
+Runs independent checks (tRNAscan-SE, blastx, blastn...) at the same time.
+The work is done by external programs, so plain threads waiting on them are enough.
+'''
+
+def runTasks(listOfTasks):
+	'''
+	Each task is a tuple with (function, args) or (function, args, kwargs). Runs them all at the same time and waits for every 
+	one of them to finish.
+	Returns the list of their results, in the order of listOfTasks. If any task raised an exception, it is raised here once 
+	every task is done.
+	'''
+	results = [None] * len(listOfTasks)
+	errors = [None] * len(listOfTasks)
+
+	def runTask(n, function, args, kwargs):
+		try:
+			results[n] = function(*args, **kwargs)
+		except:
+			errors[n] = sys.exc_info()
+
+	listOfThreads = []
+	for n, task in enumerate(listOfTasks):
+		function, args = task[0], task[1]
+		kwargs = task[2] if len(task) > 2 else {}
+		thread = threading.Thread(target=runTask, args=(n, function, args, kwargs))
+		thread.daemon = True #so ctrl+c won't hang waiting for them
+		thread.start()
+		listOfThreads.append(thread)
+
+	for thread in listOfThreads:
+		while thread.is_alive(): #join with a timeout, otherwise ctrl+c is only seen when the thread is done
+			thread.join(0.5)
+
+	for error in errors:
+		if error is not None:
+			raise error[0], error[1], error[2]
+	return results
+
+def threadsPerTask(threadsToUse, numberOfTasks):
+	'''
+	Share of threadsToUse each of numberOfTasks tasks run at the same time gets, at least 1.
+	'''
+	return max(1, threadsToUse / max(1, numberOfTasks))
+
+def collectScratch(scratchFolder, listOfOutputs):
+	'''
+	Moves the outputs of the tasks (paths inside scratchFolder, the ones that were not written are skipped) to the current 
+	folder, where the rest of the pipeline expects them, and removes scratchFolder with anything else left in it. 
+	scratchFolder can be in another filesystem. Two outputs with the same file name would overwrite each other, so that 
+	raises a RuntimeError before anything is moved.
+	'''
+	outputOf = {}
+	for outputPath in listOfOutputs:
+		fileName = os.path.basename(outputPath)
+		if fileName in outputOf and outputOf[fileName] != outputPath:
+			raise RuntimeError('%s and %s would both be collected as %s' % (outputOf[fileName], outputPath, fileName))
+		outputOf[fileName] = outputPath
+	for fileName, outputPath in outputOf.items():
+		if os.path.exists(outputPath):
+			shutil.move(outputPath, fileName)
+	shutil.rmtree(scratchFolder, ignore_errors=True)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import os, shutil, json, hashlib
+
+def readFilesOf(inputFile):
+	'''
+	Returns the list of read files named in a SOAPdenovo config file.
+	'''
+	listOfReads = []
+	with open(inputFile, 'r') as soapInputFile:
+		for soapLine in soapInputFile:
+			if soapLine[0] in ('q', 'f', 'p') and '=' in soapLine:
+				listOfReads.append(soapLine.replace('\n','').split('=')[-1].strip())
+	return listOfReads
+
+def fileStats(listOfFiles):
+	'''
+	Returns a dict with the size and modification time of each file that exists, which is what we use to tell if it was changed.
+	'''
+	stats = {}
+	for fileName in listOfFiles:
+		if os.path.exists(fileName):
+			fileInfo = os.stat(fileName)
+			stats[fileName] = [fileInfo.st_size, int(fileInfo.st_mtime)]
+	return stats
+
+def hashParameters(parameters):
+	'''
+	sha1 of the parameters of a stage, so any change in them makes its checkpoint stale.
+	'''
+	return hashlib.sha1(json.dumps(parameters, sort_keys=True)).hexdigest()
+
+def argumentsOf(args, listOfNames):
+	'''
+	Grabs only the argparse values in listOfNames, since each stage only depends on some of them.
+	'''
+	return dict((argName, getattr(args, argName)) for argName in listOfNames)
+
+def toStr(value):
+	'''
+	json gives us unicode and lists back, turn them into what the pipeline used before saving them.
+	'''
+	if isinstance(value, unicode):
+		return str(value)
+	elif isinstance(value, list):
+		return tuple(toStr(x) for x in value)
+	elif isinstance(value, dict):
+		return dict((toStr(x), toStr(value[x])) for x in value)
+	return value
+
+class Checkpoints():
+	'''
+	Keeps one json manifest per pipeline stage inside <processName>_checkpoints/.
+	Each manifest has the stats of the stage inputs, a hash of its parameters, the stats of its output files and whatever 
+	the stage returned. When resuming, a stage is only skipped if all of that still matches, and once a stage is stale 
+	every stage after it runs again.
+	'''
+	def __init__(self, processName, resume = False):
+		self.folder = processName + '_checkpoints/'
+		self.resume = resume
+		if resume == False:
+			shutil.rmtree(self.folder, ignore_errors=True)
+		if not os.path.exists(self.folder): os.makedirs(self.folder)
+
+	def manifestOf(self, stageName):
+		return self.folder + stageName + '.json'
+
+	def load(self, stageName, parameters, inputs):
+		'''
+		Returns the results saved by stageName if its checkpoint is still valid, None otherwise.
+		'''
+		if self.resume == False:
+			return None
+		manifest = None
+		if os.path.exists(self.manifestOf(stageName)):
+			with open(self.manifestOf(stageName), 'r') as manifestFile:
+				try:
+					manifest = json.load(manifestFile)
+				except ValueError: #half written manifest, from a crash while saving it
+					manifest = None
+
+		reason = None
+		if manifest is None:
+			reason = 'no checkpoint was found'
+		elif manifest['parameters'] != hashParameters(parameters):
+			reason = 'parameters changed'
+		elif manifest['inputs'] != fileStats(inputs):
+			reason = 'input files changed'
+		elif manifest['outputs'] != fileStats(manifest['outputs'].keys()):
+			reason = 'output files changed or are missing'
+
+		if reason is not None:
+			print 'Checkpoint for %s is stale (%s), running it and every stage after it again.' % (stageName, reason)
+			self.resume = False
+			return None
+		print 'Checkpoint for %s is still valid, skipping it.' % stageName
+		return toStr(manifest['results'])
+
+	def save(self, stageName, parameters, inputs, outputs, results):
+		'''
+		Writes the manifest of stageName. outputs that do not exist are left out of it.
+		'''
+		manifest = {'stage': stageName, 'parameters': hashParameters(parameters), 'inputs': fileStats(inputs),
+					'outputs': fileStats(outputs), 'results': results}
+		#write to a tmp file first, so a crash now won't leave a broken manifest behind
+		with open(self.manifestOf(stageName) + '.tmp', 'w') as manifestFile:
+			json.dump(manifest, manifestFile, sort_keys=True, indent=1)
+		os.rename(self.manifestOf(stageName) + '.tmp', self.manifestOf(stageName))
+
+	def clear(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
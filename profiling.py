@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import subprocess
+import errno, json, os, resource, shlex, threading, time
+
+'''
+Wall time, CPU time, peak memory and disk I/O of every stage of a run and of every external program it calls.
+The modules import Popen from here instead of subprocess, so each SOAP, SPAdes, MIRA, MITObim, BLAST and tRNAscan-SE call is 
+measured when it is waited on. generalMaker marks its stages with nextStage() and writes the report at the end of the run.
+'''
+
+runStart = time.time()
+records = [] #one dict per finished stage or program, see writeReport
+openStages = [] #stack of (name, start time, own usage, children usage, own I/O)
+recordsLock = threading.Lock()
+
+reportFields = ['kind', 'name', 'stage', 'start', 'wall', 'user', 'system', 'maxrss_kb', 'read_bytes', 'written_bytes', 'exit_code', 
+				'command']
+
+def currentStage():
+	if openStages:
+		return openStages[-1][0]
+	return ''
+
+def ownIO(children):
+	'''
+	Bytes read and written by this process (all threads) and the children it already waited on. From /proc, which counts 
+	both, or from the rusage of the children (in 512 byte blocks) where /proc isn't available.
+	'''
+	readBytes, writtenBytes = None, None
+	try:
+		with open('/proc/self/io', 'r') as ioFile:
+			for line in ioFile:
+				if line.startswith('read_bytes:'):
+					readBytes = int(line.split()[1])
+				elif line.startswith('write_bytes:'):
+					writtenBytes = int(line.split()[1])
+	except IOError:
+		pass
+	if readBytes is None or writtenBytes is None:
+		return (children.ru_inblock * 512, children.ru_oublock * 512)
+	return (readBytes, writtenBytes)
+
+def addRecord(record):
+	with recordsLock:
+		records.append(record)
+
+def toolName(args):
+	'''
+	Name of the program a Popen call runs, skipping the interpreter for perl/python scripts (MITObim.pl).
+	'''
+	if isinstance(args, basestring):
+		args = shlex.split(args)
+	name = os.path.basename(args[0])
+	if name in ('perl', 'python', 'sh', 'bash') and len(args) > 1 and not args[1].startswith('-'):
+		name = os.path.basename(args[1])
+	return name
+
+class Popen(subprocess.Popen):
+	'''
+	subprocess.Popen that reaps its child with wait4, to get its resource usage, and records it.
+	'''
+	def __init__(self, args, *popenArgs, **popenKwargs):
+		self.profileName = toolName(args)
+		self.profileStage = currentStage()
+		self.profileCommand = args if isinstance(args, basestring) else ' '.join(args)
+		self.profileStart = time.time()
+		subprocess.Popen.__init__(self, args, *popenArgs, **popenKwargs)
+
+	def reap(self, options):
+		while True:
+			try:
+				pid, status, usage = os.wait4(self.pid, options)
+				break
+			except OSError as e:
+				if e.errno == errno.EINTR:
+					continue
+				if e.errno == errno.ECHILD: #somebody else reaped it, its exit status is lost
+					print 'WARNING: could not get the exit status of %s (pid %s), it was reaped elsewhere.' % (self.profileName, self.pid)
+					self.returncode = -1
+				return
+		if pid != self.pid:
+			return
+		self._handle_exitstatus(status)
+		addRecord({'kind': 'program', 'name': self.profileName, 'stage': self.profileStage, 'start': self.profileStart - runStart,
+				   'wall': time.time() - self.profileStart, 'user': usage.ru_utime, 'system': usage.ru_stime,
+				   'maxrss_kb': usage.ru_maxrss, 'read_bytes': usage.ru_inblock * 512, 'written_bytes': usage.ru_oublock * 512,
+				   'exit_code': self.returncode, 'command': self.profileCommand})
+
+	def poll(self):
+		if self.returncode is None:
+			self.reap(os.WNOHANG)
+		return self.returncode
+
+	def wait(self):
+		if self.returncode is None:
+			self.reap(0)
+		return self.returncode
+
+def startStage(name):
+	children = resource.getrusage(resource.RUSAGE_CHILDREN)
+	openStages.append((name, time.time(), resource.getrusage(resource.RUSAGE_SELF), children, ownIO(children)))
+
+def endStage():
+	'''
+	Closes the innermost stage. Its CPU time and I/O are the ones of this process plus the programs that finished during it, 
+	its peak memory the largest of this process (so far) and of those programs.
+	'''
+	if not openStages:
+		return
+	name, start, ownStart, childrenStart, ioStart = openStages.pop()
+	ownEnd = resource.getrusage(resource.RUSAGE_SELF)
+	childrenEnd = resource.getrusage(resource.RUSAGE_CHILDREN)
+	ioEnd = ownIO(childrenEnd)
+	with recordsLock:
+		programRss = [record['maxrss_kb'] for record in records if record['kind'] == 'program' and record['stage'] == name]
+	maxRss = max([ownEnd.ru_maxrss] + programRss)
+	addRecord({'kind': 'stage', 'name': name, 'stage': currentStage(), 'start': start - runStart, 'wall': time.time() - start,
+			   'user': (ownEnd.ru_utime - ownStart.ru_utime) + (childrenEnd.ru_utime - childrenStart.ru_utime),
+			   'system': (ownEnd.ru_stime - ownStart.ru_stime) + (childrenEnd.ru_stime - childrenStart.ru_stime),
+			   'maxrss_kb': maxRss,
+			   'read_bytes': ioEnd[0] - ioStart[0], 'written_bytes': ioEnd[1] - ioStart[1],
+			   'exit_code': '', 'command': ''})
+
+def nextStage(name):
+	'''
+	Closes the current top level stage, if any, and starts the next one.
+	'''
+	while openStages:
+		endStage()
+	startStage(name)
+
+class stage():
+	'''
+	For stages inside a function: with profiling.stage('name'): ...
+	'''
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		startStage(self.name)
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		endStage()
+		return False
+
+def writeReport(pathOfFinalResults, processName):
+	'''
+	Closes the open stages and writes every record, plus the totals of the run, to <processName>_profile.json and 
+	<processName>_profile.tsv inside pathOfFinalResults.
+	'''
+	while openStages:
+		endStage()
+	own = resource.getrusage(resource.RUSAGE_SELF)
+	children = resource.getrusage(resource.RUSAGE_CHILDREN)
+	with recordsLock:
+		listOfRecords = list(records)
+	programRss = [record['maxrss_kb'] for record in listOfRecords if record['kind'] == 'program']
+	totalIO = ownIO(children)
+	listOfRecords.append({'kind': 'total', 'name': processName, 'stage': '', 'start': 0.0, 'wall': time.time() - runStart,
+						  'user': own.ru_utime + children.ru_utime, 'system': own.ru_stime + children.ru_stime,
+						  'maxrss_kb': max([own.ru_maxrss] + programRss),
+						  'read_bytes': totalIO[0], 'written_bytes': totalIO[1],
+						  'exit_code': '', 'command': ''})
+
+	if not os.path.exists(pathOfFinalResults): os.makedirs(pathOfFinalResults)
+	reportFile = os.path.join(pathOfFinalResults, processName + '_profile')
+	with open(reportFile + '.json', 'w') as jsonFile:
+		json.dump(listOfRecords, jsonFile, indent=1, sort_keys=True)
+	with open(reportFile + '.tsv', 'w') as tsvFile:
+		tsvFile.write('\t'.join(reportFields) + '\n')
+		for record in listOfRecords:
+			line = []
+			for field in reportFields:
+				if isinstance(record[field], float):
+					line.append('%.3f' % record[field])
+				else:
+					line.append(str(record[field]))
+			tsvFile.write('\t'.join(line) + '\n')
+	return reportFile
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+import string
+import readStreams, kmerSpectrum
+
+'''
+Read baiting before the DeNovo assembly. Only a small part of a whole genome shotgun library comes from the organelle, so 
+the assemblers get a copy of the config file pointing to files with just the reads that share k-mers with the reference 
+(-r) or, without one, with the high copy k-mers of the library, which is where organelle reads stand out.
+Mates are kept or dropped together.
+'''
+
+complementOf = string.maketrans('ACGTacgt', 'TGCAtgca')
+
+def reverseComplement(sequence):
+	return sequence.translate(complementOf)[::-1]
+
+def referenceKmers(refSeqFile, kmerSize):
+	'''
+	Returns the set of k-mers of both strands of every record of the reference, fasta or genbank. The end of each record 
+	is joined to its start, as organelle genomes are circular.
+	'''
+	if refSeqFile.endswith('.fasta') or refSeqFile.endswith('.fa'):
+		referenceFormat = 'fasta'
+	else:
+		referenceFormat = 'genbank'
+
+	baitKmers = set()
+	for record in SeqIO.parse(refSeqFile, referenceFormat, generic_dna):
+		sequence = str(record.seq).upper()
+		sequence += sequence[:kmerSize - 1]
+		for strand in (sequence, reverseComplement(sequence)):
+			for n in xrange(len(strand) - kmerSize + 1):
+				baitKmers.add(strand[n:n + kmerSize])
+	return baitKmers
+
+def highCopyKmers(listOfLibraries, kmerSize, readsToSample = 200000, copyCutOff = 5, sampleFraction = 16):
+	'''
+	Counts the k-mers of the first reads of each file, readsToSample reads in total, and returns the ones seen at least 
+	copyCutOff times, in both strands. At this depth nuclear k-mers are seen about once, unless they are repeats, while 
+	organelle ones are seen many times.
+	Only a sample of the k-mers is counted (see kmerSpectrum.sampleKmerCounts), so reads have to be checked at every 
+	position against this set.
+	'''
+	listOfFiles = []
+	for library in listOfLibraries:
+		for readFiles, recordsPerFragment in library.fragmentFiles():
+			listOfFiles += list(readFiles)
+	kmerCounts = kmerSpectrum.sampleKmerCounts(listOfFiles, kmerSize, readsToSample, sampleFraction)[0]
+
+	baitKmers = set()
+	for kmer in kmerCounts:
+		if kmerCounts[kmer] >= copyCutOff:
+			baitKmers.add(kmer)
+			baitKmers.add(reverseComplement(kmer))
+	return baitKmers
+
+def isBaited(fragment, baitKmers, kmerSize, step):
+	'''
+	True if any read of the fragment (a tuple of records) has a bait k-mer, looking at every step-th position.
+	'''
+	for record in fragment:
+		sequence = record[1].upper()
+		for n in xrange(0, len(sequence) - kmerSize + 1, step):
+			if sequence[n:n + kmerSize] in baitKmers:
+				return True
+	return False
+
+def baitReads(inputFile, refSeqFile = None, kmerSize = 25, outputFolder = 'baited_reads/', outputConfig = 'baited.config'):
+	'''
+	Writes the baited reads of every file of inputFile (a SOAPdenovo config file) to outputFolder and a copy of inputFile 
+	pointing to them, named outputConfig.
+	Returns outputConfig, or inputFile if no read was kept, so the assembly can still run with every read.
+	'''
+	if refSeqFile != None:
+		print 'Collecting %s-mers of the reference to bait reads...' % kmerSize
+		baitKmers = referenceKmers(refSeqFile, kmerSize)
+		step = max(1, kmerSize / 6) #a read sharing kmerSize + step - 1 bases with the reference is always found
+	else:
+		print 'No reference, collecting high copy %s-mers to bait reads...' % kmerSize
+		baitKmers = highCopyKmers(readStreams.readLibraries(inputFile), kmerSize)
+		step = 1 #only a fraction of the high copy k-mers are in baitKmers
+	print '%s k-mers to bait reads with.' % len(baitKmers)
+
+	if len(baitKmers) == 0:
+		print 'Nothing to bait reads with, the DeNovo assembly will use all reads.'
+		return inputFile
+
+	keptFragments, totalFragments = readStreams.filterReads(inputFile, lambda fragment: isBaited(fragment, baitKmers, kmerSize, step),
+															outputFolder, outputConfig)
+	print 'Kept %s of %s reads/pairs after baiting.' % (keptFragments, totalFragments)
+	if keptFragments == 0:
+		print 'No read was baited, the DeNovo assembly will use all reads.'
+		return inputFile
+	return outputConfig
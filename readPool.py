@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import os
+import readStreams
+
+'''
+The read pool used by MIRA mapping and MITObim: every FASTQ read of the SOAPdenovo config file in one file, written in 
+process from the read files (plain, .gz or .bz2), instead of a cat of them.
+Pairs are written one mate after the other.
+'''
+
+def writeReadPool(inputFile, poolFile, removeDuplicates = False):
+	'''
+	Writes the FASTQ reads of every library of inputFile to poolFile, FASTA files are skipped.
+	With removeDuplicates, a read or pair whose sequences were already written is dropped (compared by hash, so memory 
+	grows with the number of distinct reads).
+	Returns a list with (library number, reads or pairs written, duplicates dropped) for each library.
+	'''
+	listOfCounts = []
+	seenFragments = set()
+	with open(poolFile, 'w', readStreams.readBufferSize) as pool:
+		for libraryNumber, library in enumerate(readStreams.readLibraries(inputFile)):
+			writtenFragments = 0
+			droppedFragments = 0
+			for readFiles, recordsPerFragment in library.fragmentFiles():
+				listOfReads = [readStreams.openReads(readFile) for readFile in readFiles]
+				for fragment in readStreams.fragmentsOf(listOfReads, recordsPerFragment):
+					if len(fragment[0]) != 4: #not FASTQ
+						print 'Skipping %s in the read pool, it is not a FASTQ file.' % ', '.join(readFiles)
+						break
+					if removeDuplicates == True:
+						fragmentHash = hash(tuple(record[1] for record in fragment))
+						if fragmentHash in seenFragments:
+							droppedFragments += 1
+							continue
+						seenFragments.add(fragmentHash)
+					for record in fragment:
+						readStreams.writeRecord(pool, record)
+					writtenFragments += 1
+				for reads in listOfReads:
+					reads.close()
+			if writtenFragments > 0:
+				listOfCounts.append((libraryNumber, writtenFragments, droppedFragments))
+
+	if removeDuplicates == True:
+		print 'Read pool: %s reads/pairs, %s duplicates dropped.' % (sum([counts[1] for counts in listOfCounts]),
+																	 sum([counts[2] for counts in listOfCounts]))
+	return listOfCounts
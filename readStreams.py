@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from itertools import izip
+from distutils.spawn import find_executable
+from profiling import Popen
+import bz2, errno, gzip, io, os, random, subprocess, threading
+
+'''
+Reading the SOAPdenovo config file and streaming the reads of the files it lists, one record at a time, so no read file 
+is ever loaded whole.
+'''
+
+readBufferSize = 1 << 20 #1 MB
+
+#programs that decompress with many threads, used instead of the python modules when installed
+parallelDecompressors = {'.gz':['pigz', '-dc'], '.bz2':['pbzip2', '-dc']}
+
+class Library():
+	'''
+	Class to hold a [LIB] block of a SOAPdenovo config file: its lines, as they are, and its read files.
+	readFiles is a list of (key, path), key being q1, q2, f1, f2, q, f or p.
+	'''
+	def __init__(self):
+		self.lines = []
+		self.readFiles = []
+
+	def fragmentFiles(self):
+		'''
+		The read files of the library grouped by fragment, a list of (files, records per fragment in each file):
+		q1/q2 and f1/f2 are read together, one record from each, p files have both mates one after the other and q/f files 
+		have single reads.
+		'''
+		filesOf = dict(self.readFiles)
+		listOfGroups = []
+		for key, path in self.readFiles:
+			if key in ('q1', 'f1') and key[0] + '2' in filesOf:
+				listOfGroups.append(((path, filesOf[key[0] + '2']), 1))
+			elif key in ('q2', 'f2') and key[0] + '1' in filesOf:
+				continue
+			elif key == 'p':
+				listOfGroups.append(((path,), 2))
+			else:
+				listOfGroups.append(((path,), 1))
+		return listOfGroups
+
+def readLibraries(inputFile):
+	'''
+	Returns the list of libraries of a SOAPdenovo config file. Lines before the first [LIB] (max_rd_len...) are kept in a 
+	library of their own, with no read files, so the config can be written back as it was.
+	'''
+	listOfLibraries = [Library()]
+	with open(inputFile, 'r') as soapInputFile:
+		for soapLine in soapInputFile:
+			if '[LIB]' in soapLine:
+				listOfLibraries.append(Library())
+			listOfLibraries[-1].lines.append(soapLine)
+			if soapLine[0] in ('q', 'f', 'p') and '=' in soapLine:
+				key = soapLine.split('=')[0].strip()
+				listOfLibraries[-1].readFiles.append((key, soapLine.replace('\n','').split('=')[-1].strip()))
+	return listOfLibraries
+
+def copyConfig(inputFile, outputConfig, listOfFolders):
+	'''
+	Writes a copy of inputFile, a SOAPdenovo config file, to outputConfig with every relative read path made absolute, so 
+	the copy works from any folder. A relative path is taken from the first folder of listOfFolders where it exists, or 
+	from the first one if it exists nowhere. The copy keeps the modification time of inputFile, which --resume looks at.
+	'''
+	listOfLibraries = readLibraries(inputFile)
+	with open(outputConfig, 'w') as configFile:
+		for library in listOfLibraries:
+			for soapLine in library.lines:
+				if soapLine[0] in ('q', 'f', 'p') and '=' in soapLine:
+					readFile = soapLine.replace('\n','').split('=')[-1].strip()
+					if not os.path.isabs(readFile):
+						foundFiles = [os.path.join(folder, readFile) for folder in listOfFolders 
+									  if os.path.exists(os.path.join(folder, readFile))]
+						readFile = os.path.abspath((foundFiles + [os.path.join(listOfFolders[0], readFile)])[0])
+						soapLine = soapLine.split('=')[0] + '=' + readFile + '\n'
+				configFile.write(soapLine)
+	inputStats = os.stat(inputFile)
+	os.utime(outputConfig, (inputStats.st_atime, inputStats.st_mtime))
+
+def compressionOf(readFile):
+	'''
+	Returns '.gz' or '.bz2' for compressed read files, None for plain ones.
+	'''
+	for extension in ('.gz', '.bz2'):
+		if readFile.endswith(extension):
+			return extension
+	return None
+
+def unreadableFiles(inputFile, readableCompressions = ('.gz',)):
+	'''
+	The read files of inputFile a program reading them by itself can't open: SOAPdenovo, SOAPdenovo-Trans and SPAdes read 
+	gzip, but not bzip2. They read their files more than once, so a NamedPipes can't stand in for them.
+	'''
+	listOfFiles = []
+	for library in readLibraries(inputFile):
+		for key, readFile in library.readFiles:
+			if compressionOf(readFile) not in (None,) + tuple(readableCompressions):
+				listOfFiles.append(readFile)
+	return listOfFiles
+
+class Bz2Stream(io.RawIOBase):
+	'''
+	Decompresses a bzip2 file that may be made of many streams, as the ones written by pbzip2, which bz2.BZ2File stops 
+	reading after the first one.
+	'''
+	def __init__(self, rawFile):
+		self.rawFile = rawFile
+		self.decompressor = bz2.BZ2Decompressor()
+		self.pending = ''
+		self.offset = 0
+
+	def readable(self):
+		return True
+
+	def decompress(self, compressed):
+		output = []
+		while compressed:
+			try:
+				output.append(self.decompressor.decompress(compressed))
+			except EOFError: #the last stream ended right at the end of the previous chunk
+				self.decompressor = bz2.BZ2Decompressor()
+				continue
+			compressed = self.decompressor.unused_data
+			if compressed: #a new stream starts
+				self.decompressor = bz2.BZ2Decompressor()
+		return ''.join(output)
+
+	def readinto(self, buffer):
+		while self.offset == len(self.pending):
+			compressed = self.rawFile.read(readBufferSize)
+			if not compressed:
+				return 0
+			self.pending = self.decompress(compressed)
+			self.offset = 0
+		size = min(len(buffer), len(self.pending) - self.offset)
+		buffer[:size] = self.pending[self.offset:self.offset + size]
+		self.offset += size
+		return size
+
+def decompressedReads(rawFile, readFile):
+	'''
+	Opens a decompressing stream on top of rawFile, the already open file readFile, so the caller can still ask rawFile 
+	how much of the compressed file was read. Plain files are returned as they are.
+	'''
+	compression = compressionOf(readFile)
+	if compression == '.gz':
+		return io.BufferedReader(gzip.GzipFile(fileobj=rawFile, mode='rb'), readBufferSize)
+	elif compression == '.bz2':
+		return io.BufferedReader(Bz2Stream(rawFile), readBufferSize)
+	return rawFile
+
+class PipedReads():
+	'''
+	Reads a compressed file from the output of pigz or pbzip2. Closing it before the end stops the program.
+	'''
+	def __init__(self, command):
+		self.command = command
+		self.process = Popen(command, stdout=subprocess.PIPE, bufsize=readBufferSize)
+		self.reads = self.process.stdout
+
+	def readline(self):
+		return self.reads.readline()
+
+	def read(self, size = -1):
+		return self.reads.read(size)
+
+	def __iter__(self):
+		return iter(self.reads)
+
+	def close(self):
+		stopped = False
+		if self.process.poll() == None:
+			self.process.terminate()
+			stopped = True
+		self.reads.close()
+		self.process.wait()
+		if not stopped and self.process.returncode != 0:
+			raise IOError('%s exited with code %s' % (' '.join(self.command), self.process.returncode))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+def parallelDecompressor(readFile):
+	'''
+	Returns the command decompressing readFile to its output with pigz/pbzip2, or None if it is not compressed or the 
+	program is not installed.
+	'''
+	compression = compressionOf(readFile)
+	if compression == None:
+		return None
+	if find_executable(parallelDecompressors[compression][0]) == None:
+		return None
+	return parallelDecompressors[compression] + [readFile]
+
+def openReads(readFile, parallel = True):
+	'''
+	Opens a read file, plain or compressed with gzip (.gz) or bzip2 (.bz2), with a large buffer.
+	Compressed files are decompressed by pigz/pbzip2 if they are installed and parallel is True, otherwise in this 
+	process.
+	'''
+	if parallel:
+		command = parallelDecompressor(readFile)
+		if command != None:
+			return PipedReads(command)
+	return decompressedReads(open(readFile, 'rb', readBufferSize), readFile)
+
+class NamedPipes():
+	'''
+	Named pipes in folder giving the decompressed reads of compressed files to programs that can only read plain files, 
+	instead of a decompressed copy of them. Each pipe is served by a thread that decompresses the file once, so it can 
+	only be read once, which is how MIRA loads its reads.
+	Call close() once the programs are done.
+	'''
+	def __init__(self, folder):
+		self.folder = folder
+		self.listOfPipes = []
+		self.closing = False
+
+	def plainPath(self, readFile):
+		'''
+		Returns readFile if it is not compressed, or the path of a named pipe giving its decompressed reads.
+		'''
+		if compressionOf(readFile) == None:
+			return readFile
+		if not os.path.exists(self.folder): os.makedirs(self.folder)
+		pipePath = os.path.abspath(os.path.join(self.folder, str(len(self.listOfPipes)) + '_' + plainName(readFile)))
+		if os.path.exists(pipePath): os.remove(pipePath)
+		os.mkfifo(pipePath)
+		self.listOfPipes.append(pipePath)
+		serving = threading.Thread(target=self.serve, args=(readFile, pipePath))
+		serving.daemon = True
+		serving.start()
+		return pipePath
+
+	def serve(self, readFile, pipePath):
+		try:
+			pipe = os.fdopen(os.open(pipePath, os.O_WRONLY), 'wb', 0) #blocks until the program opens the pipe
+		except OSError: #removed by close()
+			return
+		try:
+			if self.closing: #opened by close(), the program never read it
+				return
+			with openReads(readFile) as reads:
+				block = reads.read(readBufferSize)
+				while block:
+					pipe.write(block)
+					block = reads.read(readBufferSize)
+		except IOError as error:
+			if error.errno != errno.EPIPE: #EPIPE: the program closed the pipe before the end
+				raise
+		finally:
+			pipe.close()
+
+	def close(self):
+		self.closing = True
+		for pipePath in self.listOfPipes:
+			unblock = os.open(pipePath, os.O_RDONLY | os.O_NONBLOCK) #lets a thread waiting for a reader go on and stop
+			os.close(unblock)
+			os.remove(pipePath)
+		self.listOfPipes = []
+		if os.path.isdir(self.folder) and len(os.listdir(self.folder)) == 0:
+			os.rmdir(self.folder)
+
+def plainName(readFile):
+	'''
+	File name of a read file without its folder and without .gz/.bz2, for the uncompressed copies written from it.
+	'''
+	fileName = os.path.basename(readFile)
+	compression = compressionOf(fileName)
+	if compression != None:
+		return fileName[:-len(compression)]
+	return fileName
+
+def readRecords(reads):
+	'''
+	Generator of the records of an open fasta or fastq file, each one a tuple with its lines (without the line breaks): 
+	(header, sequence) for fasta, with the sequence joined if it spans more than one line, or (header, sequence, +, quality) 
+	for fastq.
+	'''
+	firstLine = reads.readline()
+	if firstLine.startswith('@'): #fastq, always 4 lines
+		header = firstLine
+		while header:
+			sequence = reads.readline()
+			plus = reads.readline()
+			quality = reads.readline()
+			yield (header.rstrip('\r\n'), sequence.rstrip('\r\n'), plus.rstrip('\r\n'), quality.rstrip('\r\n'))
+			header = reads.readline()
+			while header in ('\n', '\r\n'): #blank lines at the end
+				header = reads.readline()
+	elif firstLine.startswith('>'): #fasta, sequences can span more than one line
+		header = firstLine.rstrip('\r\n')
+		sequence = []
+		for line in reads:
+			if line.startswith('>'):
+				yield (header, ''.join(sequence))
+				header = line.rstrip('\r\n')
+				sequence = []
+			else:
+				sequence.append(line.strip())
+		yield (header, ''.join(sequence))
+
+def writeRecord(output, record):
+	output.write('\n'.join(record) + '\n')
+
+def fragmentsOf(listOfReads, recordsPerFragment):
+	'''
+	Generator of the fragments read from a group of open files, as tuples of records: one record of each file for q1/q2, 
+	two consecutive records for p files.
+	'''
+	listOfStreams = [readRecords(reads) for reads in listOfReads]
+	if recordsPerFragment == 2:
+		listOfStreams = [listOfStreams[0], listOfStreams[0]]
+	for fragment in izip(*listOfStreams):
+		yield fragment
+
+def filterReads(inputFile, keepFragment, outputFolder, outputConfig):
+	'''
+	Streams every fragment (a read or a pair) of the files of inputFile, a SOAPdenovo config file, and writes the ones for 
+	which keepFragment(fragment) is True to files in outputFolder, mates kept together. outputConfig is written as a copy of 
+	inputFile pointing to those files.
+	Returns a tuple with (fragments kept, fragments read).
+	'''
+	listOfLibraries = readLibraries(inputFile)
+	if not os.path.exists(outputFolder): os.makedirs(outputFolder)
+	totalFragments = 0
+	keptFragments = 0
+	for libraryNumber, library in enumerate(listOfLibraries):
+		newFileOf = {}
+		for readFiles, recordsPerFragment in library.fragmentFiles():
+			for readFile in readFiles:
+				newFileOf[readFile] = os.path.abspath(os.path.join(outputFolder, 'lib' + str(libraryNumber) + '_'
+												  + plainName(readFile)))
+			listOfReads = [openReads(readFile) for readFile in readFiles]
+			listOfOutputs = [open(newFileOf[readFile], 'w') for readFile in readFiles]
+			for fragment in fragmentsOf(listOfReads, recordsPerFragment):
+				totalFragments += 1
+				if keepFragment(fragment):
+					keptFragments += 1
+					if recordsPerFragment == 2:
+						writeRecord(listOfOutputs[0], fragment[0])
+						writeRecord(listOfOutputs[0], fragment[1])
+					else:
+						for n in xrange(len(fragment)):
+							writeRecord(listOfOutputs[n], fragment[n])
+			for openFile in listOfReads + listOfOutputs:
+				openFile.close()
+
+		#the library lines, pointing to the new files
+		newLines = []
+		for soapLine in library.lines:
+			if soapLine[0] in ('q', 'f', 'p') and '=' in soapLine:
+				readFile = soapLine.replace('\n','').split('=')[-1].strip()
+				soapLine = soapLine.split('=')[0] + '=' + newFileOf[readFile] + '\n'
+			newLines.append(soapLine)
+		library.lines = newLines
+
+	with open(outputConfig, 'w') as configFile:
+		for library in listOfLibraries:
+			configFile.writelines(library.lines)
+	return (keptFragments, totalFragments)
+
+def subsampleReads(inputFile, fraction, outputFolder, outputConfig, seed = 11):
+	'''
+	Keeps each fragment of inputFile with a chance of fraction, see filterReads. The seed is fixed, so the same reads are 
+	kept every time.
+	'''
+	randomNumbers = random.Random(seed)
+	return filterReads(inputFile, lambda fragment: randomNumbers.random() < fraction, outputFolder, outputConfig)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+from profiling import Popen
+import shlex, sys, os, shutil, hashlib, tempfile
+import cPickle as pickle
+
+'''
+On disk cache of the features geneChecker looks for in a genbank reference.
+Each entry is a folder named after the sha1 of the reference file and the organismType, holding the CDS translations
+(cds.fasta, already formatted for blast), the rRNAs and tRNAs (rna.fasta) and the features themselves (features.pickle).
+'''
+
+class ReferenceFeatures():
+	'''
+	Class to hold a cache entry.
+	cdsFeatures has only the CDSs, allFeatures has the CDSs plus rRNAs and tRNAs, named just like geneCheck always did.
+	'''
+	def __init__(self, pathToEntry, cdsFeatures, allFeatures):
+		self.pathToEntry = pathToEntry
+		self.cdsFasta = os.path.join(pathToEntry, 'cds.fasta')
+		self.rnaFasta = os.path.join(pathToEntry, 'rna.fasta')
+		self.cdsFeatures = cdsFeatures
+		self.allFeatures = allFeatures
+
+def cacheFolder():
+	'''
+	Returns the cache folder set by cachefolder in the config file, or references/cache/ if there isn't one.
+	'''
+	module_dir = os.path.dirname(__file__)
+	module_dir = os.path.abspath(module_dir)
+	cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+	pathToCache = 'default'
+
+	with open(cfg_full_path,'r') as configFile:
+		for line in configFile:
+			if '#' != line[0] and line != '\n':
+				configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+				if configPart == 'cachefolder':
+					pathToCache = line.replace('\n','').replace(' ','').split('=')[-1]
+
+	if pathToCache.lower() == 'default':
+		pathToCache = os.path.join(module_dir, 'references/cache/')
+	return os.path.abspath(pathToCache)
+
+def referenceKey(genBankReference, organismType, blastFolder):
+	'''
+	Name of the cache entry of a reference. Legacy blast databases are different from blast+ ones, so they get their own entry.
+	'''
+	referenceHash = hashlib.sha1()
+	with open(genBankReference, 'rb') as referenceFile:
+		for chunk in iter(lambda: referenceFile.read(1 << 20), ''):
+			referenceHash.update(chunk)
+	key = referenceHash.hexdigest() + '_' + str(organismType)
+	if blastFolder == 'installed':
+		key += '_legacy'
+	return key
+
+def buildReference(genBankReference, organismType, blastFolder, pathToEntry):
+	'''
+	Extracts the features of the reference into pathToEntry and formats the CDS translations for blastx.
+	'''
+	record = SeqIO.read(genBankReference, "genbank", generic_dna)
+	listOfImportantFeatures = {}
+
+	#let's create the fasta file and the list of features we are looking for
+	with open(os.path.join(pathToEntry, 'cds.fasta'), 'w') as importantFeaturesFile:
+		for feature in record.features:
+			if feature.type.lower() == 'cds':
+				if 'gene' in feature.qualifiers:
+					featureName = feature.qualifiers['gene'][0]
+				elif 'product' in feature.qualifiers:
+					featureName = feature.qualifiers['product'][0]
+				featureName = ''.join(featureName.split())
+				if featureName in listOfImportantFeatures:
+					featureName += '_' + str(listOfImportantFeatures.keys().count(featureName) + 1)
+					
+				importantFeaturesFile.write('>' + featureName + '\n')
+				if 'translation' in feature.qualifiers:
+					importantFeaturesFile.write(str(feature.qualifiers['translation'][0]) + '\n')
+				else:
+					importantFeaturesFile.write(str(feature.extract(record).seq.translate(table=organismType,to_stop=True))+'\n')
+					print '		WARNING: reference did not give a CDS translation for %s. Creating our own from refSeq.' \
+						% featureName
+				listOfImportantFeatures[featureName] = feature
+	cdsFeatures = dict(listOfImportantFeatures)
+
+	#same for rRNAs and tRNAs
+	with open(os.path.join(pathToEntry, 'rna.fasta'), 'w') as importantFeaturesFile:
+		for feature in record.features:
+			if feature.type == 'rRNA' or feature.type == 'tRNA':
+				if 'gene' in feature.qualifiers:
+					featureName = feature.qualifiers['gene'][0]
+					featureName = ''.join(featureName.split())
+				elif 'product' in feature.qualifiers:
+					featureName = feature.qualifiers['product'][0]
+					featureName = ''.join(featureName.split())
+				if featureName in listOfImportantFeatures:
+					featureName += str(listOfImportantFeatures.keys().count(featureName) + 1)
+				importantFeaturesFile.write('>' + featureName + '\n')
+				importantFeaturesFile.write(str(feature.extract(record).seq) + '\n')
+				listOfImportantFeatures[featureName] = feature
+
+	with open(os.path.join(pathToEntry, 'features.pickle'), 'wb') as featuresFile:
+		pickle.dump((cdsFeatures, listOfImportantFeatures), featuresFile, 2)
+
+	print "Formatting database for blast..."
+	if blastFolder == 'installed':
+		command = "formatdb -i " + os.path.join(pathToEntry, 'cds.fasta') + " -p T" #need to formatdb refseq first
+	else:
+		command = blastFolder + "/bin/makeblastdb -in " + os.path.join(pathToEntry, 'cds.fasta') + " -dbtype prot" #need to formatdb refseq first
+
+	args = shlex.split(command)
+	formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
+	formatDB.wait()
+	return formatDB.returncode == 0
+
+def loadReference(genBankReference, organismType, blastFolder):
+	'''
+	Returns the ReferenceFeatures of a genbank reference, building its cache entry first if needed.
+	'''
+	pathToCache = cacheFolder()
+	pathToEntry = os.path.join(pathToCache, referenceKey(genBankReference, organismType, blastFolder))
+
+	if not os.path.exists(os.path.join(pathToEntry, 'features.pickle')):
+		print 'Building reference cache for %s (organismType=%s)...' % (os.path.basename(genBankReference), organismType)
+		if not os.path.exists(pathToCache): 
+			try:
+				os.makedirs(pathToCache)
+			except OSError: #another job just created it
+				pass
+		#build it in a tmp folder and move it in place only when it's done, so jobs sharing the cache never see half an entry
+		pathToBuild = tempfile.mkdtemp(prefix='building_', dir=pathToCache)
+		if buildReference(genBankReference, organismType, blastFolder, pathToBuild) == False:
+			shutil.rmtree(pathToBuild, ignore_errors=True)
+			raise RuntimeError('Could not format the blast database of the reference cache for %s' % genBankReference)
+		try:
+			os.rename(pathToBuild, pathToEntry)
+		except OSError: #someone else built it first, use theirs
+			shutil.rmtree(pathToBuild, ignore_errors=True)
+
+	with open(os.path.join(pathToEntry, 'features.pickle'), 'rb') as featuresFile:
+		cdsFeatures, allFeatures = pickle.load(featuresFile)
+	return ReferenceFeatures(pathToEntry, cdsFeatures, allFeatures)
+
+def loadNucleotideDatabase(referenceFile, reference, blastFolder):
+	'''
+	Returns the path of the fasta of a reference (an indexed referenceLibrary Reference), formatted as a nucleotide blast
+	database. Like the feature entries, it is built in a tmp folder of the cache and moved in place when done, so nothing 
+	is written next to the reference itself and concurrent jobs never format the same files at the same time.
+	'''
+	pathToCache = cacheFolder()
+	pathToEntry = os.path.join(pathToCache, referenceKey(referenceFile, 'nucleotide', blastFolder))
+	fastaFile = os.path.join(pathToEntry, 'reference.fasta')
+
+	if not os.path.exists(pathToEntry):
+		if not os.path.exists(pathToCache): 
+			try:
+				os.makedirs(pathToCache)
+			except OSError: #another job just created it
+				pass
+		pathToBuild = tempfile.mkdtemp(prefix='building_', dir=pathToCache)
+		reference.writeFasta(os.path.join(pathToBuild, 'reference.fasta'))
+		if blastFolder == 'installed':
+			command = "formatdb -i " + os.path.join(pathToBuild, 'reference.fasta') + " -p F"
+		else:
+			command = blastFolder + "/bin/makeblastdb -in " + os.path.join(pathToBuild, 'reference.fasta') + " -dbtype nucl"
+
+		args = shlex.split(command)
+		formatDB = Popen(args, stdout=open(os.devnull, 'wb'))
+		formatDB.wait()
+		if formatDB.returncode != 0:
+			shutil.rmtree(pathToBuild, ignore_errors=True)
+			raise RuntimeError('Could not format the blast database of %s' % referenceFile)
+		try:
+			os.rename(pathToBuild, pathToEntry)
+		except OSError: #someone else built it first, use theirs
+			shutil.rmtree(pathToBuild, ignore_errors=True)
+
+	return fastaFile
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and (sys.argv[1] == '-h' or sys.argv[1] == '--help'):
+		print 'Usage: [genbank_reference organism_type(integer)]'
+		print 'Without arguments, builds the cache for every default reference of the reference library (references/library.tsv).'
+	else:
+		module_dir = os.path.dirname(__file__)
+		module_dir = os.path.abspath(module_dir)
+		cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+
+		with open(cfg_full_path,'r') as configFile:
+			for line in configFile:
+				if '#' != line[0] and line != '\n':
+					configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+					if configPart == 'blastfolder':
+						blastFolder = line.replace('\n','').replace(' ','').split('=')[-1]
+
+		#if config file has 'default' in the folder field, use the default program folders given with the script
+		if blastFolder.lower() == 'default':
+			blastFolder = os.path.join(module_dir, 'blast/')
+
+		if len(sys.argv) > 2:
+			referencesToBuild = {sys.argv[1]: [int(sys.argv[2])]}
+		else:
+			import referenceLibrary
+			referencesToBuild = {}
+			for reference in referenceLibrary.loadLibrary().references:
+				if reference.isDefault:
+					#references for any organismType (*) are built for the vertebrate one, the default -o
+					referencesToBuild[reference.path] = [int(organismType) for organismType in reference.organismTypes
+														 if organismType != '*'] or [2]
+
+		for genBankReference in sorted(referencesToBuild):
+			for organismType in referencesToBuild[genBankReference]:
+				reference = loadReference(genBankReference, organismType, blastFolder)
+				print '%s (organismType=%s): %s' % (os.path.basename(genBankReference), organismType, reference.pathToEntry)
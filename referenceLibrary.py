@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+from Bio.Seq import UnknownSeq
+import sys, os, mmap, struct, hashlib, heapq, math, string, tempfile
+import cPickle as pickle
+import referenceCache, readStreams
+
+'''
+Compiled library of the references in references/library.tsv (and in the user registry set by userreferences in the 
+config file), so picking and reading a reference does not mean parsing a genbank file every time.
+Every reference is stored in one binary index file in the cache folder (see referenceCache.cacheFolder), which is 
+opened with mmap: the sequence and a MinHash sketch of the k-mers of each reference are only read when asked for.
+The features geneChecker needs are cached by referenceCache. The index is rebuilt when a registry or a reference file changes.
+New references are added with a line in a registry file, no code changes needed.
+'''
+
+indexMagic = 'MITOLIB3'
+headerFormat = '<8sQQ' #magic, offset and size of the table of contents
+sketchKmerSize = 21
+sketchSize = 1000
+
+complementOf = string.maketrans('ACGTacgt', 'TGCAtgca')
+
+loadedLibraries = {} #path of the index -> ReferenceLibrary, so each process maps it only once
+
+def kmerHashes(sequence, kmerSize = sketchKmerSize):
+	'''
+	Generator of (64 bit hash, k-mer) of the canonical k-mers (the smallest of a k-mer and its reverse complement) of a 
+	sequence, skipping k-mers with anything but ACGT. The hash does not depend on the platform, as sketches are stored.
+	'''
+	sequence = sequence.upper()
+	reverseSequence = sequence.translate(complementOf)[::-1]
+	sequenceSize = len(sequence)
+	for n in xrange(sequenceSize - kmerSize + 1):
+		kmer = min(sequence[n:n + kmerSize], reverseSequence[sequenceSize - n - kmerSize:sequenceSize - n])
+		if kmer.strip('ACGT') == '':
+			yield (struct.unpack('<Q', hashlib.md5(kmer).digest()[:8])[0], kmer)
+
+def sketchSequences(listOfSequences, kmerSize = sketchKmerSize, size = sketchSize, withKmers = False):
+	'''
+	MinHash sketch of the k-mers of all the sequences: a sorted list of the size smallest distinct hashes.
+	With withKmers, returns a tuple with the sketch and the list of the k-mers of its hashes, in the same order.
+	'''
+	kmerOf = {}
+	for sequence in listOfSequences:
+		for kmerHash, kmer in kmerHashes(sequence, kmerSize):
+			kmerOf[kmerHash] = kmer
+	sketch = heapq.nsmallest(size, kmerOf)
+	if withKmers == True:
+		return (sketch, [kmerOf[kmerHash] for kmerHash in sketch])
+	return sketch
+
+def packSketch(sketch):
+	return struct.pack('<%sQ' % len(sketch), *sketch)
+
+def unpackSketch(packedSketch):
+	return list(struct.unpack('<%sQ' % (len(packedSketch) / 8), packedSketch))
+
+def sketchDistance(sketchA, sketchB, kmerSize = sketchKmerSize, size = sketchSize):
+	'''
+	Mash distance between two sketches, estimated from the share of the smallest hashes of both that is in both.
+	Goes from 0 (same k-mers) to 1 (no k-mer in common).
+	'''
+	unionSketch = heapq.nsmallest(size, set(sketchA) | set(sketchB))
+	if len(unionSketch) == 0:
+		return 1.0
+	inA = set(sketchA)
+	inB = set(sketchB)
+	shared = sum(1 for kmerHash in unionSketch if kmerHash in inA and kmerHash in inB)
+	if shared == 0:
+		return 1.0
+	jaccard = float(shared) / len(unionSketch)
+	return max(0.0, min(1.0, -math.log(2 * jaccard / (1 + jaccard)) / kmerSize))
+
+def sketchContainment(listOfReferences, inputFile, readsToSample = 100000, minimumCopies = 2):
+	'''
+	Looks for the k-mers of the sketches of listOfReferences in the first reads of the files of inputFile (a SOAPdenovo 
+	config file), readsToSample reads in total.
+	Returns a list of (containment, Reference) sorted from the reference with the most sketch k-mers seen at least 
+	minimumCopies times in the reads (the containment, from 0 to 1) to the one with the least. Reads are mostly not from 
+	the target DNA, so this is used instead of the distance between sketches.
+	'''
+	canonicalOf = {} #both strands of every sketch k-mer -> the canonical one
+	for reference in listOfReferences:
+		for kmer in reference.sketchKmers():
+			canonicalOf[kmer] = kmer
+			canonicalOf[kmer.translate(complementOf)[::-1]] = kmer
+	kmerSize = max([len(kmer) for kmer in canonicalOf] or [sketchKmerSize])
+
+	listOfFiles = []
+	for library in readStreams.readLibraries(inputFile):
+		for readFiles, recordsPerFragment in library.fragmentFiles():
+			listOfFiles += list(readFiles)
+	readsPerFile = max(1, readsToSample / max(1, len(listOfFiles)))
+
+	kmerCounts = {}
+	for readFile in listOfFiles:
+		with readStreams.openReads(readFile) as reads:
+			for readNumber, record in enumerate(readStreams.readRecords(reads)):
+				if readNumber >= readsPerFile:
+					break
+				sequence = record[1].upper()
+				for n in xrange(len(sequence) - kmerSize + 1):
+					kmer = canonicalOf.get(sequence[n:n + kmerSize])
+					if kmer != None:
+						kmerCounts[kmer] = kmerCounts.get(kmer, 0) + 1
+
+	listOfContainments = []
+	for reference in listOfReferences:
+		sketchKmers = reference.sketchKmers()
+		if len(sketchKmers) == 0:
+			continue
+		seenKmers = sum(1 for kmer in sketchKmers if kmerCounts.get(kmer, 0) >= minimumCopies)
+		listOfContainments.append((float(seenKmers) / len(sketchKmers), reference))
+	listOfContainments.sort(key=lambda containmentOf: -containmentOf[0])
+	return listOfContainments
+
+def compileReference(referenceFile, organismTypes = ['*'], genome = 'mitochondrion', isDefault = False, description = ''):
+	'''
+	Reads a genbank or fasta reference and returns its index entry (a dict) and its blobs (a dict of strings) to be 
+	written by writeIndex.
+	'''
+	if referenceFile.endswith('.fasta') or referenceFile.endswith('.fa'):
+		record = SeqIO.read(referenceFile, "fasta", generic_dna)
+	else:
+		record = SeqIO.read(referenceFile, "genbank", generic_dna)
+	if isinstance(record.seq, UnknownSeq): #CON records only have the features
+		sequence = ''
+	else:
+		sequence = str(record.seq).upper()
+
+	sketch, sketchKmers = sketchSequences([sequence], withKmers=True)
+	entry = {'name': os.path.basename(referenceFile), 'path': os.path.abspath(referenceFile), 'organismTypes': organismTypes,
+			 'genome': genome, 'isDefault': isDefault, 'description': description, 'length': len(record.seq),
+			 'organism': record.annotations.get('organism', record.description), 'recordId': record.id}
+	blobs = {'sequence': sequence, 'sketch': packSketch(sketch), 'sketchKmers': ''.join(sketchKmers)}
+	return (entry, blobs)
+
+def writeIndex(listOfCompiled, sources, pathToIndex):
+	'''
+	Writes the index file from (entry, blobs) tuples. sources has the (size, mtime) of every file it was built from, to 
+	know when it has to be rebuilt. It is written to a tmp file and moved in place, so jobs sharing it never see half 
+	an index.
+	'''
+	pathToFolder = os.path.dirname(pathToIndex)
+	if not os.path.exists(pathToFolder):
+		try:
+			os.makedirs(pathToFolder)
+		except OSError: #another job just created it
+			pass
+	tmpHandle, tmpPath = tempfile.mkstemp(prefix='building_', dir=pathToFolder)
+	with os.fdopen(tmpHandle, 'wb') as indexFile:
+		indexFile.write(struct.pack(headerFormat, indexMagic, 0, 0))
+		listOfEntries = []
+		for entry, blobs in listOfCompiled:
+			entry = dict(entry)
+			for blobName in ('sequence', 'sketch', 'sketchKmers'):
+				entry[blobName] = (indexFile.tell(), len(blobs[blobName]))
+				indexFile.write(blobs[blobName])
+			listOfEntries.append(entry)
+		contents = pickle.dumps({'references': listOfEntries, 'sources': sources, 'kmerSize': sketchKmerSize,
+								 'sketchSize': sketchSize}, 2)
+		contentsOffset = indexFile.tell()
+		indexFile.write(contents)
+		indexFile.seek(0)
+		indexFile.write(struct.pack(headerFormat, indexMagic, contentsOffset, len(contents)))
+	os.rename(tmpPath, pathToIndex)
+
+class Reference():
+	'''
+	One reference of a ReferenceLibrary. The sequence and sketch stay in the mapped index until asked for.
+	'''
+	def __init__(self, library, entry):
+		self.library = library
+		self.entry = entry
+		self.name = entry['name']
+		self.path = entry['path']
+		self.organismTypes = entry['organismTypes']
+		self.genome = entry['genome']
+		self.isDefault = entry['isDefault']
+		self.description = entry['description']
+		self.length = entry['length']
+		self.organism = entry['organism']
+		self.recordId = entry['recordId']
+		self.sketchCache = None
+
+	def usedWith(self, organismType):
+		return '*' in self.organismTypes or str(organismType) in self.organismTypes
+
+	def sequence(self):
+		return self.library.blob(self.entry['sequence'])
+
+	def sketch(self):
+		if self.sketchCache == None:
+			self.sketchCache = unpackSketch(self.library.blob(self.entry['sketch']))
+		return self.sketchCache
+
+	def sketchKmers(self):
+		'''
+		The k-mers of the hashes of the sketch, in the same order.
+		'''
+		packedKmers = self.library.blob(self.entry['sketchKmers'])
+		return [packedKmers[n:n + self.library.kmerSize] for n in xrange(0, len(packedKmers), self.library.kmerSize)]
+
+	def writeFasta(self, fastaFile):
+		with open(fastaFile, 'w') as outputFile:
+			outputFile.write('>' + self.recordId + '\n')
+			sequence = self.sequence()
+			for n in xrange(0, len(sequence), 70):
+				outputFile.write(sequence[n:n + 70] + '\n')
+
+class ReferenceLibrary():
+	'''
+	Index file opened with mmap, see the module docstring.
+	'''
+	def __init__(self, pathToIndex):
+		self.pathToIndex = pathToIndex
+		with open(pathToIndex, 'rb') as indexFile:
+			self.data = mmap.mmap(indexFile.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, contentsOffset, contentsSize = struct.unpack_from(headerFormat, self.data)
+		if magic != indexMagic or contentsOffset == 0:
+			raise ValueError('%s is not a reference library index' % pathToIndex)
+		contents = pickle.loads(self.data[contentsOffset:contentsOffset + contentsSize])
+		self.sources = contents['sources']
+		self.kmerSize = contents['kmerSize']
+		self.sketchSize = contents['sketchSize']
+		self.references = [Reference(self, entry) for entry in contents['references']]
+		self.referenceByName = dict((reference.name, reference) for reference in self.references)
+
+	def blob(self, position):
+		offset, size = position
+		return self.data[offset:offset + size]
+
+	def reference(self, name):
+		return self.referenceByName.get(name)
+
+	def defaultReference(self, organismType, buildCloroplast = False, buildBacteria = False, buildArchea = False):
+		'''
+		The reference used for the gene checks when the user did not give a genbank one, or None if the registries have 
+		none for organismType. The cloroplast reference is used for any organismType, bacteria and archea ones only with 
+		the ones they are registered with, falling back to the mitochondrion ones. A reference registered for organismType 
+		wins over one registered for any (*).
+		'''
+		if buildCloroplast == True:
+			listOfGenomes = ['cloroplast']
+		elif buildBacteria == True:
+			listOfGenomes = ['bacteria', 'mitochondrion']
+		elif buildArchea == True:
+			listOfGenomes = ['archea', 'mitochondrion']
+		else:
+			listOfGenomes = ['mitochondrion']
+
+		for genome in listOfGenomes:
+			listOfDefaults = [reference for reference in self.references if reference.isDefault and reference.genome == genome]
+			if genome == 'cloroplast' and len(listOfDefaults) > 0:
+				return listOfDefaults[0]
+			for reference in listOfDefaults:
+				if str(organismType) in reference.organismTypes:
+					return reference
+			for reference in listOfDefaults:
+				if '*' in reference.organismTypes:
+					return reference
+		return None
+
+	def closestReferences(self, sketch, organismType = None, genome = None):
+		'''
+		Returns a list of (distance, Reference) sorted from the closest reference to sketch, made with sketchSequences, 
+		to the farthest. organismType and genome leave out references registered for others.
+		'''
+		listOfDistances = []
+		for reference in self.references:
+			if organismType != None and not reference.usedWith(organismType):
+				continue
+			if genome != None and reference.genome != genome:
+				continue
+			if len(reference.sketch()) == 0: #no sequence to compare to
+				continue
+			listOfDistances.append((sketchDistance(sketch, reference.sketch(), self.kmerSize, self.sketchSize), reference))
+		listOfDistances.sort(key=lambda distanceOf: distanceOf[0])
+		return listOfDistances
+
+	def chooseReference(self, organismType, buildCloroplast = False, buildBacteria = False, buildArchea = False, inputFile = None,
+						draftFile = None, minimumContainment = 0.05, maximumDistance = 0.2):
+		'''
+		Picks the reference closest to the target DNA among the ones registered for organismType and the genome being 
+		built: by sketch distance to draftFile (fasta or genbank of a draft assembly) if there is one, otherwise by 
+		containment in a sample of the reads of inputFile (see sketchContainment).
+		Returns a tuple with (Reference, a line describing how close it is), or None if none is close enough.
+		'''
+		if buildCloroplast == True:
+			genome = 'cloroplast'
+		elif buildBacteria == True:
+			genome = 'bacteria'
+		elif buildArchea == True:
+			genome = 'archea'
+		else:
+			genome = 'mitochondrion'
+
+		if draftFile != None:
+			if draftFile.endswith('.fasta') or draftFile.endswith('.fa'):
+				draftFormat = 'fasta'
+			else:
+				draftFormat = 'genbank'
+			draftSketch = sketchSequences([str(record.seq) for record in SeqIO.parse(draftFile, draftFormat, generic_dna)],
+										  self.kmerSize, self.sketchSize)
+			listOfDistances = self.closestReferences(draftSketch, organismType, genome)
+			if len(listOfDistances) > 0 and listOfDistances[0][0] <= maximumDistance:
+				distance, reference = listOfDistances[0]
+				return (reference, 'Mash distance %.3f to %s' % (distance, os.path.basename(draftFile)))
+		elif inputFile != None:
+			listOfReferences = [reference for reference in self.references if reference.usedWith(organismType)
+								and reference.genome == genome]
+			listOfContainments = sketchContainment(listOfReferences, inputFile)
+			if len(listOfContainments) > 0 and listOfContainments[0][0] >= minimumContainment:
+				containment, reference = listOfContainments[0]
+				return (reference, '%.1f%% of its sketch k-mers found in the reads' % (containment * 100))
+		return None
+
+	def close(self):
+		self.data.close()
+
+def registryFiles():
+	'''
+	Returns references/library.tsv and the user registry set by userreferences in the config file, if there is one.
+	'''
+	module_dir = os.path.dirname(__file__)
+	module_dir = os.path.abspath(module_dir)
+	cfg_full_path = os.path.join(module_dir, 'generalMaker.config')
+	userRegistry = 'none'
+
+	with open(cfg_full_path,'r') as configFile:
+		for line in configFile:
+			if '#' != line[0] and line != '\n':
+				configPart = line.lower().replace('\n','').replace(' ','').split('=')[0]
+				if configPart == 'userreferences':
+					userRegistry = line.replace('\n','').replace(' ','').split('=')[-1]
+
+	listOfRegistries = [os.path.join(module_dir, 'references/library.tsv')]
+	if userRegistry.lower() != 'none':
+		listOfRegistries.append(os.path.abspath(userRegistry))
+	return listOfRegistries
+
+def readRegistry(pathToRegistry):
+	'''
+	Returns a list of (file, organismTypes, genome, isDefault, description) of a registry, see references/library.tsv.
+	'''
+	listOfRows = []
+	with open(pathToRegistry, 'r') as registryFile:
+		for line in registryFile:
+			if line[0] == '#' or line.strip() == '':
+				continue
+			columns = line.rstrip('\r\n').split('\t')
+			columns += [''] * (5 - len(columns))
+			referenceFile = os.path.join(os.path.dirname(pathToRegistry), columns[0])
+			organismTypes = [organismType.strip() for organismType in columns[1].split(',') if organismType.strip() != '']
+			listOfRows.append((referenceFile, organismTypes or ['*'], columns[2] or 'mitochondrion', columns[3].lower() == 'yes',
+							   columns[4]))
+	return listOfRows
+
+def fileStamp(pathToFile):
+	fileStat = os.stat(pathToFile)
+	return (fileStat.st_size, fileStat.st_mtime)
+
+def isStale(pathToIndex, sources):
+	'''
+	True if the index does not exist or was built from files that changed since.
+	'''
+	if not os.path.exists(pathToIndex):
+		return True
+	with open(pathToIndex, 'rb') as indexFile:
+		magic, contentsOffset, contentsSize = struct.unpack(headerFormat, indexFile.read(struct.calcsize(headerFormat)))
+		if magic != indexMagic:
+			return True
+		indexFile.seek(contentsOffset)
+		builtFrom = pickle.loads(indexFile.read(contentsSize))['sources']
+	return builtFrom != sources
+
+def openIndex(pathToIndex):
+	if pathToIndex not in loadedLibraries:
+		loadedLibraries[pathToIndex] = ReferenceLibrary(pathToIndex)
+	return loadedLibraries[pathToIndex]
+
+def loadLibrary():
+	'''
+	Returns the ReferenceLibrary of the registries, compiling it first if it is missing or out of date.
+	'''
+	pathToIndex = os.path.join(referenceCache.cacheFolder(), 'library.index')
+	if pathToIndex in loadedLibraries:
+		return loadedLibraries[pathToIndex]
+
+	listOfRows = []
+	sources = {}
+	for pathToRegistry in registryFiles():
+		sources[pathToRegistry] = fileStamp(pathToRegistry)
+		listOfRows += readRegistry(pathToRegistry)
+	for row in listOfRows:
+		sources[os.path.abspath(row[0])] = fileStamp(row[0])
+
+	if isStale(pathToIndex, sources):
+		print 'Compiling the reference library...'
+		listOfCompiled = [compileReference(*row) for row in listOfRows]
+		writeIndex(listOfCompiled, sources, pathToIndex)
+	return openIndex(pathToIndex)
+
+def indexedReference(referenceFile):
+	'''
+	Returns the Reference of a genbank or fasta file given by the user (-r), compiled to its own index in the cache 
+	folder the first time it is used.
+	'''
+	referenceFile = os.path.abspath(referenceFile)
+	pathToIndex = os.path.join(referenceCache.cacheFolder(), 'user_' + hashlib.sha1(referenceFile).hexdigest() + '.index')
+	if pathToIndex not in loadedLibraries:
+		sources = {referenceFile: fileStamp(referenceFile)}
+		if isStale(pathToIndex, sources):
+			writeIndex([compileReference(referenceFile)], sources, pathToIndex)
+	return openIndex(pathToIndex).references[0]
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and (sys.argv[1] == '-h' or sys.argv[1] == '--help'):
+		print 'Compiles the reference library, if needed, and lists its references.'
+		print 'References are added to references/library.tsv or to the registry set by userreferences in generalMaker.config.'
+	else:
+		library = loadLibrary()
+		print 'Reference library: %s' % library.pathToIndex
+		for reference in library.references:
+			print '%s\t%s\t%s\t%s\t%s bp\t%s' % (reference.name, ','.join(reference.organismTypes), reference.genome,
+													 'default' if reference.isDefault else '', reference.length, reference.organism)
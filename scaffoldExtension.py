@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from Bio.Seq import reverse_complement
+
+'''
+Extension of the best DeNovo contig with the other contigs that hit the reference (see FirstBuildChecker.checkSoapOutput).
+Contigs are placed by where their first long HSP starts on the reference, the ones inside another one are dropped with a 
+sweep over the hits sorted by start, and the scaffold is written into a buffer allocated once with its final size, so it 
+all stays linear in the number of contigs.
+'''
+
+class ContigHit():
+	'''
+	Where a contig hits the reference: hitStart/hitEnd on the reference, queryStart/queryEnd on the contig (on the 
+	reverse complement of it if reverseComplement is True), all 0-based and end exclusive.
+	'''
+	def __init__(self, contigId, contigLength, hitStart, hitEnd, reverseComplement, queryStart, queryEnd):
+		self.contigId = contigId
+		self.contigLength = contigLength
+		self.hitStart = hitStart
+		self.hitEnd = hitEnd
+		self.reverseComplement = reverseComplement
+		self.queryStart = queryStart
+		self.queryEnd = queryEnd
+
+def collectHits(blastTable, lengthOf, sizeToLook, minimumSpan = 150):
+	'''
+	Returns the ContigHits of the contigs in blastTable (a blastTabular.BlastTable) with at least minimumSpan bases, 
+	placed by their first HSP of at least minimumSpan bases, in the order of the table, until the contigs found add up to 
+	105% of sizeToLook. lengthOf(contigId) gives the length of a contig.
+	When two contigs start at the same place of the reference, only the longest one is kept.
+	'''
+	hitOfStart = {}
+	totalSize = 0
+	for contigId in blastTable.queryIds:
+		contigLength = lengthOf(contigId)
+		if contigLength >= minimumSpan:
+			for hspRow in blastTable.rowsOf(contigId):
+				if blastTable.alnSpan[hspRow] >= minimumSpan:
+					hit = ContigHit(contigId, contigLength, blastTable.hitStart[hspRow], blastTable.hitEnd[hspRow],
+									blastTable.hitFrame[hspRow] == -1, blastTable.queryStart[hspRow], blastTable.queryEnd[hspRow])
+					if hit.hitStart not in hitOfStart or contigLength > hitOfStart[hit.hitStart].contigLength:
+						hitOfStart[hit.hitStart] = hit
+					totalSize += contigLength
+					break
+		if totalSize > sizeToLook * 1.05:
+			break
+	return hitOfStart.values()
+
+def removeContained(listOfHits):
+	'''
+	Returns the hits sorted by their start on the reference, without the ones inside another one. Some contigs hit inside 
+	another one but, due to assembly errors, were bigger and had duplicated regions, and were inserted improperly.
+	As no two hits start at the same place, a hit is inside another one if a hit starting before it ends at or after 
+	its end.
+	'''
+	keptHits = []
+	furthestEnd = None
+	for hit in sorted(listOfHits, key=lambda hit: hit.hitStart):
+		if furthestEnd == None or hit.hitEnd > furthestEnd:
+			keptHits.append(hit)
+			furthestEnd = hit.hitEnd
+	return keptHits
+
+def buildScaffold(listOfHits, sequenceOf, minimumGap = 20):
+	'''
+	Joins the hits, sorted by start and with no hit inside another one (see removeContained), in the order they hit the 
+	reference. sequenceOf(contigId) gives the sequence of a contig as a string.
+	Hits with a gap between them on the reference are joined by as many Ns as the gap (at least minimumGap), overlapping 
+	ones only add what goes past the end of the previous one.
+	Returns the scaffold as a string.
+	'''
+	#first pass: the pieces of the scaffold, as (gap size, contig id, first base, last base + 1) of each hit
+	listOfPieces = []
+	scaffoldSize = 0
+	lastInsertEnding = 0
+	for hit in listOfHits:
+		pieceStart = hit.queryStart
+		pieceEnd = hit.queryEnd
+		gapSize = 0
+		if lastInsertEnding != 0:
+			if hit.hitStart > lastInsertEnding:
+				gapSize = max(minimumGap, hit.hitStart - lastInsertEnding)
+			else: #overlaps the previous one, only what goes past its end
+				pieceStart = max(pieceStart, pieceEnd - (hit.hitEnd - lastInsertEnding))
+		listOfPieces.append((gapSize, hit, pieceStart, pieceEnd))
+		scaffoldSize += gapSize + max(0, pieceEnd - pieceStart)
+		lastInsertEnding = hit.hitEnd
+
+	#second pass: copy them into the buffer
+	scaffold = bytearray(scaffoldSize)
+	position = 0
+	for gapSize, hit, pieceStart, pieceEnd in listOfPieces:
+		if gapSize > 0:
+			scaffold[position:position + gapSize] = 'n' * gapSize
+			position += gapSize
+		sequence = sequenceOf(hit.contigId)
+		if hit.reverseComplement == True:
+			sequence = reverse_complement(sequence)
+		piece = sequence[pieceStart:pieceEnd]
+		scaffold[position:position + len(piece)] = piece
+		position += len(piece)
+	return str(scaffold[:position])
@@ -27,8 +27,8 @@ SOFTWARE.
 
 from Bio import SeqIO
 from Bio.Alphabet import generic_dna, generic_protein
-from subprocess import Popen
-import shlex, sys, os
+from profiling import Popen
+import shlex, sys, os, math, shutil
 
 class Assembly():
 	'''
@@ -121,20 +121,114 @@ class Assembly():
 		def score(self):
 			return self.tRNAscore
 
+def scanWindows(sequenceLength, numberOfWindows, overlap = 500, minimumWindow = 5000):
+	'''
+	Splits a sequence into numberOfWindows windows, or less so that they are at least minimumWindow long. Each one goes 
+	overlap bases into the next, so every tRNA shorter than that is whole in at least one of them.
+	Returns a list of (start, end), 0-based and end exclusive.
+	'''
+	numberOfWindows = max(1, min(numberOfWindows, sequenceLength / minimumWindow))
+	step = int(math.ceil(float(sequenceLength) / numberOfWindows))
+	return [(start, min(sequenceLength, start + step + overlap)) for start in xrange(0, sequenceLength, step)]
+
+def readScanResults(tRNAscanResultFile):
+	'''
+	Returns the columns of each tRNA of a tRNAscan-SE result file.
+	'''
+	listOfRows = []
+	startCheck = False
+	with open(tRNAscanResultFile, 'r') as tRNAscanFile:
+		for line in tRNAscanFile:
+			if line[0] == '-':
+				startCheck = True
+			elif startCheck == True and line.strip() != '':
+				listOfRows.append(line.split())
+	return listOfRows
+
+def mergeWindowResults(listOfWindowResults, sequenceName, outputName):
+	'''
+	Writes a tRNAscan-SE result file for the whole sequence from the results of its windows, a list of (window start, 
+	result file). Coordinates are moved back to the sequence and tRNAs found in two windows are kept once: of the ones 
+	on the same strand overlapping by at least half of the shorter one, the one with the best score, as a tRNA cut by 
+	the end of a window scores less than the whole one in the next window.
+	'''
+	listOfHits = []
+	for windowStart, windowResultFile in listOfWindowResults:
+		for columns in readScanResults(windowResultFile):
+			columns[2] = str(int(columns[2]) + windowStart)
+			columns[3] = str(int(columns[3]) + windowStart)
+			for n in (6, 7): #intron coordinates, 0 if there isn't one
+				if int(columns[n]) > 0:
+					columns[n] = str(int(columns[n]) + windowStart)
+			listOfHits.append(columns)
+
+	keptHits = []
+	for columns in sorted(listOfHits, key=lambda columns: -float(columns[8])):
+		begin, end = sorted((int(columns[2]), int(columns[3])))
+		isForward = int(columns[2]) <= int(columns[3])
+		isRepeated = False
+		for keptColumns in keptHits:
+			keptBegin, keptEnd = sorted((int(keptColumns[2]), int(keptColumns[3])))
+			if (int(keptColumns[2]) <= int(keptColumns[3])) == isForward:
+				overlap = min(end, keptEnd) - max(begin, keptBegin) + 1
+				if overlap * 2 >= min(end - begin, keptEnd - keptBegin) + 1:
+					isRepeated = True
+					break
+		if isRepeated == False:
+			keptHits.append(columns)
+	keptHits.sort(key=lambda columns: min(int(columns[2]), int(columns[3])))
+
+	with open(outputName, 'w') as outputFile:
+		outputFile.write('Sequence\t\ttRNA\tBounds\ttRNA\tAnti\tIntron Bounds\tCove\n')
+		outputFile.write('Name\ttRNA #\tBegin\tEnd\tType\tCodon\tBegin\tEnd\tScore\n')
+		outputFile.write('--------\t------\t----\t------\t----\t-----\t-----\t----\t------\n')
+		for tRNAnumber, columns in enumerate(keptHits):
+			outputFile.write('\t'.join([sequenceName, str(tRNAnumber + 1)] + columns[2:]) + '\n')
+
+def runScans(listOfScans, scanOptions, tRNAscanFolder):
+	'''
+	Runs tRNAscan-SE on every (input fasta, result file, log file) of listOfScans, all at the same time, and waits for them.
+	'''
+	listOfRuns = []
+	for scanInput, outputName, logName in listOfScans:
+		tRNAscanLog = open(logName, 'w')
+		command = "tRNAscan-SE " + scanOptions + "-o " + os.path.abspath(outputName) + " " + os.path.abspath(scanInput)
+		args = shlex.split(command)
+		if tRNAscanFolder.lower() == 'installed':
+			tRNAscanRun = Popen(args, stdout=tRNAscanLog, stderr=tRNAscanLog)
+		else:
+			tRNAscanRun = Popen(args, cwd=tRNAscanFolder, stdout=tRNAscanLog, stderr=tRNAscanLog)
+		listOfRuns.append((tRNAscanRun, tRNAscanLog))
+	for tRNAscanRun, tRNAscanLog in listOfRuns:
+		tRNAscanRun.wait()
+		tRNAscanLog.close()
+
+def tRNAscanOutputs(resultFile, workDir = ''):
+	'''
+	The files tRNAscanCheck leaves in workDir, for parallelTasks.collectScratch.
+	'''
+	return [workDir + 'tRNAscan.log', workDir + resultFile[0:-6] + '.trnascan']
+
 def tRNAscanCheck(resultFile = None, hasCircularized = False, skipTRNA = False, organismType = 2, coveCutOff = 7,
-                  buildBacteria = False, buildArchea = False):
+                  buildBacteria = False, buildArchea = False, workDir = '', threadsToUse = None):
 	'''
 	Use tRNAscan-SE to look for tRNAs and hold it's positions and scores in the tRNA Class.
+	Its log and result files are saved inside workDir, the current folder by default.
+	With trnascanthreads above 1 in the config file, tRNAscan-SE runs on that many overlapping windows of the sequence at 
+	the same time, each one in its own folder, and their results are merged. threadsToUse, the share of -t this check 
+	has, caps the number of windows.
 	'''
 	if skipTRNA == False:
 		module_dir = os.path.dirname(__file__)
 		module_dir = os.path.abspath(module_dir)
 		scanInput = os.path.abspath(resultFile)
 		module_dir = os.path.join(module_dir, "tRNAscan/")
-		outputName = resultFile[0:-6] + ".trnascan"
+		outputName = workDir + resultFile[0:-6] + ".trnascan"
+		if workDir != '' and not os.path.exists(workDir): os.makedirs(workDir)
 
 		cfg_dir = os.path.dirname(__file__)
 		cfg_full_path = os.path.join(cfg_dir, 'generalMaker.config')
+		tRNAscanThreads = 1
 
 		with open(cfg_full_path,'r') as configFile:
 			#grabbing the tRNAscan-SE folder from the config file...
@@ -145,6 +239,8 @@ def tRNAscanCheck(resultFile = None, hasCircularized = False, skipTRNA = False,
 						tRNAscanFolder = line.replace('\n','').replace(' ','').split('=')[-1]
 						if tRNAscanFolder.lower() == 'default':
 							tRNAscanFolder = module_dir
+					elif configPart == 'trnascanthreads':
+						tRNAscanThreads = int(line.replace('\n','').replace(' ','').split('=')[-1])
 
 		#adding the tRNAscan-SE folder to these environments in the OS to avoid errors being thrown by tRNAscan
 		try:
@@ -155,7 +251,6 @@ def tRNAscanCheck(resultFile = None, hasCircularized = False, skipTRNA = False,
 		except:
 			print 'Unable to run tRNAscan-SE! Procceeding without cove analysis...'
 			
-		currentDirectory = os.getcwd() #getting this info, because tRNAscan has to run inside it's own folder to avoid another error...
 
 		if os.path.exists(outputName): #remove result file if it already exists so that tRNAscan doesn't throw another error
 			os.remove(outputName)
@@ -186,19 +281,41 @@ def tRNAscanCheck(resultFile = None, hasCircularized = False, skipTRNA = False,
 		else:
 			geneticCode = ''
 		
+		scanOptions = "-X " + str(coveCutOff) + ' ' + geneticCode + organismFlag
+		if threadsToUse != None:
+			tRNAscanThreads = min(tRNAscanThreads, max(1, threadsToUse))
 		try:
-			with open("tRNAscan.log","w") as tRNAscanLog:
-				if tRNAscanFolder.lower() == 'installed':
-					command = "tRNAscan-SE -X " + str(coveCutOff) + ' ' + geneticCode + organismFlag + "-o "\
-						 + currentDirectory + '/' + outputName + " " + scanInput
-					args = shlex.split(command)
-					tRNAscanRun = Popen(args, stdout=tRNAscanLog, stderr=tRNAscanLog)
-				else:
-					command = "tRNAscan-SE -X " + str(coveCutOff) + ' ' + geneticCode + organismFlag + "-o "\
-						 + currentDirectory + '/' + outputName + " " + scanInput
-					args = shlex.split(command)
-					tRNAscanRun = Popen(args, cwd=tRNAscanFolder, stdout=tRNAscanLog, stderr=tRNAscanLog)
-				tRNAscanRun.wait()
+			listOfWindows = []
+			if tRNAscanThreads > 1:
+				listOfRecords = list(SeqIO.parse(resultFile, 'fasta' if resultFile[-6:] == '.fasta' else 'genbank', generic_dna))
+				if len(listOfRecords) == 1:
+					listOfWindows = scanWindows(len(listOfRecords[0]), tRNAscanThreads)
+
+			if len(listOfWindows) > 1:
+				print 'Running tRNAscan-SE on %s windows of the sequence at the same time...' % len(listOfWindows)
+				windowsFolder = workDir + 'trnascan_windows/'
+				listOfScans = []
+				listOfWindowResults = []
+				for n, (windowStart, windowEnd) in enumerate(listOfWindows):
+					windowFolder = windowsFolder + 'window_' + str(n) + '/'
+					if not os.path.exists(windowFolder): os.makedirs(windowFolder)
+					SeqIO.write(listOfRecords[0][windowStart:windowEnd], windowFolder + 'window.fasta', 'fasta')
+					listOfScans.append((windowFolder + 'window.fasta', windowFolder + 'window.trnascan', windowFolder + 'tRNAscan.log'))
+					listOfWindowResults.append((windowStart, windowFolder + 'window.trnascan'))
+				try:
+					runScans(listOfScans, scanOptions, tRNAscanFolder)
+
+					#one log, one result file, just like a single run
+					with open(workDir + "tRNAscan.log","w") as tRNAscanLog:
+						for n, (windowStart, windowEnd) in enumerate(listOfWindows):
+							tRNAscanLog.write('## window %s: %s-%s\n' % (n, windowStart + 1, windowEnd))
+							with open(listOfScans[n][2], 'r') as windowLog:
+								shutil.copyfileobj(windowLog, tRNAscanLog)
+					mergeWindowResults(listOfWindowResults, listOfRecords[0].id, outputName)
+				finally:
+					shutil.rmtree(windowsFolder, ignore_errors=True)
+			else:
+				runScans([(scanInput, outputName, workDir + "tRNAscan.log")], scanOptions, tRNAscanFolder)
 
 			thisSequenceResult = Assembly(resultFile, outputName, hasCircularized)
 			return thisSequenceResult
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#Version: 1.0
+#Author: Alex Schomaker - alexschomaker@ufrj.br
+#LAMPADA - IBQM - UFRJ
+
+'''
+Copyright (c) 2014 Alex Schomaker Bastos - LAMPADA/UFRJ
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+
+import os, shutil, tempfile
+
+'''
+Run scoped workspace. generalMaker enters it before the first stage, so every module keeps writing its fixed file names 
+(best_query.fasta, possible_hits.fasta, tRNAscan.log...) inside the folder of its own run, and several jobs can share one 
+host without overwriting each other. As those names don't carry the job name, the lock is on the folder: only one job 
+at a time can use a workspace, whatever its name.
+The small scratch folders of the checks can be put somewhere else, like a tmpfs (/dev/shm), with scratchFolder.
+'''
+
+class Workspace():
+	'''
+	Class to hold the folders of a run.
+	'''
+	def __init__(self, processName, workFolder = '.', scratchFolder = None):
+		self.processName = processName
+		self.folder = os.path.abspath(workFolder)
+		self.scratchRoot = None
+		if scratchFolder != None:
+			self.scratchRoot = os.path.abspath(scratchFolder)
+		self.scratch = None
+		self.lockFile = os.path.join(self.folder, '.mitomaker.lock')
+		self.lockOwner = None #job name of the running job that holds the lock, when enter() fails
+
+	def path(self, *fileName):
+		'''
+		Absolute path of a file inside the workspace.
+		'''
+		return os.path.join(self.folder, *fileName)
+
+	def scratchFolder(self, name):
+		'''
+		Path, ending with /, of a scratch folder for the checks. Relative to the workspace, unless a scratchFolder was given.
+		'''
+		if self.scratch == None:
+			return name.rstrip('/') + '/'
+		return os.path.join(self.scratch, name.rstrip('/')) + '/'
+
+	def enter(self):
+		'''
+		Creates the workspace, locks it for this job and makes it the current folder.
+		Returns False if another running job is already using it (its name is in lockOwner).
+		'''
+		if not os.path.exists(self.folder): os.makedirs(self.folder)
+		if not self.lock():
+			return False
+		if self.scratchRoot != None:
+			if not os.path.exists(self.scratchRoot): os.makedirs(self.scratchRoot)
+			self.scratch = tempfile.mkdtemp(prefix=self.processName + '_', dir=self.scratchRoot)
+		os.chdir(self.folder)
+		return True
+
+	def lock(self):
+		'''
+		Lock file with this job's pid and name. A lock left behind by a job that is not running anymore is taken over.
+		'''
+		try:
+			lockDescriptor = os.open(self.lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+		except OSError:
+			try:
+				with open(self.lockFile, 'r') as lockFile:
+					lockContent = lockFile.read().split('\t')
+				otherJob = int(lockContent[0].strip())
+				os.kill(otherJob, 0) #doesn't kill anything, only checks if the process exists
+				self.lockOwner = lockContent[-1].strip()
+				return otherJob == os.getpid()
+			except (ValueError, OSError, IOError): #stale lock
+				os.remove(self.lockFile)
+				return self.lock()
+		os.write(lockDescriptor, str(os.getpid()) + '\t' + self.processName)
+		os.close(lockDescriptor)
+		return True
+
+	def leave(self):
+		'''
+		Removes the lock and the scratch folder of this run.
+		'''
+		if self.scratch != None:
+			shutil.rmtree(self.scratch, ignore_errors=True)
+		if os.path.exists(self.lockFile):
+			os.remove(self.lockFile)
+
+#workspace of the current run, generalMaker sets it with activate()
+currentWorkspace = None
+
+def activate(runWorkspace):
+	global currentWorkspace
+	currentWorkspace = runWorkspace
+
+def scratchFolder(name):
+	'''
+	Scratch folder for the checks of the current run, just name/ if no workspace was activated.
+	'''
+	if currentWorkspace == None:
+		return name.rstrip('/') + '/'
+	return currentWorkspace.scratchFolder(name)